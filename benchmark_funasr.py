@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FunASR服务器基准测试
+
+通过与应用相同的stdin/stdout协议驱动funasr_server.py子进程，测量：
+冷启动耗时、预热后首个请求延迟、不同音频时长下的延迟分位数和实时率、
+不同并发数下的吞吐量以及峰值内存。结果写入JSON，可与保存的基线对比，
+指标退化超过阈值时以非零状态退出。
+
+示例：
+    python benchmark_funasr.py -o bench.json
+    python benchmark_funasr.py --baseline bench.json --tolerance 0.1 -- --quantize
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+SAMPLE_RATE = 16000
+SERVER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "funasr_server.py"
+)
+ASR_REPO = "speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch"
+
+# 与基线对比的指标及方向：lower表示越小越好
+COMPARED_METRICS = {
+    "handshake_s": "lower",
+    "cold_start_s": "lower",
+    "warm_first_request_s": "lower",
+    "latency.*.p50": "lower",
+    "latency.*.p95": "lower",
+    "latency.*.rtf_p50": "lower",
+    "throughput.*.audio_seconds_per_second": "higher",
+    "memory.peak_rss_mb": "lower",
+}
+
+
+class ServerClient:
+    """按请求id复用一个funasr_server子进程，支持多个请求同时在途"""
+
+    def __init__(self, server_args):
+        self._seq = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._handshake_future = Future()
+        self._init_future = Future()
+
+        start_time = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER_PATH] + server_args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        # 握手在模型加载前返回，模型加载完成以init_progress的done事件为准
+        self._handshake_future.result(timeout=600)
+        self.handshake_time = time.perf_counter() - start_time
+        self.init_result = self._init_future.result(timeout=600)
+        self.startup_time = time.perf_counter() - start_time
+
+    def _read_loop(self):
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            request_id = message.get("id")
+            if request_id is None:
+                # 没有id的第一行是握手，之后是模型加载进度事件
+                if not self._handshake_future.done():
+                    self._handshake_future.set_result(message)
+                    if message.get("type") != "handshake":
+                        self._init_future.set_result(message)
+                elif message.get("event") == "init_progress":
+                    if message.get("status") == "done":
+                        self._init_future.set_result(message)
+                continue
+            if message.get("event"):
+                # 长任务的中间事件，请求尚未完成
+                continue
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future:
+                future.set_result(message)
+
+        error = RuntimeError("服务器进程已退出")
+        for future in (self._handshake_future, self._init_future):
+            if not future.done():
+                future.set_exception(error)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def submit(self, command, payload=None):
+        """发送一条命令，返回Future；payload为随命令帧发送的音频字节"""
+        future = Future()
+        with self._lock:
+            self._seq += 1
+            command = dict(command, id=self._seq)
+            self._pending[self._seq] = future
+        if payload is not None:
+            command["audio_bytes"] = len(payload)
+        header = (json.dumps(command) + "\n").encode("utf-8")
+        with self._write_lock:
+            self.process.stdin.write(header)
+            if payload is not None:
+                self.process.stdin.write(payload)
+            self.process.stdin.flush()
+        return future
+
+    def call(self, command, payload=None, timeout=3600):
+        return self.submit(command, payload).result(timeout=timeout)
+
+    def transcribe(self, pcm, options=None):
+        """转录一段16kHz s16le PCM，返回(结果, 端到端耗时)"""
+        start_time = time.perf_counter()
+        result = self.call(
+            {
+                "action": "transcribe",
+                "audio_format": "pcm_s16le",
+                "sample_rate": SAMPLE_RATE,
+                "options": options or {},
+            },
+            pcm,
+        )
+        return result, time.perf_counter() - start_time
+
+    def close(self):
+        try:
+            self.call({"action": "exit"}, timeout=10)
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def default_damo_root():
+    root = os.environ.get("DAMO_ROOT")
+    if root:
+        return root
+    home_dir = os.path.expanduser("~")
+    return os.path.join(home_dir, ".cache", "modelscope", "hub", "damo")
+
+
+def load_corpus_source(path):
+    """读取语料音频为16kHz单声道int16；没有可用音频时生成合成信号"""
+    import numpy as np
+
+    if path and os.path.exists(path):
+        import librosa
+
+        waveform, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+        return (np.clip(waveform, -1.0, 1.0) * 32767).astype("<i2"), path
+
+    # 合成信号：带包络的多个谐波，能通过VAD，但识别结果没有意义，只用于测速
+    t = np.arange(SAMPLE_RATE * 4) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    signal = sum(
+        np.sin(2 * np.pi * f * t) / (i + 1)
+        for i, f in enumerate((180, 360, 720, 1400))
+    )
+    signal = 0.3 * envelope * signal / np.max(np.abs(signal))
+    return (signal * 32767).astype("<i2"), "synthetic"
+
+
+def make_clip(source, seconds):
+    """把语料循环拼接成指定时长的PCM字节"""
+    import numpy as np
+
+    samples = int(seconds * SAMPLE_RATE)
+    repeats = samples // len(source) + 1
+    return np.tile(source, repeats)[:samples].tobytes()
+
+
+def clip_key(seconds):
+    """结果中音频时长的键，例如 30s、0_5s(键中不能有点号，基线对比按点号分层)"""
+    return f"{seconds:g}s".replace(".", "_")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return round(values[index], 4)
+
+
+def bench_latency(client, source, lengths, repeats):
+    """各时长音频顺序转录，统计端到端延迟分位数和实时率"""
+    results = {}
+    for seconds in lengths:
+        clip = make_clip(source, seconds)
+        # 长音频单次就要数分钟，只测一次
+        runs = repeats if seconds < 300 else 1
+        latencies, server_stages = [], {}
+        for _ in range(runs):
+            result, elapsed = client.transcribe(clip)
+            if not result.get("success"):
+                raise RuntimeError(f"{seconds}秒音频转录失败: {result.get('error')}")
+            latencies.append(elapsed)
+            for stage, ms in result.get("timings", {}).items():
+                server_stages.setdefault(stage, []).append(ms / 1000.0)
+        rtfs = [latency / seconds for latency in latencies]
+        key = clip_key(seconds)
+        results[key] = {
+            "runs": runs,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "rtf_p50": percentile(rtfs, 0.5),
+            "rtf_p95": percentile(rtfs, 0.95),
+            "server_stages_p50": {
+                stage: percentile(values, 0.5)
+                for stage, values in server_stages.items()
+            },
+        }
+        log(
+            f"{seconds:g}秒音频: p50 {results[key]['p50']}秒, "
+            f"RTF {results[key]['rtf_p50']}"
+        )
+    return results
+
+
+def bench_throughput(client, source, levels, clip_seconds, requests_per_level):
+    """保持固定数量的请求同时在途，测量吞吐量"""
+    clip = make_clip(source, clip_seconds)
+    results = {}
+    for concurrency in levels:
+        total = max(concurrency, requests_per_level)
+        semaphore = threading.Semaphore(concurrency)
+        futures = []
+        start_time = time.perf_counter()
+        for _ in range(total):
+            semaphore.acquire()
+            future = client.submit(
+                {
+                    "action": "transcribe",
+                    "audio_format": "pcm_s16le",
+                    "sample_rate": SAMPLE_RATE,
+                },
+                clip,
+            )
+            future.add_done_callback(lambda _f: semaphore.release())
+            futures.append(future)
+        failed = sum(1 for f in futures if not f.result().get("success"))
+        wall = time.perf_counter() - start_time
+        results[str(concurrency)] = {
+            "requests": total,
+            "failed": failed,
+            "wall_s": round(wall, 3),
+            "requests_per_second": round(total / wall, 3),
+            "audio_seconds_per_second": round(total * clip_seconds / wall, 3),
+        }
+        speed = results[str(concurrency)]["audio_seconds_per_second"]
+        log(f"并发 {concurrency}: {speed} 音频秒/秒")
+    return results
+
+
+def flatten(report, prefix=""):
+    """把嵌套结果展开为 a.b.c: 值 的形式，便于与基线逐项对比"""
+    items = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[path] = value
+    return items
+
+
+def metric_direction(path):
+    import fnmatch
+
+    for pattern, direction in COMPARED_METRICS.items():
+        if fnmatch.fnmatchcase(path, pattern) and path.count(".") == pattern.count("."):
+            return direction
+    return None
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """返回超过容差的退化项列表"""
+    current = flatten(report)
+    previous = flatten(baseline)
+    regressions = []
+    for path, value in sorted(current.items()):
+        direction = metric_direction(path)
+        base = previous.get(path)
+        if direction is None or not base:
+            continue
+        change = (value - base) / base
+        worse = change > tolerance if direction == "lower" else change < -tolerance
+        if worse:
+            regressions.append(
+                {
+                    "metric": path,
+                    "baseline": base,
+                    "current": value,
+                    "change": round(change, 4),
+                }
+            )
+    return regressions
+
+
+def log(message):
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FunASR服务器基准测试")
+    parser.add_argument("-o", "--output", default="benchmark_results.json",
+                        help="结果JSON文件")
+    parser.add_argument("--corpus", default=None,
+                        help="语料音频，默认使用ASR模型自带的示例音频，"
+                             "都不存在时使用合成信号")
+    parser.add_argument("--lengths", default="1,5,30,300",
+                        help="测试的音频时长(秒)，逗号分隔，例如 1,5,30,300,3600")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="每个时长的重复次数(300秒以上只测一次)")
+    parser.add_argument("--concurrency", default="1,2,4",
+                        help="吞吐量测试的并发数，逗号分隔")
+    parser.add_argument("--throughput-clip", type=float, default=15,
+                        help="吞吐量测试使用的音频时长(秒)")
+    parser.add_argument("--throughput-requests", type=int, default=8,
+                        help="每个并发数下发送的请求数")
+    parser.add_argument("--baseline", default=None,
+                        help="基线结果JSON，指标退化超过容差时返回非零状态")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="允许的相对退化比例")
+    parser.add_argument("server_args", nargs="*",
+                        help="传给funasr_server.py的参数，写在 -- 之后")
+    args = parser.parse_args()
+
+    lengths = [float(x) for x in args.lengths.split(",") if x]
+    levels = [int(x) for x in args.concurrency.split(",") if x]
+    server_args = list(args.server_args)
+    if "--max-concurrency" not in server_args:
+        server_args += ["--max-concurrency", str(max(levels))]
+
+    damo_root = default_damo_root()
+    if "--damo-root" in server_args:
+        damo_root = server_args[server_args.index("--damo-root") + 1]
+    corpus = args.corpus or os.path.join(
+        damo_root, ASR_REPO, "example", "asr_example.wav"
+    )
+    source, corpus_name = load_corpus_source(corpus)
+
+    log(f"启动服务器: {' '.join(server_args)}")
+    client = ServerClient(server_args)
+    try:
+        if not client.init_result.get("success"):
+            log(f"服务器初始化失败: {client.init_result.get('error')}")
+            return 2
+        log(
+            f"握手耗时: {client.handshake_time:.2f}秒，"
+            f"冷启动耗时: {client.startup_time:.2f}秒"
+        )
+
+        _, warm_first = client.transcribe(make_clip(source, min(lengths)))
+        log(f"首个请求耗时: {warm_first:.3f}秒")
+
+        latency = bench_latency(client, source, lengths, args.repeats)
+        throughput = bench_throughput(
+            client, source, levels, args.throughput_clip, args.throughput_requests
+        )
+        memory = client.call({"action": "memory"})
+        stats = client.call({"action": "stats"}).get("stats", {})
+    finally:
+        client.close()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "server_args": server_args,
+            "corpus": corpus_name,
+            "backends": stats.get("backends"),
+            "threads": stats.get("threads", {}).get("plan"),
+        },
+        "handshake_s": round(client.handshake_time, 3),
+        "cold_start_s": round(client.startup_time, 3),
+        "warm_first_request_s": round(warm_first, 4),
+        "latency": latency,
+        "throughput": throughput,
+        "memory": {
+            "rss_mb": memory.get("rss_mb"),
+            "peak_rss_mb": memory.get("peak_rss_mb"),
+        },
+        "server_metrics": stats.get("metrics"),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        report["regressions"] = regressions
+        for item in regressions:
+            log(
+                f"退化: {item['metric']} {item['baseline']} -> {item['current']} "
+                f"({item['change']:+.1%})"
+            )
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    log(f"结果已写入 {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,131 +2,584 @@
 # -*- coding: utf-8 -*-
 """
 FunASR模型下载脚本
-并行下载所有模型文件
+通过ModelScope文件接口并行分块下载模型文件：支持断点续传、sha256校验、
+按字节输出进度，也可以从本地镜像目录(如共享盘上的模型副本)离线复制。
+下载完成后在模型根目录写入清单，服务器启动时直接读取清单判断模型是否就绪。
 """
 
 import sys
 import json
+import os
+import argparse
+import hashlib
+import shutil
 import threading
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
 
-def download_model(model_config, progress_callback=None):
-    """下载单个模型"""
-    model_name = model_config["name"]
-    model_type = model_config["type"]
-    
+# 模型配置
+MODELS = {
+    "asr": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
+    "vad": "damo/speech_fsmn_vad_zh-cn-16k-common-pytorch",
+    "punc": "damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
+    "online_asr": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-online",
+}
+# 流式模型一并下载，开启实时识别后不会在录音中途才去下载
+DEFAULT_MODELS = ("asr", "vad", "punc", "online_asr")
+MODEL_REVISION = "v2.0.4"
+
+# 模型根目录下的清单文件，服务器据此判断模型是否就绪，格式与funasr_server.py一致
+MANIFEST_NAME = ".ququ_manifest.json"
+MANIFEST_VERSION = 1
+
+DEFAULT_ENDPOINT = "https://www.modelscope.cn"
+CHUNK_SIZE = 16 * 1024 * 1024  # 每个分块请求的字节数
+READ_SIZE = 1024 * 1024
+MAX_RETRIES = 5
+PROGRESS_INTERVAL = 0.5  # 进度输出的最小间隔(秒)
+
+
+def default_damo_root():
+    """与服务器相同的默认模型根目录"""
+    root = os.environ.get("MODELSCOPE_CACHE")
+    if root:
+        if os.path.isdir(os.path.join(root, "damo")):
+            return os.path.join(root, "damo")
+        if os.path.isdir(os.path.join(root, "hub", "damo")):
+            return os.path.join(root, "hub", "damo")
+    return os.path.join(os.path.expanduser("~"), ".cache", "modelscope", "hub", "damo")
+
+
+def emit(message):
+    """输出一行JSON，Electron端逐行解析"""
+    print(json.dumps(message, ensure_ascii=False))
+    sys.stdout.flush()
+
+
+def load_manifest(damo_root):
     try:
-        from funasr import AutoModel
-        
-        if progress_callback:
-            progress_callback(model_type, "downloading", 0)
-        
-        # 下载模型
-        AutoModel(
-            model=model_name,
-            model_revision="v2.0.4"
+        with open(os.path.join(damo_root, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "models": {}}
+
+
+def save_manifest(damo_root, manifest):
+    """先写临时文件再替换，服务器不会读到写了一半的清单"""
+    path = os.path.join(damo_root, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RangeNotSupported(Exception):
+    """服务器忽略了Range请求头，只能整文件下载"""
+
+
+class ModelScopeSource:
+    """ModelScope模型仓库的文件接口"""
+
+    def __init__(self, endpoint, revision):
+        self.endpoint = endpoint.rstrip("/")
+        self.revision = revision
+
+    def describe(self):
+        return self.endpoint
+
+    def _request(self, url, headers=None):
+        request = urllib.request.Request(
+            url, headers=dict({"User-Agent": "ququ-model-downloader"}, **(headers or {}))
         )
-        
-        if progress_callback:
-            progress_callback(model_type, "completed", 100)
-            
-        return {"success": True, "model": model_type}
-        
-    except Exception as e:
-        if progress_callback:
-            progress_callback(model_type, "error", 0, str(e))
-        return {"success": False, "model": model_type, "error": str(e)}
+        return urllib.request.urlopen(request, timeout=60)
+
+    def list_files(self, model_id):
+        """返回仓库文件列表 [{"path", "size", "sha256"}]"""
+        query = urllib.parse.urlencode({"Revision": self.revision, "Recursive": "True"})
+        url = f"{self.endpoint}/api/v1/models/{model_id}/repo/files?{query}"
+        with self._request(url) as response:
+            body = json.load(response)
+        if body.get("Code") not in (None, 200) or not body.get("Data"):
+            raise RuntimeError(f"获取文件列表失败: {body.get('Message') or body}")
+        files = []
+        for item in body["Data"].get("Files", []):
+            if item.get("Type") == "tree":
+                continue
+            files.append(
+                {
+                    "path": item["Path"],
+                    "size": int(item.get("Size") or 0),
+                    "sha256": item.get("Sha256") or None,
+                }
+            )
+        return files
+
+    def open_range(self, model_id, path, start, end):
+        """打开文件[start, end)字节区间的读取流"""
+        query = urllib.parse.urlencode({"Revision": self.revision, "FilePath": path})
+        url = f"{self.endpoint}/api/v1/models/{model_id}/repo?{query}"
+        response = self._request(url, {"Range": f"bytes={start}-{end - 1}"})
+        if response.status != 206 and start > 0:
+            response.close()
+            raise RangeNotSupported(path)
+        return response
+
+
+class MirrorSource:
+    """本地镜像目录，结构与模型根目录相同(<镜像>/<仓库名>/...)
+
+    镜像中带清单时使用清单里的文件列表和sha256，否则按目录内容复制，只校验大小。
+    已下载好的模型根目录本身就可以作为其他机器的镜像。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = load_manifest(directory)
+
+    def describe(self):
+        return self.directory
+
+    def _repo_dir(self, model_id):
+        return os.path.join(self.directory, model_id.split("/")[-1])
+
+    def list_files(self, model_id):
+        repo_dir = self._repo_dir(model_id)
+        if not os.path.isdir(repo_dir):
+            raise RuntimeError(f"镜像中没有该模型: {repo_dir}")
+        for entry in self.manifest["models"].values():
+            if entry.get("model_id") == model_id and entry.get("complete"):
+                return [
+                    {"path": path, "size": info["size"], "sha256": info.get("sha256")}
+                    for path, info in entry["files"].items()
+                ]
+        files = []
+        for root, dirs, names in os.walk(repo_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                if name.startswith(".") or name.endswith(".part"):
+                    continue
+                full_path = os.path.join(root, name)
+                files.append(
+                    {
+                        "path": os.path.relpath(full_path, repo_dir).replace(os.sep, "/"),
+                        "size": os.path.getsize(full_path),
+                        "sha256": None,
+                    }
+                )
+        return files
+
+    def open_range(self, model_id, path, start, end):
+        f = open(os.path.join(self._repo_dir(model_id), *path.split("/")), "rb")
+        f.seek(start)
+        return _LimitedReader(f, end - start)
+
+
+class _LimitedReader:
+    """只读取底层文件指定长度的包装，接口与HTTP响应一致"""
+
+    def __init__(self, f, length):
+        self._f = f
+        self._remaining = length
+
+    def read(self, size):
+        data = self._f.read(min(size, self._remaining))
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Progress:
+    """按字节统计各模型的下载进度，限频输出"""
+
+    def __init__(self, totals):
+        self.totals = totals  # 模型 -> 需要传输的总字节数
+        self.done = dict.fromkeys(totals, 0)
+        self.completed = 0
+        self.resumed = 0  # 之前已下载的字节，不计入速度
+        self._lock = threading.Lock()
+        self._last_emit = 0.0
+        self._started = time.time()
+
+    def advance(self, model_type, nbytes):
+        with self._lock:
+            self.done[model_type] += nbytes
+            now = time.time()
+            if now - self._last_emit < PROGRESS_INTERVAL:
+                return
+            self._last_emit = now
+        self.report("downloading", model_type)
+
+    def finish(self, model_type, error=None):
+        """记录一个模型结束（成功或失败），多个模型的协调线程会同时调用"""
+        with self._lock:
+            self.completed += 1
+        if error:
+            self.report("error", model_type, error)
+        else:
+            self.report("completed", model_type)
+
+    def report(self, stage, model_type, error=None):
+        with self._lock:
+            total = self.totals[model_type]
+            percent = 100.0 if total == 0 else self.done[model_type] * 100.0 / total
+            all_total = sum(self.totals.values())
+            all_done = sum(self.done.values())
+            elapsed = max(time.time() - self._started, 1e-6)
+            status = {
+                "stage": stage,
+                "model": model_type,
+                "progress": round(min(percent, 100.0), 1),
+                "overall_progress": round(
+                    100.0 if all_total == 0 else all_done * 100.0 / all_total, 1
+                ),
+                "downloaded_bytes": all_done,
+                "total_bytes": all_total,
+                "speed": int((all_done - self.resumed) / elapsed),
+                "completed": self.completed,
+                "total": len(self.totals),
+            }
+        if error:
+            # 单个模型失败不使用error字段，Electron端收到error会立即终止整个下载
+            status["message"] = error
+        emit(status)
+
+
+class FileDownload:
+    """单个文件的分块下载
+
+    数据先写入<文件>.part，已完成的分块记录在<文件>.part.json中，
+    中断后重新运行只下载缺失的分块；全部完成并校验通过后才替换为正式文件。
+    """
+
+    def __init__(self, source, model_id, model_type, repo_dir, info, progress):
+        self.source = source
+        self.model_id = model_id
+        self.model_type = model_type
+        self.info = info
+        self.progress = progress
+        self.path = os.path.join(repo_dir, *info["path"].split("/"))
+        self.part_path = self.path + ".part"
+        self.state_path = self.part_path + ".json"
+        self._lock = threading.Lock()
+        size = info["size"]
+        self.chunks = [
+            (start, min(start + CHUNK_SIZE, size)) for start in range(0, size, CHUNK_SIZE)
+        ]
+        self.done_chunks = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if (
+                state.get("size") == self.info["size"]
+                and state.get("sha256") == self.info["sha256"]
+                and os.path.getsize(self.part_path) == self.info["size"]
+            ):
+                return set(state.get("done", []))
+        except (OSError, ValueError):
+            pass
+        return set()
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "size": self.info["size"],
+                    "sha256": self.info["sha256"],
+                    "done": sorted(self.done_chunks),
+                },
+                f,
+            )
+        os.replace(tmp_path, self.state_path)
+
+    def remaining_bytes(self):
+        return sum(
+            end - start
+            for index, (start, end) in enumerate(self.chunks)
+            if index not in self.done_chunks
+        )
+
+    def prepare(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not self.done_chunks:
+            # 预分配完整大小，各分块按偏移写入
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.info["size"])
+            self._save_state()
+
+    def pending_chunks(self):
+        return [i for i in range(len(self.chunks)) if i not in self.done_chunks]
+
+    def fetch_chunk(self, index):
+        """下载一个分块，失败时从已写入的位置重试"""
+        start, end = self.chunks[index]
+        position = start
+        for attempt in range(MAX_RETRIES):
+            try:
+                with self.source.open_range(
+                    self.model_id, self.info["path"], position, end
+                ) as stream, open(self.part_path, "r+b") as f:
+                    f.seek(position)
+                    while position < end:
+                        data = stream.read(min(READ_SIZE, end - position))
+                        if not data:
+                            raise IOError("连接提前结束")
+                        f.write(data)
+                        position += len(data)
+                        self.progress.advance(self.model_type, len(data))
+                break
+            except RangeNotSupported:
+                raise
+            except (OSError, urllib.error.URLError) as e:
+                if attempt == MAX_RETRIES - 1:
+                    raise RuntimeError(f"{self.info['path']} 下载失败: {e}")
+                time.sleep(min(30, 2 ** attempt))
+        with self._lock:
+            self.done_chunks.add(index)
+            self._save_state()
+
+    def fetch_whole(self):
+        """服务器不支持Range时整文件顺序下载"""
+        self.progress.advance(self.model_type, -(self.info["size"] - self.remaining_bytes()))
+        self.done_chunks = set()
+        self.chunks = [(0, self.info["size"])]
+        self.prepare()
+        self.fetch_chunk(0)
+
+    def finish(self):
+        """校验sha256后替换为正式文件，返回文件的sha256
+
+        来源没有提供哈希(不带清单的镜像)时同样计算一次，记入清单供之后校验。
+        """
+        digest = sha256_file(self.part_path)
+        if self.info["sha256"] and digest != self.info["sha256"]:
+            os.remove(self.part_path)
+            os.remove(self.state_path)
+            raise RuntimeError(f"{self.info['path']} sha256校验失败，已删除，请重新下载")
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+        return digest
+
+
+def is_file_current(repo_dir, info, recorded):
+    """已存在且与清单记录一致的文件不重新下载，也不重新计算哈希"""
+    path = os.path.join(repo_dir, *info["path"].split("/"))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != info["size"]:
+        return False
+    if recorded and recorded.get("size") == info["size"]:
+        if recorded.get("sha256") == info["sha256"] and recorded.get("mtime") == int(
+            stat.st_mtime
+        ):
+            return True
+    return not info["sha256"] or sha256_file(path) == info["sha256"]
+
+
+def settle_futures(futures):
+    """取消尚未开始的分块并等待正在运行的分块结束，不取出它们的异常"""
+    for future in futures:
+        future.cancel()
+    wait(futures)
+
+
+def download_model(
+    model_type, files, pending, source, revision, damo_root, manifest, progress, executor
+):
+    """下载单个模型中pending列出的文件，返回写入清单的模型条目"""
+    model_id = MODELS[model_type]
+    repo_dir = os.path.join(damo_root, model_id.split("/")[-1])
+    recorded_files = manifest["models"].get(model_type, {}).get("files", {})
+    digests = {
+        path: recorded.get("sha256") for path, recorded in recorded_files.items()
+    }
+
+    downloads = []
+    for info in pending:
+        download = FileDownload(source, model_id, model_type, repo_dir, info, progress)
+        download.prepare()
+        downloads.append(download)
+
+    # 所有文件的所有分块一起提交到共享的线程池并行下载
+    futures = {
+        download: [
+            executor.submit(download.fetch_chunk, index)
+            for index in download.pending_chunks()
+        ]
+        for download in downloads
+    }
+    try:
+        for download, chunk_futures in futures.items():
+            try:
+                for future in chunk_futures:
+                    future.result()
+            except RangeNotSupported:
+                # 等其余分块全部停下再整体重下，避免与仍在写.part的线程冲突；
+                # 它们抛出的RangeNotSupported保存在future里，不再取出
+                settle_futures(chunk_futures)
+                download.fetch_whole()
+            digests[download.info["path"]] = download.finish()
+    except BaseException:
+        # 任一分块重试后仍失败：先让本模型仍在写.part和断点状态的分块全部停下再抛出，
+        # 下次运行时断点状态与文件内容一致
+        settle_futures([f for chunk_futures in futures.values() for f in chunk_futures])
+        raise
+
+    entry_files = {}
+    for info in files:
+        path = os.path.join(repo_dir, *info["path"].split("/"))
+        entry_files[info["path"]] = {
+            "size": info["size"],
+            "sha256": info["sha256"] or digests.get(info["path"]),
+            "mtime": int(os.stat(path).st_mtime),
+        }
+    return {
+        "model_id": model_id,
+        "revision": revision,
+        "dir": os.path.basename(repo_dir),
+        "files": entry_files,
+        "complete": True,
+        "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source.describe(),
+    }
+
 
 def main():
     """主函数：并行下载所有模型"""
-    
-    # 模型配置
-    models = [
-        {
-            "name": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
-            "type": "asr"
-        },
-        {
-            "name": "damo/speech_fsmn_vad_zh-cn-16k-common-pytorch",
-            "type": "vad"
-        },
-        {
-            "name": "damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
-            "type": "punc"
-        }
-    ]
-    
-    # 进度跟踪
-    progress = {"asr": 0, "vad": 0, "punc": 0}
+    parser = argparse.ArgumentParser(description="下载FunASR模型")
+    parser.add_argument("--damo-root", default=None,
+                        help="模型根目录，默认与服务器相同(~/.cache/modelscope/hub/damo)")
+    parser.add_argument("--mirror", default=os.environ.get("QUQU_MODEL_MIRROR"),
+                        help="本地镜像目录(结构与模型根目录相同)，设置后不访问网络；"
+                             "也可通过环境变量QUQU_MODEL_MIRROR指定")
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS),
+                        help=f"要下载的模型，逗号分隔，可选: {', '.join(MODELS)}")
+    parser.add_argument("--endpoint", default=os.environ.get("MODELSCOPE_DOMAIN")
+                        or DEFAULT_ENDPOINT, help="ModelScope服务地址")
+    parser.add_argument("--revision", default=MODEL_REVISION, help="模型版本")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="并行下载的连接数")
+    args = parser.parse_args()
+
+    damo_root = args.damo_root or default_damo_root()
+    if args.endpoint and not args.endpoint.startswith("http"):
+        args.endpoint = "https://" + args.endpoint
+    model_types = [m.strip() for m in args.models.split(",") if m.strip()]
+    unknown = [m for m in model_types if m not in MODELS]
+    if unknown:
+        raise ValueError(f"未知的模型: {', '.join(unknown)}")
+
+    if args.mirror:
+        source = MirrorSource(args.mirror)
+    else:
+        source = ModelScopeSource(args.endpoint, args.revision)
+    os.makedirs(damo_root, exist_ok=True)
+    manifest = load_manifest(damo_root)
+
+    # 先取得全部文件列表，进度按实际需要传输的字节数计算
     results = {}
-    completed_count = 0
-    total_count = len(models)
-    
-    def progress_callback(model_type, stage, percent, error=None):
-        nonlocal completed_count
-        
-        if stage == "downloading":
-            progress[model_type] = percent
-        elif stage == "completed":
-            progress[model_type] = 100
-            completed_count += 1
-        elif stage == "error":
-            progress[model_type] = 0
-            completed_count += 1
-        
-        # 计算总体进度
-        overall_progress = sum(progress.values()) / total_count
-        
-        # 输出进度信息
-        status = {
-            "stage": stage,
-            "model": model_type,
-            "progress": percent,
-            "overall_progress": round(overall_progress, 1),
-            "completed": completed_count,
-            "total": total_count
-        }
-        
-        if error:
-            status["error"] = error
-            
-        print(json.dumps(status, ensure_ascii=False))
-        sys.stdout.flush()
-    
-    # 启动并行下载线程
-    threads = []
-    for model_config in models:
-        thread = threading.Thread(
-            target=lambda config=model_config: results.update({
-                config["type"]: download_model(config, progress_callback)
-            })
-        )
-        thread.start()
-        threads.append(thread)
-    
-    # 等待所有线程完成
-    for thread in threads:
-        thread.join()
-    
+    plan = {}
+    pending = {}
+    for model_type in model_types:
+        try:
+            plan[model_type] = source.list_files(MODELS[model_type])
+        except Exception as e:
+            results[model_type] = {"success": False, "model": model_type, "error": str(e)}
+    progress = Progress({m: sum(f["size"] for f in files) for m, files in plan.items()})
+    for model_type, files in plan.items():
+        # 已下载完成和已完成分块的字节直接计入进度
+        repo_dir = os.path.join(damo_root, MODELS[model_type].split("/")[-1])
+        recorded = manifest["models"].get(model_type, {}).get("files", {})
+        pending[model_type] = []
+        for info in files:
+            if is_file_current(repo_dir, info, recorded.get(info["path"])):
+                progress.done[model_type] += info["size"]
+            else:
+                pending[model_type].append(info)
+                download = FileDownload(
+                    source, MODELS[model_type], model_type, repo_dir, info, progress
+                )
+                progress.done[model_type] += info["size"] - download.remaining_bytes()
+    progress.resumed = sum(progress.done.values())
+
+    manifest_lock = threading.Lock()
+
+    def run_model(model_type, executor):
+        progress.report("downloading", model_type)
+        try:
+            entry = download_model(
+                model_type, plan[model_type], pending[model_type], source,
+                args.revision, damo_root, manifest, progress, executor,
+            )
+        except Exception as e:
+            progress.finish(model_type, str(e))
+            return {"success": False, "model": model_type, "error": str(e)}
+        with manifest_lock:
+            manifest["models"][model_type] = entry
+            save_manifest(damo_root, manifest)
+        progress.finish(model_type)
+        return {"success": True, "model": model_type}
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        # 每个模型一个协调线程，分块下载共享同一个连接池
+        threads = []
+        for model_type in plan:
+            thread = threading.Thread(
+                target=lambda m=model_type: results.update({m: run_model(m, executor)})
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
     # 检查结果
-    failed_models = [model_type for model_type, result in results.items() if not result["success"]]
-    
+    failed_models = [m for m in model_types if not results[m]["success"]]
+
     if failed_models:
         final_result = {
             "success": False,
             "error": f"以下模型下载失败: {', '.join(failed_models)}",
             "failed_models": failed_models,
-            "results": results
+            "results": results,
         }
     else:
         final_result = {
             "success": True,
             "message": "所有模型下载完成",
-            "results": results
+            "damo_root": damo_root,
+            "results": results,
         }
-    
-    print(json.dumps(final_result, ensure_ascii=False))
-    sys.stdout.flush()
+
+    emit(final_result)
+    if failed_models:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     try:
@@ -137,4 +590,4 @@ if __name__ == "__main__":
             "error": str(e)
         }
         print(json.dumps(error_result, ensure_ascii=False))
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
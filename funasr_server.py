@@ -14,7 +14,11 @@ import signal
 import contextlib
 import io
 import argparse
+import atexit
 import glob
+import itertools
+import threading
+import time
 from pathlib import Path
 
 # 设置日志
@@ -38,16 +42,557 @@ def get_log_path():
 
 log_file_path = get_log_path()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file_path, encoding="utf-8"),
-        logging.StreamHandler(),  # 同时输出到控制台
-    ],
-)
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# 高频日志(每个请求都会输出的)带上该标记，按级别采样输出
+SAMPLED = {"sampled": True}
+
+
+class LogSampler(logging.Filter):
+    """按级别对高频日志采样：rates为 {级别: 保留比例}，同一调用位置每N条保留1条
+
+    只作用于带SAMPLED标记的记录，警告和错误默认全部保留。
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.intervals = {
+            logging.getLevelName(level.upper()) if isinstance(level, str) else level:
+            max(1, round(1 / rate)) if rate > 0 else 0
+            for level, rate in (rates or {}).items()
+        }
+        self._counts = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        interval = self.intervals.get(record.levelno, 1)
+        if interval == 1 or not getattr(record, "sampled", False):
+            return True
+        key = (record.levelno, record.pathname, record.lineno)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if interval and count % interval == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class LogPipeline:
+    """非阻塞日志：业务线程只把记录放入队列，由后台线程写文件和控制台
+
+    日志文件按大小(max_mb)或按时间(when，如"midnight")轮转。
+    推理线程不会因为磁盘或网络目录写入缓慢而被阻塞。
+    """
+
+    def __init__(
+        self,
+        path,
+        level="INFO",
+        max_mb=10,
+        backups=5,
+        when=None,
+        sample_rates=None,
+        redact_transcripts=False,
+        console=None,
+        forward_queue=None,
+    ):
+        import logging.handlers
+        import queue
+
+        self.path = path
+        self.options = {
+            "level": level,
+            "max_mb": max_mb,
+            "backups": backups,
+            "when": when,
+            "sample_rates": sample_rates,
+            "redact_transcripts": redact_transcripts,
+        }
+        self.redact_transcripts = redact_transcripts
+        formatter = logging.Formatter(LOG_FORMAT)
+        if forward_queue is not None:
+            # 批量转录的工作进程：采样和脱敏后把记录交给主进程，由主进程统一写文件和轮转
+            self.handlers = [logging.handlers.QueueHandler(forward_queue)]
+        else:
+            if when:
+                file_handler = logging.handlers.TimedRotatingFileHandler(
+                    path, when=when, backupCount=backups, encoding="utf-8"
+                )
+            else:
+                file_handler = logging.handlers.RotatingFileHandler(
+                    path,
+                    maxBytes=int(max_mb * MB) if max_mb else 0,
+                    backupCount=backups,
+                    encoding="utf-8",
+                )
+            console_handler = logging.StreamHandler(console)  # 同时输出到控制台
+            self.handlers = [file_handler, console_handler]
+            for handler in self.handlers:
+                handler.setFormatter(formatter)
+
+        self.queue = queue.SimpleQueue()
+        self.sampler = LogSampler(sample_rates)
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+        self.queue_handler.addFilter(self.sampler)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self._running = False
+
+    def install(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(self.options["level"])
+        self.listener.start()
+        self._running = True
+
+    def stop(self):
+        """写完队列中剩余的记录后关闭文件"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    def pause(self):
+        """停止写入线程(先写完队列中的记录)，文件保持打开；期间的记录留在队列中"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def resume(self):
+        if not self._running:
+            self.listener.start()
+            self._running = True
+
+    @contextlib.contextmanager
+    def forwarded_from(self, queue):
+        """把其他进程通过queue转发来的记录写入本进程的日志文件和控制台"""
+        import logging.handlers
+
+        listener = logging.handlers.QueueListener(
+            queue, *self.handlers, respect_handler_level=True
+        )
+        listener.start()
+        try:
+            yield
+        finally:
+            listener.stop()
+
+    def get_stats(self):
+        return {
+            "file": self.path,
+            "queued": self.queue.qsize(),
+            "sampled_out": self.sampler.dropped,
+            "redact_transcripts": self.redact_transcripts,
+        }
+
+    def abandon(self):
+        """fork出的子进程中调用：父进程的写入线程在fork时可能正持有文件缓冲区的锁，
+        子进程不能再flush或close这些文件对象，只关闭底层的文件描述符"""
+        logging.getLogger().removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            if isinstance(handler, logging.FileHandler) and handler.stream:
+                os.close(handler.stream.fileno())
+
+
+_log_pipeline = None
+_abandoned_log_pipeline = None
+
+
+def setup_logging(path=None, **options):
+    """(重新)配置日志管道，options见LogPipeline"""
+    global _log_pipeline
+    if _log_pipeline is not None:
+        _log_pipeline.stop()
+    _log_pipeline = LogPipeline(path or log_file_path, **options)
+    _log_pipeline.install()
+    return _log_pipeline
+
+
+def reinit_logging_after_fork(suffix):
+    """fork出的工作进程重建日志管道，写入各自的日志文件以免多个进程同时轮转同一个文件"""
+    global _log_pipeline, _abandoned_log_pipeline
+    pipeline = _log_pipeline
+    pipeline.abandon()
+    # 保留旧管道的引用，避免文件对象被回收时尝试flush
+    _abandoned_log_pipeline = pipeline
+    base, ext = os.path.splitext(pipeline.path)
+    # 控制台输出同样使用新的文件对象，不复用可能被锁住的sys.stderr
+    console = open(2, "w", encoding="utf-8", closefd=False, buffering=1)
+    _log_pipeline = LogPipeline(
+        f"{base}.{suffix}{ext}", console=console, **pipeline.options
+    )
+    _log_pipeline.install()
+    return _log_pipeline
+
+
+def shutdown_logging():
+    if _log_pipeline is not None:
+        _log_pipeline.stop()
+
+
+@contextlib.contextmanager
+def logging_paused():
+    """暂停日志写入线程，fork时子进程不会继承被它持有的文件或控制台锁"""
+    pipeline = _log_pipeline
+    if pipeline is not None:
+        pipeline.pause()
+    try:
+        yield
+    finally:
+        if pipeline is not None:
+            pipeline.resume()
+
+
+def transcript_preview(text, limit=100):
+    """日志中的转录文本预览，开启脱敏时只记录长度"""
+    if _log_pipeline is not None and _log_pipeline.redact_transcripts:
+        return f"<已隐藏 {len(text)} 字>"
+    return f"{text[:limit]}..."
+
+
+MB = 1024 * 1024
+setup_logging()
+atexit.register(shutdown_logging)
 logger = logging.getLogger(__name__)
 
+# 模型统一使用16kHz采样率
+SAMPLE_RATE = 16000
+
+# 随命令帧传入的原始PCM格式及对应的numpy数据类型
+RAW_PCM_FORMATS = {"pcm_s16le": "<i2", "f32le": "<f4"}
+# libsndfile无法读取的容器格式，直接交给PyAV或ffmpeg解码
+COMPRESSED_CONTAINERS = {"webm", "mp4"}
+# 压缩音频解码时每次读取的样本数(约4秒)
+COMPRESSED_DECODE_BLOCK = 4 * 16000
+
+
+# 流式识别参数：chunk_size[1]个60ms帧为一个chunk，即每600ms输出一次中间结果
+STREAM_CHUNK_SIZE = [0, 10, 5]
+STREAM_ENCODER_CHUNK_LOOK_BACK = 4
+STREAM_DECODER_CHUNK_LOOK_BACK = 1
+STREAM_CHUNK_SAMPLES = STREAM_CHUNK_SIZE[1] * 960
+
+
+# 长音频模式：每次从磁盘读取WINDOW_S秒音频；结束位置距窗口末尾不足TAIL_MS的
+# 语音片段可能被截断，连同之后的音频并入下一窗口重新切分(最多带入WINDOW_S秒)
+LONG_FORM_WINDOW_S = 60
+LONG_FORM_TAIL_MS = 1000
+
+
+# 预热：用WARMUP_AUDIO_S秒低幅噪声和一句短文本各跑一遍模型；
+# 距上次使用不足WARMUP_FRESH_S秒的模型视为仍是热的，不重复预热
+WARMUP_AUDIO_S = 0.5
+WARMUP_TEXT = "今天天气不错我们出去走走吧"
+WARMUP_FRESH_S = 30
+WARMUP_MODELS = ("vad", "asr", "punc")
+# 开启流式识别时，流式模型同样随预热和空闲预热保持在内存中
+STREAM_WARMUP_MODELS = WARMUP_MODELS + ("online_asr",)
+
+
+# 增量标点：窗口文本达到MIN字符后才送入标点模型，超过MAX字符仍没有句末标点时强制定稿
+PUNC_WINDOW_MIN_CHARS = 30
+PUNC_WINDOW_MAX_CHARS = 200
+PUNC_SENTENCE_ENDS = "。？！?!"
+# 带入下一窗口前去掉的标点：只去掉标点模型插入的全角标点，ASCII标点只去掉末尾的一个，
+# 文本中原有的小数点、版本号(3.5、v1.2)等不受影响
+PUNC_MARKS = "，。？！、；："
+PUNC_ASCII_MARKS = ",.?!;:"
+
+
+# 控制类命令在读取线程中立即应答，不会被耗时的推理请求阻塞
+CONTROL_ACTIONS = {
+    "status",
+    "stats",
+    "cleanup",
+    "memory",
+    "hotwords_activate",
+    "profile_start",
+    "profile_stop",
+}
+
+# 模型名称与服务器属性、加载函数的对应关系
+MODEL_ATTRS = {
+    "asr": "asr_model",
+    "vad": "vad_model",
+    "punc": "punc_model",
+    "online_asr": "online_asr_model",
+}
+MODEL_LOADERS = {
+    "asr": "_load_asr_model",
+    "vad": "_load_vad_model",
+    "punc": "_load_punc_model",
+    "online_asr": "_load_online_asr_model",
+}
+MODEL_IDS = {
+    "asr": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
+    "vad": "damo/speech_fsmn_vad_zh-cn-16k-common-pytorch",
+    "punc": "damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
+    "online_asr": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-online",
+}
+
+# 推理后端：pytorch为FunASR原生推理，onnx为ONNX Runtime推理(funasr_onnx)
+MODEL_BACKENDS = ("pytorch", "onnx")
+# 支持ONNX Runtime推理的模型及其在funasr_onnx中的类名，流式模型只支持pytorch
+ONNX_MODEL_CLASSES = {"asr": "Paraformer", "vad": "Fsmn_vad", "punc": "CT_Transformer"}
+# 开启quantize时做动态int8量化的模型：Paraformer和CT-Transformer的计算集中在线性层，
+# VAD模型很小，量化收益不大
+QUANTIZABLE_MODELS = ("asr", "punc", "online_asr")
+
+# 流式命令需要按到达顺序依次执行
+STREAM_ACTIONS = {"stream_start", "stream_chunk", "stream_end", "stream_cancel"}
+
+
+def get_rss_bytes():
+    """当前进程常驻内存(RSS)，优先使用psutil"""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes():
+    """进程峰值常驻内存"""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux下单位为KB，macOS下为字节
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        try:
+            import psutil
+
+            return getattr(psutil.Process().memory_info(), "peak_wset", 0)
+        except ImportError:
+            return 0
+
+
+def default_damo_root():
+    """解析默认的 damo 模型根目录"""
+    # 允许通过 MODELSCOPE_CACHE 指定根；常见是 ~/.cache/modelscope/hub/damo
+    root = os.environ.get("MODELSCOPE_CACHE")
+    if root:
+        # 兼容两种布局：<cache>/damo 或 <cache>/hub/damo
+        if os.path.isdir(os.path.join(root, "damo")):
+            return os.path.join(root, "damo")
+        if os.path.isdir(os.path.join(root, "hub", "damo")):
+            return os.path.join(root, "hub", "damo")
+        # 像 Node 一样自定义到 /Volumes/APFS/AI/models/damo，就直接传入 --damo-root
+    # 默认回到用户主目录的 modelscope/hub/damo
+    home_dir = os.path.expanduser("~")
+    return os.path.join(home_dir, ".cache", "modelscope", "hub", "damo")
+
+
+# download_models.py在模型根目录写入的清单，记录每个模型完整下载并校验过的文件
+MODEL_MANIFEST_NAME = ".ququ_manifest.json"
+MODEL_MANIFEST_VERSION = 1
+
+
+def load_model_manifest(damo_root):
+    """读取模型清单，返回已完整下载的模型 {模型名: 清单条目}
+
+    清单不存在或无法解析时返回None，由调用方回退到扫描模型目录。
+    """
+    try:
+        with open(os.path.join(damo_root, MODEL_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MODEL_MANIFEST_VERSION:
+        return None
+    return {
+        name: entry
+        for name, entry in manifest.get("models", {}).items()
+        if entry.get("complete") and entry.get("model_id") == MODEL_IDS.get(name)
+    }
+
+
+def model_repo_ready(repo_dir):
+    """没有清单记录的模型(例如旧版本下载)：目录中有任意常见权重/配置文件即认为已就绪"""
+    if not os.path.isdir(repo_dir):
+        return False
+    patterns = [
+        "model.pt", "pytorch_model.bin", "*.onnx",
+        "config.json", "configuration.json", "model.yaml", "vocab*"
+    ]
+    for pat in patterns:
+        if glob.glob(os.path.join(repo_dir, pat)):
+            return True
+    return False
+
+
+def read_exact(stream, size):
+    """从二进制流中读取恰好size个字节"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise EOFError(f"音频数据帧不完整，还缺 {remaining} 字节")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class AudioDecoderUnavailable(RuntimeError):
+    """没有可用的压缩音频解码器(PyAV或ffmpeg)"""
+
+
+def sniff_audio_container(head):
+    """根据文件头的魔数判断音频容器格式，无法识别时返回None"""
+    head = bytes(head[:16])
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"  # EBML头，WebM/Matroska
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def find_ffmpeg():
+    """ffmpeg可执行文件路径：优先使用FFMPEG_PATH(Electron传入的ffmpeg-static)"""
+    import shutil
+
+    path = os.environ.get("FFMPEG_PATH")
+    if path and os.path.isfile(path):
+        return path
+    return shutil.which("ffmpeg")
+
+
+def iter_compressed_audio(source, block_samples=COMPRESSED_DECODE_BLOCK):
+    """流式解码压缩音频(WebM/Opus、MP4等)，逐块产出16kHz单声道float32波形
+
+    解码和重采样在同一遍中完成，不需要先把整段音频解码为原始采样率的波形。
+    source为文件路径或内存字节。优先使用PyAV，未安装时通过管道调用ffmpeg。
+    """
+    try:
+        import av
+    except ImportError:
+        av = None
+    if av is not None:
+        chunks = _iter_pyav_audio(av, source)
+    else:
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            raise AudioDecoderUnavailable(
+                "解码压缩音频需要PyAV(pip install av)或ffmpeg，"
+                "也可以通过FFMPEG_PATH环境变量指定ffmpeg路径"
+            )
+        chunks = _iter_ffmpeg_audio(ffmpeg, source, block_samples)
+    yield from _rebuffer_audio(chunks, block_samples)
+
+
+def _iter_pyav_audio(av, source):
+    import numpy as np
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with av.open(source) as container:
+        if not container.streams.audio:
+            raise ValueError("文件中没有音频流")
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        for frame in itertools.chain(container.decode(stream), [None]):
+            # frame为None时冲刷重采样器中剩余的采样；旧版PyAV返回单个帧而不是列表
+            frames = resampler.resample(frame)
+            if not isinstance(frames, list):
+                frames = [frames] if frames is not None else []
+            for resampled in frames:
+                yield np.asarray(resampled.to_ndarray(), dtype=np.float32).reshape(-1)
+
+
+def _iter_ffmpeg_audio(ffmpeg, source, block_samples):
+    import subprocess
+
+    import numpy as np
+
+    in_memory = isinstance(source, (bytes, bytearray, memoryview))
+    command = [
+        ffmpeg, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0" if in_memory else source,
+        "-vn", "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if in_memory else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    errors = []
+    # stderr在单独线程中读取，避免错误输出写满管道后ffmpeg阻塞
+    stderr_reader = threading.Thread(
+        target=lambda: errors.append(process.stderr.read()), daemon=True
+    )
+    stderr_reader.start()
+    if in_memory:
+        def feed():
+            try:
+                process.stdin.write(source)
+            except (BrokenPipeError, OSError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        threading.Thread(target=feed, daemon=True).start()
+    try:
+        block_bytes = block_samples * 4
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % 4
+            yield np.frombuffer(data[:usable], dtype="<f4")
+        process.wait()
+        stderr_reader.join()
+        if process.returncode != 0:
+            message = b"".join(errors).decode("utf-8", "replace").strip()
+            raise RuntimeError(f"ffmpeg解码失败: {message or process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def _rebuffer_audio(chunks, block_samples):
+    """把解码器产出的不定长片段整理为block_samples长的块，最后一块可能更短"""
+    import numpy as np
+
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= block_samples:
+            merged = np.concatenate(pending)
+            full = len(merged) - len(merged) % block_samples
+            for start in range(0, full, block_samples):
+                yield merged[start : start + block_samples]
+            pending = [merged[full:]]
+            pending_size = len(merged) - full
+    if pending_size:
+        yield np.concatenate(pending)
+
+
 # 记录日志文件位置
 logger.info(f"FunASR服务器日志文件: {log_file_path}")
 
@@ -65,301 +610,3080 @@ def suppress_stdout():
         devnull.close()
 
 
-class FunASRServer:
-    def __init__(self, damo_root=None):
-        self.asr_model = None
-        self.vad_model = None
-        self.punc_model = None
-        self.initialized = False
-        self.running = True
-        self.transcription_count = 0
-        self.total_audio_duration = 0.0
+def quantize_dynamic_int8(model):
+    """对AutoModel中的线性层做动态int8量化，权重量化保存，激活在推理时动态量化"""
+    import torch
 
-        # 外部传入的 damo 根目录（例如 /Volumes/APFS/AI/models/damo）
-        self.damo_root = damo_root or os.environ.get("DAMO_ROOT")
+    # ARM(如Apple Silicon)上没有fbgemm，改用qnnpack
+    engines = torch.backends.quantized.supported_engines
+    if "fbgemm" not in engines and "qnnpack" in engines:
+        torch.backends.quantized.engine = "qnnpack"
 
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
-        self._setup_runtime_environment()
+    model.model = torch.ao.quantization.quantize_dynamic(
+        model.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return model
 
-    def _setup_runtime_environment(self):
-        """设置运行时环境变量以优化性能"""
-        try:
-            import os
 
-            # 设置线程数优化
-            os.environ["OMP_NUM_THREADS"] = "4"
-            logger.info("运行时环境变量设置完成")
-        except Exception as e:
-            logger.warning(f"环境设置失败: {str(e)}")
+def export_onnx_model(model_dir, quantize=False):
+    """把模型目录中的PyTorch模型导出为ONNX，quantize时导出int8量化模型
 
-    def _signal_handler(self, signum, frame):
-        """处理退出信号"""
-        logger.info(f"收到信号 {signum}，准备退出...")
-        self.running = False
+    已存在导出文件时直接跳过，返回是否执行了导出。导出需要funasr和torch，
+    可以在构建机上预先导出，运行环境只需安装funasr_onnx和onnxruntime。
+    """
+    onnx_file = "model_quant.onnx" if quantize else "model.onnx"
+    if os.path.exists(os.path.join(model_dir, onnx_file)):
+        return False
 
-    def _load_asr_model(self):
-        """加载ASR模型"""
+    from funasr import AutoModel
+
+    logger.info(f"开始导出ONNX模型: {model_dir} (量化: {quantize})")
+    start_time = time.time()
+    model = AutoModel(model=model_dir, disable_update=True, device="cpu")
+    model.export(type="onnx", quantize=quantize)
+    logger.info(f"ONNX模型导出完成，耗时: {time.time() - start_time:.2f}秒")
+    return True
+
+
+class OnnxModel:
+    """funasr_onnx模型的适配器，提供与AutoModel一致的generate接口和返回结构"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+
+    def generate(self, input, **kwargs):
+        if self.name == "vad":
+            # 返回每条输入的语音片段列表 [[开始ms, 结束ms], ...]
+            segments = self.model(input)
+            return [{"value": segments[0] if segments else []}]
+
+        if self.name == "punc":
+            text = self.model(input)[0]
+            return [{"text": text}]
+
+        # funasr_onnx的列表输入只接受文件路径，语音片段逐个推理；不支持热词
+        chunks = input if isinstance(input, list) else [input]
+        results = []
+        for chunk in chunks:
+            output = self.model(chunk)
+            preds = output[0].get("preds", "") if output else ""
+            # 不同版本的funasr_onnx返回文本或(文本, 分词)元组
+            if isinstance(preds, (tuple, list)):
+                preds = preds[0] if preds else ""
+            results.append({"text": preds})
+        return results
+
+
+def _parse_cpu_list(text):
+    """解析Linux的CPU列表格式，例如 "0-7,16-23" """
+    cpus = set()
+    for part in text.strip().split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.update(range(int(start), int(end) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def _sysctl_int(key):
+    """读取macOS的sysctl整数值，不存在时返回None"""
+    import subprocess
+
+    try:
+        output = subprocess.run(
+            ["sysctl", "-n", key], capture_output=True, text=True, timeout=2
+        ).stdout
+        return int(output.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def _count_physical_cores(cpus):
+    """Linux下统计一组逻辑CPU对应的物理核心数，超线程的兄弟CPU只算一次"""
+    cores = set()
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
         try:
-            logger.info("开始加载ASR模型...")
-            with suppress_stdout():
-                from funasr import AutoModel
+            with open(os.path.join(topology, "physical_package_id")) as f:
+                package = f.read().strip()
+            with open(os.path.join(topology, "core_id")) as f:
+                cores.add((package, f.read().strip()))
+        except OSError:
+            return None
+    return len(cores) or None
+
 
-                self.asr_model = AutoModel(
-                    model="damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
-                    model_revision="v2.0.4",
-                    disable_update=True,
-                    device="cpu",
+def detect_cpu_topology():
+    """检测当前进程可用的逻辑CPU、物理核心以及性能核(P核)"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    topology = {
+        "logical": len(cpus),
+        "physical": None,
+        "performance_cpus": None,
+        "performance_physical": None,
+    }
+
+    if sys.platform.startswith("linux"):
+        topology["physical"] = _count_physical_cores(cpus)
+        # Intel混合架构会把P核单独列在cpu_core设备下
+        try:
+            with open("/sys/devices/cpu_core/cpus") as f:
+                performance_cpus = sorted(_parse_cpu_list(f.read()) & set(cpus))
+            if performance_cpus and len(performance_cpus) < len(cpus):
+                topology["performance_cpus"] = performance_cpus
+                topology["performance_physical"] = _count_physical_cores(
+                    performance_cpus
                 )
-            logger.info("ASR模型加载完成")
-            return True
-        except Exception as e:
-            logger.error(f"ASR模型加载失败: {str(e)}")
-            return False
+        except (OSError, ValueError):
+            pass
+    elif sys.platform == "darwin":
+        topology["physical"] = _sysctl_int("hw.physicalcpu")
+        # Apple Silicon: perflevel0为性能核
+        topology["performance_physical"] = _sysctl_int("hw.perflevel0.physicalcpu")
 
-    def _load_vad_model(self):
-        """加载VAD模型"""
+    if not topology["physical"]:
         try:
-            logger.info("开始加载VAD模型...")
-            with suppress_stdout():
-                from funasr import AutoModel
+            import psutil
 
-                self.vad_model = AutoModel(
-                    model="damo/speech_fsmn_vad_zh-cn-16k-common-pytorch",
-                    model_revision="v2.0.4",
-                    disable_update=True,
-                    device="cpu",
-                )
-            logger.info("VAD模型加载完成")
+            topology["physical"] = psutil.cpu_count(logical=False)
+        except ImportError:
+            pass
+    topology["physical"] = min(len(cpus), topology["physical"] or len(cpus))
+    return topology
+
+
+def get_thread_config_path():
+    """线程自动调优结果的保存路径"""
+    if "ELECTRON_USER_DATA" in os.environ:
+        return os.path.join(os.environ["ELECTRON_USER_DATA"], "thread_tuning.json")
+    return os.path.join(os.path.expanduser("~"), ".cache", "ququ", "thread_tuning.json")
+
+
+class ThreadTuner:
+    """CPU线程调度
+
+    按物理核心数为每个模型分配intra-op线程数，避免4核笔记本上线程超订、
+    16核台式机上又用不满。每个进程的ASR推理都由唯一的批处理线程执行，
+    核心只在运行ASR的进程之间平分，与请求并发数无关；VAD和标点模型计算量小，
+    线程多了反而增加同步开销。autotune实测得到的设置会保存下来，
+    同一台机器下次启动时直接使用。
+    """
+
+    def __init__(
+        self, asr_processes=1, pin_performance_cores=False, budget=None,
+        config_path=None,
+    ):
+        self.topology = detect_cpu_topology()
+        self.config_path = config_path or get_thread_config_path()
+        self.pinned = pin_performance_cores and self._pin_performance_cores()
+        self.budget = budget or self._core_budget(pin_performance_cores)
+        self.asr_processes = max(1, asr_processes)
+        self.plan = self._default_plan()
+        self.source = "default"
+        self._interop_set = False
+        # 外部指定了核心预算(批量转录按进程分配)时不使用保存的调优结果
+        if budget is None:
+            self._load_saved_plan()
+
+    def _core_budget(self, prefer_performance_cores):
+        if prefer_performance_cores and self.topology["performance_physical"]:
+            return self.topology["performance_physical"]
+        return self.topology["physical"]
+
+    def _pin_performance_cores(self):
+        """把进程绑定到性能核，只有Linux支持设置CPU亲和性"""
+        performance_cpus = self.topology["performance_cpus"]
+        if not performance_cpus or not hasattr(os, "sched_setaffinity"):
+            logger.info("未检测到可绑定的性能核，按全部核心调度")
+            return False
+        try:
+            os.sched_setaffinity(0, performance_cpus)
+            logger.info(f"已绑定到性能核: {performance_cpus}")
             return True
-        except Exception as e:
-            logger.error(f"VAD模型加载失败: {str(e)}")
+        except OSError as e:
+            logger.warning(f"绑定性能核失败: {str(e)}")
             return False
 
-    def _load_punc_model(self):
-        """加载标点恢复模型"""
+    def _default_plan(self):
+        asr_threads = max(1, self.budget // self.asr_processes)
+        return {
+            "asr": asr_threads,
+            # 流式识别每次只算600ms音频，延迟受同步开销影响更大
+            "online_asr": min(4, self.budget),
+            "vad": 1,
+            "punc": min(2, asr_threads),
+            "interop": 1,
+        }
+
+    def _machine_key(self):
+        return {
+            "platform": sys.platform,
+            "logical": self.topology["logical"],
+            "physical": self.topology["physical"],
+            "budget": self.budget,
+            "asr_processes": self.asr_processes,
+        }
+
+    def _load_saved_plan(self):
         try:
-            import time
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        # CPU或进程数变化后旧的调优结果不再适用
+        if saved.get("machine") != self._machine_key():
+            logger.info("线程调优结果与当前机器不匹配，使用默认线程设置")
+            return
+        for name, threads in saved.get("plan", {}).items():
+            if name in self.plan:
+                self.plan[name] = int(threads)
+        self.source = "autotune"
+        logger.info(f"已加载线程调优结果: {self.plan}")
 
-            start_time = time.time()
-            logger.info("开始加载标点恢复模型...")
+    def save_plan(self):
+        os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"machine": self._machine_key(), "plan": self.plan},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        self.source = "autotune"
 
-            # 记录导入时间
-            import_start = time.time()
-            with suppress_stdout():
-                from funasr import AutoModel
-            import_time = time.time() - import_start
-            logger.info(f"FunASR导入耗时: {import_time:.2f}秒")
+    def setup_environment(self):
+        """在torch/onnxruntime导入前设置OpenMP线程数，用户显式设置的值优先"""
+        os.environ.setdefault("OMP_NUM_THREADS", str(self.plan["asr"]))
+        os.environ.setdefault("MKL_NUM_THREADS", str(self.plan["asr"]))
 
-            # 记录模型创建时间
-            model_start = time.time()
-            with suppress_stdout():
-                self.punc_model = AutoModel(
-                    model="damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
-                    model_revision="v2.0.4",
-                    disable_update=True,
-                    device="cpu",
-                )
-            model_time = time.time() - model_start
-            total_time = time.time() - start_time
+    def apply(self, name, threads=None):
+        """在当前线程中设置torch的intra-op线程数，torch尚未导入时不做任何事"""
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        if not self._interop_set:
+            self._interop_set = True
+            try:
+                # 只能在第一次并行计算前设置一次
+                torch.set_num_interop_threads(self.plan["interop"])
+            except RuntimeError:
+                pass
+        threads = threads or self.plan.get(name)
+        if threads and torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+
+    def candidates(self):
+        """autotune尝试的线程数"""
+        values = {1, 2, 4, self.budget // 2, self.budget}
+        return sorted(n for n in values if 1 <= n <= self.budget)
+
+    def describe(self):
+        return {
+            "topology": self.topology,
+            "budget": self.budget,
+            "pinned": bool(self.pinned),
+            "plan": dict(self.plan),
+            "source": self.source,
+        }
+
+
+class ModelSnapshotCache:
+    """模型快照缓存
+
+    把构建完成的AutoModel整体序列化保存在damo根目录下。下次启动时若
+    模型文件、funasr/torch版本和加载参数的指纹都未变化，就直接反序列化
+    快照，跳过模型仓库检查、配置解析和权重初始化；否则重新构建并覆盖快照。
+    """
+
+    # 快照格式变化时递增，使旧快照全部失效
+    FORMAT_VERSION = 1
+
+    def __init__(self, damo_root):
+        self.damo_root = damo_root
+        self.directory = os.path.join(damo_root, ".ququ_snapshots")
+        self._save_threads = []
+
+    def fingerprint(self, model_id, load_kwargs):
+        """根据模型目录文件清单和运行环境计算指纹，模型目录不存在时返回None"""
+        import hashlib
+
+        repo_dir = os.path.join(self.damo_root, model_id.split("/")[-1])
+        entries = []
+        for root, dirs, files in os.walk(repo_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                relpath = os.path.relpath(path, repo_dir)
+                entries.append(f"{relpath}:{stat.st_size}:{int(stat.st_mtime)}")
+        if not entries:
+            return None
+
+        try:
+            import funasr
+            import torch
+
+            versions = [funasr.__version__, torch.__version__]
+        except (ImportError, AttributeError):
+            return None
+        versions += [sys.version.split()[0], str(self.FORMAT_VERSION)]
+
+        digest = hashlib.sha1()
+        for item in entries + versions + [json.dumps(load_kwargs, sort_keys=True)]:
+            digest.update(item.encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()[:16]
+
+    def _path(self, name, fingerprint):
+        return os.path.join(self.directory, f"{name}-{fingerprint}.pt")
+
+    def load(self, name, fingerprint):
+        """加载指纹匹配的快照，不存在或损坏时返回None"""
+        path = self._path(name, fingerprint)
+        if not os.path.exists(path):
+            return None
+        try:
+            import torch
+
+            return torch.load(path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            logger.warning(f"{name}模型快照加载失败，将重新构建: {str(e)}")
+            self._remove(path)
+            return None
+
+    def save_async(self, name, fingerprint, model):
+        """在后台线程保存快照，不阻塞启动"""
+        if os.path.exists(self._path(name, fingerprint) + ".failed"):
+            return
+        thread = threading.Thread(
+            target=self._save,
+            args=(name, fingerprint, model),
+            name=f"funasr-snapshot-{name}",
+            daemon=True,
+        )
+        self._save_threads.append(thread)
+        thread.start()
 
+    def wait(self):
+        """等待后台保存全部完成"""
+        for thread in self._save_threads:
+            thread.join()
+        self._save_threads = []
+
+    def _save(self, name, fingerprint, model):
+        path = self._path(name, fingerprint)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        try:
+            import torch
+
+            os.makedirs(self.directory, exist_ok=True)
+            start_time = time.time()
+            torch.save(model, tmp_path)
+            # 原子替换，避免进程中途退出留下不完整的快照
+            os.replace(tmp_path, path)
             logger.info(
-                f"标点恢复模型加载完成 - 模型创建耗时: {model_time:.2f}秒, 总耗时: {total_time:.2f}秒"
+                f"{name}模型快照已保存，耗时: {time.time() - start_time:.2f}秒"
             )
-            return True
         except Exception as e:
-            logger.error(f"标点恢复模型加载失败: {str(e)}")
-            return False
+            logger.warning(f"{name}模型快照保存失败: {str(e)}")
+            self._remove(tmp_path)
+            # 记录失败，之后的启动不再重复尝试同一指纹
+            try:
+                with open(path + ".failed", "w", encoding="utf-8") as f:
+                    f.write(str(e))
+            except OSError:
+                pass
+            return
 
-    def initialize(self):
-        """并行初始化FunASR模型"""
-        if self.initialized:
-            return {"success": True, "message": "模型已初始化"}
+        # 清理同一模型的旧快照
+        for old_path in glob.glob(os.path.join(self.directory, f"{name}-*")):
+            if not old_path.startswith(path):
+                self._remove(old_path)
 
+    @staticmethod
+    def _remove(path):
         try:
-            import threading
-            import time
+            os.remove(path)
+        except OSError:
+            pass
 
-            logger.info("正在并行初始化FunASR模型...")
-            start_time = time.time()
 
-            # 创建加载结果存储
-            results = {}
+class ResultCache:
+    """转录结果的磁盘LRU缓存
 
-            def load_model_thread(model_name, load_func):
-                """模型加载线程包装函数"""
-                thread_start = time.time()
-                results[model_name] = load_func()
-                thread_time = time.time() - thread_start
-                logger.info(f"{model_name}模型加载线程耗时: {thread_time:.2f}秒")
+    以解码后PCM、模型版本和影响结果的选项的哈希为键，每条结果保存为一个
+    JSON文件，按最近使用时间淘汰，总大小不超过max_bytes。重试粘贴失败的
+    转录或批量任务重复处理同一文件时直接返回缓存结果。
+    """
 
-            # 创建并启动三个并行线程
-            threads = [
-                threading.Thread(
-                    target=load_model_thread, args=("asr", self._load_asr_model)
-                ),
-                threading.Thread(
-                    target=load_model_thread, args=("vad", self._load_vad_model)
-                ),
-                threading.Thread(
-                    target=load_model_thread, args=("punc", self._load_punc_model)
-                ),
-            ]
+    def __init__(self, directory, max_bytes):
+        from collections import OrderedDict
 
-            # 启动所有线程
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 键 -> 文件大小，按最近使用时间从旧到新排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = os.path.basename(path)[: -len(".json")]
+            existing.append((stat.st_mtime, key, stat.st_size))
+        for _mtime, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(waveform, context):
+        """PCM内容和上下文(模型、选项)的哈希"""
+        import hashlib
+
+        digest = hashlib.blake2b(digest_size=20)
+        context = json.dumps(context, sort_keys=True, ensure_ascii=False)
+        digest.update(context.encode("utf-8"))
+        digest.update(memoryview(waveform).cast("B"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                result = json.load(f)
+            # 更新修改时间，重启后仍能按最近使用顺序淘汰
+            os.utime(self._path(key))
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self._drop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            # 批量转录的多个进程共用缓存目录，其他进程写入的条目也纳入索引
+            if key not in self._entries:
+                size = len(json.dumps(result, ensure_ascii=False).encode("utf-8"))
+                self._entries[key] = size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入结果缓存失败: {str(e)}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _drop(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+        with contextlib.suppress(OSError):
+            os.remove(self._path(key))
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total_bytes / MB, 2),
+                "max_mb": round(self.max_bytes / MB, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+class HotwordCompiler:
+    """热词编译缓存
+
+    支持热词的Paraformer(SeACo/Contextual)每次推理都会调用
+    generate_hotwords_list把热词字符串切分并映射为词表id，热词表有上千条时
+    这一步比推理本身还慢。这里替换该方法，按热词字符串缓存编译结果：
+    已注册的热词表常驻，请求里临时传入的热词按LRU保留最近几个。
+    """
+
+    def __init__(self, max_adhoc=16):
+        from collections import OrderedDict
+
+        self.max_adhoc = max_adhoc
+        self._pinned = {}
+        self._adhoc = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.compiles = 0
+
+    @staticmethod
+    def supports(asr_model):
+        """ASR模型是否支持热词"""
+        module = getattr(asr_model, "model", None)
+        return hasattr(type(module), "generate_hotwords_list")
+
+    def install(self, asr_model):
+        """替换模型类的generate_hotwords_list，类级别替换不影响模型快照的序列化"""
+        import functools
+
+        model_class = type(asr_model.model)
+        original = model_class.generate_hotwords_list
+        if getattr(original, "hotword_compiler", None) is self:
+            return
+        compiler = self
+
+        @functools.wraps(original)
+        def generate_hotwords_list(
+            model, hotword_list_or_file, tokenizer=None, frontend=None
+        ):
+            key = hotword_list_or_file
+            # 热词文件和URL的内容可能变化，不缓存
+            if (
+                not isinstance(key, str)
+                or key.startswith(("http://", "https://"))
+                or os.path.exists(key)
+            ):
+                return original(model, key, tokenizer=tokenizer, frontend=frontend)
+            compiled = compiler._lookup(key)
+            if compiled is None:
+                compiled = original(model, key, tokenizer=tokenizer, frontend=frontend)
+                compiler._store(key, compiled)
+            return compiled
+
+        generate_hotwords_list.hotword_compiler = self
+        model_class.generate_hotwords_list = generate_hotwords_list
+
+    def compile(self, asr_model, hotword, pin=True):
+        """预先编译热词字符串，pin为True时常驻缓存"""
+        asr_model.model.generate_hotwords_list(
+            hotword,
+            tokenizer=asr_model.kwargs.get("tokenizer"),
+            frontend=asr_model.kwargs.get("frontend"),
+        )
+        if pin:
+            with self._lock:
+                if hotword in self._adhoc:
+                    self._pinned[hotword] = self._adhoc.pop(hotword)
+
+    def unpin(self, hotword):
+        with self._lock:
+            self._pinned.pop(hotword, None)
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._pinned:
+                self.hits += 1
+                return self._pinned[key]
+            if key in self._adhoc:
+                self._adhoc.move_to_end(key)
+                self.hits += 1
+                return self._adhoc[key]
+            return None
+
+    def _store(self, key, compiled):
+        with self._lock:
+            self.compiles += 1
+            self._adhoc[key] = compiled
+            while len(self._adhoc) > self.max_adhoc:
+                self._adhoc.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "pinned": len(self._pinned),
+                "adhoc": len(self._adhoc),
+                "hits": self.hits,
+                "compiles": self.compiles,
+            }
+
+
+class IncrementalPunctuator:
+    """增量标点恢复
+
+    逐段接收ASR文本：上一窗口未结束的句尾加上新片段组成窗口送入标点模型，
+    最后一个句末标点之前的部分定稿，之后的部分去掉标点后带入下一窗口重新断句。
+    窗口长度有上限，长录音的内存和单次计算量不随时长增长。
+    """
+
+    def __init__(self, punctuate, join):
+        self._punctuate = punctuate
+        self._join = join
+        self.carry = ""
+        self.parts = []
+        self.windows = 0
+        self.elapsed = 0.0
+
+    def feed(self, text):
+        window = self._join([self.carry, text])
+        if len(window) < PUNC_WINDOW_MIN_CHARS:
+            # 上下文太短时断句不可靠，先积累
+            self.carry = window
+            return
+
+        punctuated = self._timed_punctuate(window)
+        # 标点模型总会在文本末尾补句号，最后一个字符不能作为断句依据
+        cut = max(
+            punctuated.rfind(mark, 0, len(punctuated) - 1)
+            for mark in PUNC_SENTENCE_ENDS
+        )
+        if cut >= 0:
+            self._append(punctuated[: cut + 1])
+            tail = punctuated[cut + 1 :]
+        elif len(window) >= PUNC_WINDOW_MAX_CHARS:
+            self._append(punctuated)
+            tail = ""
+        else:
+            tail = punctuated
+        carry = "".join(ch for ch in tail if ch not in PUNC_MARKS).strip()
+        if carry and carry[-1] in PUNC_ASCII_MARKS:
+            carry = carry[:-1].rstrip()
+        self.carry = carry
+
+    def finish(self):
+        if self.carry:
+            self._append(self._timed_punctuate(self.carry))
+            self.carry = ""
+        return "".join(self.parts)
+
+    def _timed_punctuate(self, text):
+        start_time = time.perf_counter()
+        try:
+            return self._punctuate(text)
+        finally:
+            self.windows += 1
+            self.elapsed += time.perf_counter() - start_time
+
+    def _append(self, text):
+        text = text.strip()
+        if not text:
+            return
+        # 英文句子之间保留空格
+        if self.parts and self.parts[-1][-1].isascii() and text[0].isascii():
+            text = " " + text
+        self.parts.append(text)
+
+
+# 各阶段耗时直方图的桶上限(秒)，实时率直方图单独使用RTF_BUCKETS
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+
+class Histogram:
+    """累积直方图，桶语义与Prometheus一致(le为桶上限)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估算分位数，返回所在桶的上限"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    @staticmethod
+    def _round(value):
+        return round(value, 4) if value is not None else None
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 4) if self.count else None,
+            "p50": self._round(self.quantile(0.5)),
+            "p95": self._round(self.quantile(0.95)),
+            "p99": self._round(self.quantile(0.99)),
+            "max": round(self.max, 4),
+        }
+
+
+class Metrics:
+    """请求级指标：各阶段耗时、实时率、排队等待以及按命令和结果统计的请求数"""
+
+    STAGES = ("decode", "cache", "vad", "asr", "punc", "serialize", "total")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {stage: Histogram(LATENCY_BUCKETS) for stage in self.STAGES}
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self.rtf = Histogram(RTF_BUCKETS)
+        self.requests = {}
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    def observe_queue_wait(self, seconds):
+        with self._lock:
+            self.queue_wait.observe(seconds)
+
+    def observe_rtf(self, rtf):
+        with self._lock:
+            self.rtf.observe(rtf)
+
+    def count_request(self, action, success):
+        key = (str(action), "success" if success else "error")
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start_time)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {
+                    stage: histogram.summary()
+                    for stage, histogram in self.stages.items()
+                },
+                "queue_wait": self.queue_wait.summary(),
+                "rtf": self.rtf.summary(),
+                "requests": {
+                    f"{action}:{status}": count
+                    for (action, status), count in sorted(self.requests.items())
+                },
+            }
+
+    def render_prometheus(self, gauges):
+        """输出Prometheus文本格式；gauges为[(指标名, 说明, [(标签dict, 值), ...])]"""
+
+        def escape(value):
+            value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            return value.replace('"', '\\"')
+
+        def labels(items):
+            if not items:
+                return ""
+            pairs = ",".join(f'{key}="{escape(value)}"' for key, value in items.items())
+            return "{" + pairs + "}"
+
+        def histogram_lines(name, histogram, extra_labels):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                bucket_labels = dict(extra_labels, le=repr(float(bound)))
+                yield f"{name}_bucket{labels(bucket_labels)} {cumulative}"
+            inf_labels = labels(dict(extra_labels, le="+Inf"))
+            yield f"{name}_bucket{inf_labels} {histogram.count}"
+            yield f"{name}_sum{labels(extra_labels)} {histogram.sum:.6f}"
+            yield f"{name}_count{labels(extra_labels)} {histogram.count}"
+
+        lines = []
+        with self._lock:
+            lines.append("# HELP ququ_stage_seconds 转录各阶段耗时")
+            lines.append("# TYPE ququ_stage_seconds histogram")
+            for stage, histogram in self.stages.items():
+                lines.extend(
+                    histogram_lines("ququ_stage_seconds", histogram, {"stage": stage})
+                )
+            lines.append("# HELP ququ_queue_wait_seconds 请求排队等待时间")
+            lines.append("# TYPE ququ_queue_wait_seconds histogram")
+            lines.extend(
+                histogram_lines("ququ_queue_wait_seconds", self.queue_wait, {})
+            )
+            lines.append("# HELP ququ_rtf 转录实时率(处理耗时/音频时长)")
+            lines.append("# TYPE ququ_rtf histogram")
+            lines.extend(histogram_lines("ququ_rtf", self.rtf, {}))
+            lines.append("# HELP ququ_requests_total 按命令和结果统计的请求数")
+            lines.append("# TYPE ququ_requests_total counter")
+            for (action, status), count in sorted(self.requests.items()):
+                request_labels = labels({"action": action, "status": status})
+                lines.append(f"ququ_requests_total{request_labels} {count}")
+
+        for name, help_text, samples in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for sample_labels, value in samples:
+                lines.append(f"{name}{labels(sample_labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """运行时性能分析
+
+    profile_start后分析接下来的N个请求，分析文件写入日志目录，
+    无需重启服务器即可从用户的安装中收集性能数据。
+    cprofile模式对执行请求和ASR批处理的线程分别做函数级分析后合并；
+    sampling模式定时采样所有线程的调用栈，输出可直接生成火焰图的folded文件。
+    可选在模型推理期间开启torch profiler，每次推理输出一个chrome trace。
+    """
+
+    MODES = ("cprofile", "sampling")
+    MAX_TORCH_TRACES = 50
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.active = False
+        self.mode = None
+        self.limit = 0
+        self.requests = 0
+        self.last_result = None
+        self.sessions = 0
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._samples = {}
+        self._torch_traces = []
+        self._sampler = None
+
+    def start(self, mode="cprofile", requests=10, torch_profile=False, interval_ms=5):
+        if mode not in self.MODES:
+            return {"success": False, "error": f"不支持的分析模式: {mode}"}
+        with self._lock:
+            if self.active:
+                return {"success": False, "error": "性能分析已在进行中"}
+            self.active = True
+            self.mode = mode
+            self.limit = max(1, int(requests))
+            self.requests = 0
+            self.torch_profile = bool(torch_profile)
+            self.sessions += 1
+            self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.sessions}"
+            self.started_at = time.time()
+            self._profiles = []
+            self._samples = {}
+            self._torch_traces = []
+        if mode == "sampling":
+            self._sampler = threading.Thread(
+                target=self._sample_loop,
+                args=(max(1, interval_ms) / 1000.0,),
+                name="funasr-profiler",
+                daemon=True,
+            )
+            self._sampler.start()
+        logger.info(f"开始性能分析: {mode}，分析接下来的 {self.limit} 个请求")
+        return {
+            "success": True,
+            "mode": mode,
+            "requests": self.limit,
+            "torch_profile": self.torch_profile,
+            "session": self.session,
+        }
+
+    @contextlib.contextmanager
+    def profile_thread(self):
+        """cprofile模式下分析当前线程中执行的代码块"""
+        profile = self._enable_profile()
+        if profile is None:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def _enable_profile(self):
+        if not self.active or self.mode != "cprofile":
+            return None
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 当前线程已经在被分析(嵌套调用)
+            return None
+        return profile
+
+    @contextlib.contextmanager
+    def torch_profile_model(self, name):
+        """开启torch profiler时，记录一次模型推理的算子级耗时"""
+        torch = sys.modules.get("torch")
+        if (
+            not self.active
+            or not getattr(self, "torch_profile", False)
+            or torch is None
+            or len(self._torch_traces) >= self.MAX_TORCH_TRACES
+        ):
+            yield
+            return
+        from torch.profiler import ProfilerActivity, profile
+
+        with profile(activities=[ProfilerActivity.CPU]) as prof:
+            yield
+        with self._lock:
+            index = len(self._torch_traces)
+            path = os.path.join(
+                self.output_dir, f"profile-{self.session}-torch-{name}-{index}.json"
+            )
+            self._torch_traces.append(path)
+        try:
+            prof.export_chrome_trace(path)
+        except Exception as e:
+            logger.warning(f"导出torch profiler结果失败: {str(e)}")
+
+    def _sample_loop(self, interval):
+        own_ident = threading.get_ident()
+        while self.active:
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                with self._lock:
+                    self._samples[key] = self._samples.get(key, 0) + 1
+            time.sleep(interval)
+
+    def request_done(self):
+        """一个请求执行完毕，达到请求数后自动结束分析"""
+        with self._lock:
+            if not self.active:
+                return
+            self.requests += 1
+            finished = self.requests >= self.limit
+        if finished:
+            self.stop()
+
+    def stop(self):
+        """结束分析并写出分析文件；已自动结束时返回上一次的结果"""
+        with self._lock:
+            if not self.active:
+                if self.last_result:
+                    return self.last_result
+                return {"success": False, "error": "没有进行中的性能分析"}
+            self.active = False
+            profiles, samples = self._profiles, self._samples
+            torch_traces = list(self._torch_traces)
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{self.session}")
+        files = []
+        if profiles:
+            import pstats
+
+            stats = None
+            for profile in profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError:
+                    # 没有记录到任何调用的分析器无法生成统计
+                    continue
+            if stats is not None:
+                stats.dump_stats(base + ".prof")
+                with open(base + ".txt", "w", encoding="utf-8") as f:
+                    stats.stream = f
+                    stats.sort_stats("cumulative").print_stats(60)
+                files += [base + ".prof", base + ".txt"]
+        if samples:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+            files.append(base + ".folded")
+        files += [path for path in torch_traces if os.path.exists(path)]
+
+        result = {
+            "success": True,
+            "mode": self.mode,
+            "requests": self.requests,
+            "duration_s": round(time.time() - self.started_at, 2),
+            "files": files,
+        }
+        self.last_result = result
+        logger.info(f"性能分析结束，共 {self.requests} 个请求，输出文件: {files}")
+        return result
+
+    def get_stats(self):
+        return {
+            "active": self.active,
+            "mode": self.mode,
+            "requests": self.requests,
+            "limit": self.limit,
+        }
+
+
+class StreamSession:
+    """一次流式识别会话：保存在线ASR/VAD的cache以及已识别的文本"""
+
+    def __init__(self, stream_id, options):
+        self.stream_id = stream_id
+        self.options = options
+        self.asr_cache = {}
+        self.vad_cache = {}
+        self.pending = []  # 尚未凑满一个chunk的音频
+        self.pending_samples = 0
+        self.received_samples = 0  # 已接收的音频采样数
+        self.decoded_samples = 0  # 已送入在线ASR的采样数
+        self.sentence_ends = []  # VAD检测到的句尾位置(采样点)
+        self.raw_sentences = []  # 已断句的原始识别文本
+        self.sentences = []  # 已断句并完成标点的文本
+        self.current_text = ""  # 当前句子的实时识别文本
+
+    def partial_text(self, join):
+        return join(self.sentences + [self.current_text])
+
+
+class AsrBatcher:
+    """ASR动态微批处理
+
+    在window_ms时间窗口内收集并发请求提交的语音片段，合并成一次
+    Paraformer前向计算，再把结果拆分回各个请求。只有一个请求在处理时
+    不等待窗口，避免增加单次听写的延迟。
+    """
+
+    def __init__(self, run_batch, window_ms, inflight):
+        self.run_batch = run_batch
+        self.window_s = max(0, window_ms) / 1000.0
+        self.inflight = inflight  # 返回当前正在处理的转录请求数
+        self._queue = []
+        self._cond = threading.Condition()
+        self.batch_count = 0
+        self.job_count = 0
+        self.segment_count = 0
+        self.max_batch_jobs = 0
+        self.total_wait = 0.0
+        self.max_queue_depth = 0
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._loop, name="funasr-asr-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """处理完已提交的任务后结束批处理线程并等待其退出"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def submit(self, chunks, hotword, batch_size_s, touch=True):
+        """提交一组语音片段，返回Future，结果为与chunks对应的识别结果列表
+
+        touch为False(空闲预热)时不更新模型的最近使用时间。
+        """
+        from concurrent.futures import Future
+
+        future = Future()
+        if not chunks:
+            future.set_result([])
+            return future
+        job = {
+            "chunks": chunks,
+            "hotword": hotword,
+            "limit_ms": max(1, batch_size_s) * 1000,
+            "audio_ms": sum(len(c) for c in chunks) * 1000 // SAMPLE_RATE,
+            "future": future,
+            "touch": touch,
+            "enqueued_at": time.time(),
+        }
+        with self._cond:
+            self._queue.append(job)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._run(batch)
+
+    def _collect(self):
+        with self._cond:
+            while not self._queue:
+                if self._stopped:
+                    return None
+                self._cond.wait()
+
+            # 等待窗口：直到窗口结束、音频总量达到上限或所有并发请求都已提交
+            first = self._queue[0]
+            deadline = first["enqueued_at"] + self.window_s
+            while True:
+                queued_ms = sum(job["audio_ms"] for job in self._queue)
+                remaining = deadline - time.time()
+                if (
+                    remaining <= 0
+                    or queued_ms >= first["limit_ms"]
+                    or len(self._queue) >= self.inflight()
+                ):
+                    break
+                self._cond.wait(remaining)
+
+            # 热词不同的请求不能合并到同一次计算
+            batch = []
+            batch_ms = 0
+            for job in list(self._queue):
+                if job["hotword"] != first["hotword"]:
+                    continue
+                if batch and batch_ms + job["audio_ms"] > first["limit_ms"]:
+                    continue
+                batch.append(job)
+                batch_ms += job["audio_ms"]
+                self._queue.remove(job)
+            return batch
+
+    def _run(self, batch):
+        started = time.time()
+        chunks = [chunk for job in batch for chunk in job["chunks"]]
+        try:
+            results = self.run_batch(
+                chunks, batch[0]["hotword"], any(job["touch"] for job in batch)
+            )
+        except Exception as e:
+            for job in batch:
+                job["future"].set_exception(e)
+            return
+
+        offset = 0
+        for job in batch:
+            count = len(job["chunks"])
+            job["future"].set_result(results[offset : offset + count])
+            offset += count
+
+        with self._cond:
+            self.batch_count += 1
+            self.job_count += len(batch)
+            self.segment_count += len(chunks)
+            self.max_batch_jobs = max(self.max_batch_jobs, len(batch))
+            self.total_wait += sum(started - job["enqueued_at"] for job in batch)
+
+    def get_stats(self):
+        with self._cond:
+            batches = max(1, self.batch_count)
+            return {
+                "window_ms": round(self.window_s * 1000),
+                "batches": self.batch_count,
+                "avg_batch_jobs": round(self.job_count / batches, 2),
+                "max_batch_jobs": self.max_batch_jobs,
+                "avg_batch_segments": round(self.segment_count / batches, 2),
+                "avg_wait_ms": round(
+                    self.total_wait * 1000 / max(1, self.job_count), 2
+                ),
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+# 多进程模式下需要发给每个工作进程的命令：查询类命令汇总各进程结果，
+# 热词、预热等会改变进程状态的命令在所有进程上执行
+BROADCAST_ACTIONS = CONTROL_ACTIONS | {"hotwords_load", "warmup"}
+
+
+class PreforkPool:
+    """预派生(pre-fork)工作进程池
+
+    父进程加载一次模型后fork出多个工作进程，模型权重通过写时复制共享，
+    内存不会随进程数成倍增长，推理也不再受单进程GIL的限制。
+    父进程读取stdin，把请求分发给未完成请求最少的工作进程并转发响应；
+    流式会话固定在创建它的工作进程上。
+    """
+
+    def __init__(self, server, size):
+        self.server = server
+        self.size = size
+        self.workers = []
+        self.streams = {}  # stream_id -> 工作进程
+        self._pending = {}  # 内部请求id -> 请求信息
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        import gc
+
+        # fork只复制调用线程，其他线程此刻持有的锁在子进程中永远不会释放，
+        # 因此先让父进程的后台线程全部停下：快照必须写完，否则子进程会继承写了一半的文件；
+        # 父进程只分发请求，不再需要ASR批处理线程(工作进程各自重建)
+        if self.server._snapshot_cache is not None:
+            logger.info("等待模型快照保存完成后再启动工作进程")
+            self.server._snapshot_cache.wait()
+        self.server._asr_batcher.stop()
+
+        # 冻结已有对象，GC不再改写它们的对象头，共享的内存页不会因此被复制
+        gc.collect()
+        gc.freeze()
+
+        with logging_paused():
+            pipes = self._fork_workers()
+
+        # 读取线程在所有子进程fork完成后才启动，不会被后fork的子进程继承
+        for index, (pid, request_write, response_read) in enumerate(pipes):
+            worker = {
+                "index": index,
+                "pid": pid,
+                "stdin": os.fdopen(request_write, "wb"),
+                "inflight": 0,
+                "alive": True,
+            }
+            worker["reader"] = threading.Thread(
+                target=self._read_responses,
+                args=(worker, os.fdopen(response_read, "rb")),
+                name=f"funasr-worker-{index}",
+                daemon=True,
+            )
+            self.workers.append(worker)
+            worker["reader"].start()
+        logger.info(f"已启动 {self.size} 个工作进程: {[w['pid'] for w in self.workers]}")
+
+    def _fork_workers(self):
+        """fork出全部工作进程，返回父进程一侧的 [(pid, 请求管道写端, 响应管道读端)]
+
+        此时父进程中除调用线程外只剩阻塞在读取stdin上的主线程，工作进程
+        不使用stdin，运行时使用的锁也会在_run_worker中重新创建。
+        """
+        pipes = []
+        for index in range(self.size):
+            request_read, request_write = os.pipe()
+            response_read, response_write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # 父进程的日志写入线程不会被fork复制，工作进程重建自己的日志管道
+                reinit_logging_after_fork(f"worker{index}")
+                os.close(request_write)
+                os.close(response_read)
+                # 关闭继承来的其他工作进程的管道，父进程关闭管道时它们才能收到EOF
+                for _pid, *fds in pipes:
+                    for fd in fds:
+                        os.close(fd)
+                code = 0
+                try:
+                    self.server._run_worker(index, request_read, response_write)
+                except BaseException:
+                    logger.error(traceback.format_exc())
+                    code = 1
+                finally:
+                    # os._exit不执行atexit，先写完队列中的日志
+                    shutdown_logging()
+                    os._exit(code)
+            os.close(request_read)
+            os.close(response_write)
+            pipes.append((pid, request_write, response_read))
+        return pipes
+
+    def dispatch(self, command, audio_data=None):
+        action = command.get("action")
+        alive = [w for w in self.workers if w["alive"]]
+        if action in BROADCAST_ACTIONS:
+            targets = alive
+        elif command.get("stream_id") in self.streams:
+            targets = [self.streams[command["stream_id"]]]
+        elif alive:
+            targets = [min(alive, key=lambda w: w["inflight"])]
+        else:
+            targets = []
+        if not targets:
+            self.server._send_response(
+                {"success": False, "error": "没有可用的工作进程"}, command.get("id")
+            )
+            return
+
+        group = None
+        if action in BROADCAST_ACTIONS:
+            group = {"results": {}, "expected": len(targets)}
+        for worker in targets:
+            with self._lock:
+                self._seq += 1
+                internal_id = self._seq
+                self._pending[internal_id] = {
+                    "id": command.get("id"),
+                    "action": action,
+                    "stream_id": command.get("stream_id"),
+                    "worker": worker,
+                    "group": group,
+                }
+                worker["inflight"] += 1
+            frame = json.dumps(dict(command, id=internal_id), ensure_ascii=False)
+            try:
+                worker["stdin"].write(frame.encode("utf-8") + b"\n")
+                if audio_data is not None:
+                    worker["stdin"].write(audio_data)
+                worker["stdin"].flush()
+            except OSError as e:
+                logger.error(f"向工作进程 {worker['pid']} 发送请求失败: {str(e)}")
+                self._finish(
+                    internal_id, {"success": False, "error": "工作进程已退出"}
+                )
+
+    def _read_responses(self, worker, responses):
+        for line in responses:
+            try:
+                response = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if response.get("event"):
+                # 中间事件直接转发，请求仍未完成
+                entry = self._pending.get(response.get("id"))
+                self.server._send_response(
+                    self._client_response(response), entry and entry["id"]
+                )
+            else:
+                self._finish(response.get("id"), response)
+        self._worker_exited(worker)
+
+    def _finish(self, internal_id, response):
+        with self._lock:
+            entry = self._pending.pop(internal_id, None)
+            if entry is None:
+                return
+            worker = entry["worker"]
+            worker["inflight"] -= 1
+            if response.get("success"):
+                if entry["action"] == "stream_start" and response.get("stream_id"):
+                    self.streams[response["stream_id"]] = worker
+                elif entry["action"] in ("stream_end", "stream_cancel"):
+                    self.streams.pop(entry["stream_id"], None)
+            group = entry["group"]
+            if group is not None:
+                group["results"][worker["index"]] = self._client_response(response)
+                if len(group["results"]) < group["expected"]:
+                    return
+        response = self._client_response(response)
+        if group is not None:
+            # 以第一个工作进程的结果为主体，附上每个进程各自的结果
+            results = [group["results"][i] for i in sorted(group["results"])]
+            response = dict(
+                results[0],
+                success=all(r.get("success") for r in results),
+                workers=results,
+            )
+            if entry["action"] == "stats":
+                response["pool"] = self.get_stats()
+        self.server._send_response(response, entry["id"])
+
+    @staticmethod
+    def _client_response(response):
+        return {key: value for key, value in response.items() if key != "id"}
+
+    def _worker_exited(self, worker):
+        worker["alive"] = False
+        try:
+            os.waitpid(worker["pid"], 0)
+        except ChildProcessError:
+            pass
+        if self.server.running:
+            logger.error(f"工作进程 {worker['pid']} 异常退出")
+        with self._lock:
+            orphaned = [
+                internal_id
+                for internal_id, entry in self._pending.items()
+                if entry["worker"] is worker
+            ]
+            for stream_id in [k for k, w in self.streams.items() if w is worker]:
+                del self.streams[stream_id]
+        for internal_id in orphaned:
+            self._finish(internal_id, {"success": False, "error": "工作进程已退出"})
+
+    def get_stats(self):
+        return {
+            "workers": self.size,
+            "alive": sum(1 for w in self.workers if w["alive"]),
+            "inflight": [w["inflight"] for w in self.workers],
+            "streams": len(self.streams),
+        }
+
+    def shutdown(self):
+        """关闭请求管道，工作进程读到EOF后退出"""
+        for worker in self.workers:
+            try:
+                worker["stdin"].close()
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker["reader"].join(timeout=5)
+
+
+class FunASRServer:
+    def __init__(
+        self,
+        damo_root=None,
+        max_concurrency=2,
+        batch_window_ms=20,
+        lazy_load=False,
+        idle_unload_s=0,
+        use_snapshots=True,
+        backends=None,
+        onnx_quantize=False,
+        quantize=False,
+        pin_cores=False,
+        thread_budget=None,
+        thread_config=None,
+        result_cache_dir=None,
+        result_cache_mb=256,
+        metrics_port=None,
+        warmup_interval_s=0,
+        workers=1,
+        preload_streaming=False,
+    ):
+        self.asr_model = None
+        self.vad_model = None
+        self.punc_model = None
+        self.online_asr_model = None
+        self.streams = {}
+        self.initialized = False
+        self.running = True
+        self.transcription_count = 0
+        self.total_audio_duration = 0.0
+        self.total_skipped_duration = 0.0
+        self.max_concurrency = max(1, max_concurrency)
+        # 客户端开启了流式识别：启动时预加载流式模型，且不因空闲而卸载
+        self.preload_streaming = preload_streaming
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._output_lock = threading.Lock()
+        # 后台初始化时各模型的加载状态，status命令据此报告进度
+        self.init_progress = {}
+
+        # 多进程模式依赖fork，工作进程通过写时复制共享父进程加载好的模型
+        self.workers = max(1, workers)
+        if self.workers > 1 and not hasattr(os, "fork"):
+            logger.warning("当前平台不支持fork，多进程模式不可用，以单进程模式运行")
+            self.workers = 1
+        if self.workers > 1 and (lazy_load or idle_unload_s):
+            # 工作进程自行加载的模型不再共享，按需加载和空闲卸载在多进程模式下关闭
+            logger.warning("多进程模式下模型必须预先加载，忽略按需加载和空闲卸载设置")
+            lazy_load, idle_unload_s = False, 0
+
+        # 模型生命周期：按需加载、使用计数、空闲卸载
+        self.lazy_load = lazy_load
+        self.idle_unload_s = max(0, idle_unload_s)
+        self._model_locks = {name: threading.Lock() for name in MODEL_ATTRS}
+        self._model_users = dict.fromkeys(MODEL_ATTRS, 0)
+        self._model_last_used = {}
+        self._model_load_info = {}
+        self.inflight_transcriptions = 0
+        self._asr_batcher = AsrBatcher(
+            self._generate_asr_batch,
+            batch_window_ms,
+            lambda: self.inflight_transcriptions,
+        )
+        # 记录真实的stdout，避免suppress_stdout临时替换时响应被吞掉
+        self._stdout = sys.stdout
+
+        # 外部传入的 damo 根目录（例如 /Volumes/APFS/AI/models/damo）
+        self.damo_root = (
+            damo_root or os.environ.get("DAMO_ROOT") or default_damo_root()
+        )
+        self._snapshot_cache = (
+            ModelSnapshotCache(self.damo_root) if use_snapshots else None
+        )
+        # 下载脚本写入的模型清单，启动时据此判断模型是否就绪
+        self.model_manifest = load_model_manifest(self.damo_root)
+
+        # 每个模型单独选择推理后端
+        self.backends = dict.fromkeys(MODEL_IDS, "pytorch")
+        for name, backend in (backends or {}).items():
+            if backend not in MODEL_BACKENDS:
+                raise ValueError(f"不支持的推理后端: {backend}")
+            if backend == "onnx" and name not in ONNX_MODEL_CLASSES:
+                raise ValueError(f"{name}模型不支持ONNX推理后端")
+            self.backends[name] = backend
+        self.onnx_quantize = onnx_quantize
+        # PyTorch后端的动态int8量化
+        self.quantize = quantize
+
+        # 请求级指标，可选通过本地HTTP端口以Prometheus文本格式暴露
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+
+        # 运行时性能分析，输出写入日志目录
+        self._profiler = RequestProfiler(os.path.dirname(log_file_path))
+
+        # 可选的转录结果缓存
+        self._result_cache = None
+        if result_cache_dir:
+            try:
+                self._result_cache = ResultCache(
+                    result_cache_dir, int(result_cache_mb * MB)
+                )
+            except OSError as e:
+                logger.warning(f"结果缓存目录不可用，禁用结果缓存: {str(e)}")
+
+        # 已注册的热词表，转录请求通过options.hotword_list按名称引用
+        self.hotword_lists = {}
+        self.active_hotword_list = None
+        self._hotword_compiler = HotwordCompiler()
+
+        # 按CPU拓扑为各模型分配线程数
+        # 所有ASR调用都经过每个进程唯一的AsrBatcher线程，核心按进程数分配
+        self._thread_tuner = ThreadTuner(
+            self.workers,
+            pin_performance_cores=pin_cores,
+            budget=thread_budget,
+            config_path=thread_config,
+        )
+
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        signal.signal(signal.SIGINT, self._signal_handler)
+        self._setup_runtime_environment()
+
+        if self.idle_unload_s > 0:
+            threading.Thread(
+                target=self._idle_unload_loop, name="funasr-idle-unload", daemon=True
+            ).start()
+
+        # 预热：客户端在按下录音热键时请求，长时间空闲后也会定时预热已加载的模型
+        self.warmup_interval_s = max(0, warmup_interval_s)
+        self._warmup_lock = threading.Lock()
+        self._last_warmup = 0.0
+        self.warmup_stats = {"requested": 0, "idle": 0, "skipped": 0, "saved_s": 0.0}
+        # 多进程模式下父进程不做推理，由各工作进程自行预热
+        if self.warmup_interval_s > 0 and self.workers == 1:
+            threading.Thread(
+                target=self._idle_warmup_loop, name="funasr-idle-warmup", daemon=True
+            ).start()
+
+    def _setup_runtime_environment(self):
+        """设置运行时环境变量以优化性能"""
+        try:
+            import os
+
+            # 设置线程数优化（批量转录的工作进程会预先按进程数分配线程）
+            self._thread_tuner.setup_environment()
+            logger.info(
+                f"运行时环境变量设置完成，线程设置: {self._thread_tuner.describe()}"
+            )
+        except Exception as e:
+            logger.warning(f"环境设置失败: {str(e)}")
+
+    def _signal_handler(self, signum, frame):
+        """处理退出信号"""
+        logger.info(f"收到信号 {signum}，准备退出...")
+        self.running = False
+
+    def _create_model(self, name):
+        """按该模型选择的推理后端创建模型"""
+        if self.backends[name] == "onnx":
+            return self._create_onnx_model(name)
+        model = MODEL_IDS[name]
+        if self.model_manifest and name in self.model_manifest:
+            # 清单中已校验的模型直接从本地目录加载，不经过ModelScope的缓存查找
+            model = os.path.join(self.damo_root, self.model_manifest[name]["dir"])
+        return self._create_auto_model(
+            name,
+            quantize=self.quantize and name in QUANTIZABLE_MODELS,
+            model=model,
+            model_revision="v2.0.4",
+            disable_update=True,
+            device="cpu",
+        )
+
+    def _create_onnx_model(self, name):
+        """创建ONNX Runtime推理的模型，模型目录中还没有ONNX文件时先导出"""
+        import funasr_onnx
+
+        model_dir = os.path.join(self.damo_root, MODEL_IDS[name].split("/")[-1])
+        export_onnx_model(model_dir, self.onnx_quantize)
+        model_class = getattr(funasr_onnx, ONNX_MODEL_CLASSES[name])
+        model = model_class(
+            model_dir,
+            quantize=self.onnx_quantize,
+            intra_op_num_threads=self._thread_tuner.plan[name],
+        )
+        return OnnxModel(name, model)
+
+    def _create_auto_model(self, name, quantize=False, **load_kwargs):
+        """创建AutoModel：快照指纹匹配时直接加载快照，否则重新构建并保存快照
+
+        quantize时对线性层做动态int8量化，快照保存的是量化后的模型，
+        之后启动直接加载量化副本，无需重复量化。
+        """
+        fingerprint = None
+        if self._snapshot_cache is not None:
+            fingerprint = self._snapshot_cache.fingerprint(
+                load_kwargs["model"], dict(load_kwargs, quantize=quantize)
+            )
+            if fingerprint:
+                model = self._snapshot_cache.load(name, fingerprint)
+                if model is not None:
+                    logger.info(f"{name}模型已从快照加载")
+                    return model
+
+        from funasr import AutoModel
+
+        model = AutoModel(**load_kwargs)
+        if quantize:
+            start_time = time.time()
+            quantize_dynamic_int8(model)
+            logger.info(
+                f"{name}模型动态int8量化完成，耗时: {time.time() - start_time:.2f}秒"
+            )
+        if fingerprint:
+            self._snapshot_cache.save_async(name, fingerprint, model)
+        return model
+
+    def _load_asr_model(self):
+        """加载ASR模型"""
+        try:
+            logger.info(f"开始加载ASR模型({self.backends['asr']})...")
+            with suppress_stdout():
+                self.asr_model = self._create_model("asr")
+            if HotwordCompiler.supports(self.asr_model):
+                self._hotword_compiler.install(self.asr_model)
+            logger.info("ASR模型加载完成")
+            return True
+        except Exception as e:
+            logger.error(f"ASR模型加载失败: {str(e)}")
+            return False
+
+    def _load_vad_model(self):
+        """加载VAD模型"""
+        try:
+            logger.info(f"开始加载VAD模型({self.backends['vad']})...")
+            with suppress_stdout():
+                self.vad_model = self._create_model("vad")
+            logger.info("VAD模型加载完成")
+            return True
+        except Exception as e:
+            logger.error(f"VAD模型加载失败: {str(e)}")
+            return False
+
+    def _load_punc_model(self):
+        """加载标点恢复模型"""
+        try:
+            import time
+
+            start_time = time.time()
+            logger.info(f"开始加载标点恢复模型({self.backends['punc']})...")
+
+            # 记录导入时间，ONNX后端不需要导入FunASR
+            if self.backends["punc"] == "pytorch":
+                import_start = time.time()
+                with suppress_stdout():
+                    from funasr import AutoModel
+                import_time = time.time() - import_start
+                logger.info(f"FunASR导入耗时: {import_time:.2f}秒")
+
+            # 记录模型创建时间
+            model_start = time.time()
+            with suppress_stdout():
+                self.punc_model = self._create_model("punc")
+            model_time = time.time() - model_start
+            total_time = time.time() - start_time
+
+            logger.info(
+                f"标点恢复模型加载完成 - 模型创建耗时: {model_time:.2f}秒, 总耗时: {total_time:.2f}秒"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"标点恢复模型加载失败: {str(e)}")
+            return False
+
+    def _load_online_asr_model(self):
+        """加载流式(online) Paraformer模型，首次开始流式识别时才加载"""
+        try:
+            logger.info("开始加载流式ASR模型...")
+            with suppress_stdout():
+                self.online_asr_model = self._create_model("online_asr")
+            logger.info("流式ASR模型加载完成")
+            return True
+        except Exception as e:
+            logger.error(f"流式ASR模型加载失败: {str(e)}")
+            return False
+
+    def initialize(self, on_progress=None):
+        """并行初始化FunASR模型，多个请求同时触发时只初始化一次
+
+        on_progress在每个模型加载完成时收到一个init_progress事件。
+        """
+        with self._init_lock:
+            return self._initialize_models(on_progress)
+
+    def _required_packages(self):
+        # 全部使用ONNX后端时只需要funasr_onnx，不依赖funasr和torch
+        return sorted(
+            {
+                "funasr_onnx" if self.backends[name] == "onnx" else "funasr"
+                for name in ONNX_MODEL_CLASSES
+            }
+        )
+
+    def _initialize_models(self, on_progress=None):
+        if self.initialized:
+            return {"success": True, "message": "模型已初始化"}
+
+        if self.lazy_load:
+            import importlib.util
+
+            for package in self._required_packages():
+                if importlib.util.find_spec(package) is None:
+                    error_msg = (
+                        f"{package}未安装，请先安装: pip install {package.replace('_', '-')}"
+                    )
+                    logger.error(error_msg)
+                    return {
+                        "success": False,
+                        "error": error_msg,
+                        "type": "import_error",
+                    }
+            self.initialized = True
+            logger.info("按需加载模式：各模型将在首次使用时加载")
+            return {"success": True, "message": "按需加载模式，模型将在首次使用时加载"}
+
+        try:
+            import threading
+            import time
+
+            logger.info("正在并行初始化FunASR模型...")
+            start_time = time.time()
+
+            # 创建加载结果存储
+            results = {}
+            model_names = ("asr", "vad", "punc")
+            progress_lock = threading.Lock()
+
+            def load_model_thread(model_name):
+                """模型加载线程包装函数"""
+                thread_start = time.time()
+                try:
+                    with self._model_locks[model_name]:
+                        if getattr(self, MODEL_ATTRS[model_name]) is None:
+                            self._load_model(model_name)
+                    results[model_name] = True
+                except RuntimeError:
+                    results[model_name] = False
+                thread_time = time.time() - thread_start
+                logger.info(f"{model_name}模型加载线程耗时: {thread_time:.2f}秒")
+                with progress_lock:
+                    self.init_progress[model_name] = (
+                        "loaded" if results[model_name] else "failed"
+                    )
+                    event = {
+                        "event": "init_progress",
+                        "model": model_name,
+                        "status": self.init_progress[model_name],
+                        "load_time": round(thread_time, 2),
+                        "loaded": sum(
+                            1 for v in self.init_progress.values() if v == "loaded"
+                        ),
+                        "total": len(model_names),
+                    }
+                if on_progress:
+                    on_progress(event)
+
+            # 创建并启动三个并行线程
+            self.init_progress = dict.fromkeys(model_names, "loading")
+            threads = [
+                threading.Thread(target=load_model_thread, args=(name,))
+                for name in model_names
+            ]
+
+            # 启动所有线程
             for thread in threads:
                 thread.start()
 
-            # 等待所有线程完成，设置超时
-            for thread in threads:
-                thread.join(timeout=300)  # 5分钟超时
-                if thread.is_alive():
-                    logger.error(f"模型加载线程超时")
-                    return {
-                        "success": False,
-                        "error": "模型加载超时",
-                        "type": "timeout_error",
+            # 等待所有线程完成，设置超时
+            for thread in threads:
+                thread.join(timeout=300)  # 5分钟超时
+                if thread.is_alive():
+                    logger.error(f"模型加载线程超时")
+                    return {
+                        "success": False,
+                        "error": "模型加载超时",
+                        "type": "timeout_error",
+                    }
+
+            # 检查加载结果
+            failed_models = [name for name, success in results.items() if not success]
+
+            if failed_models:
+                error_msg = f"以下模型加载失败: {', '.join(failed_models)}"
+                logger.error(error_msg)
+                return {"success": False, "error": error_msg, "type": "init_error"}
+
+            total_time = time.time() - start_time
+            self.initialized = True
+            logger.info(
+                f"所有FunASR模型并行初始化完成，总耗时: {total_time:.2f}秒"
+            )
+            if self.preload_streaming:
+                self._preload_streaming_model()
+            return {
+                "success": True,
+                "message": f"FunASR模型并行初始化成功，耗时: {total_time:.2f}秒",
+            }
+
+        except ImportError as e:
+            error_msg = "FunASR未安装，请先安装FunASR: pip install funasr"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg, "type": "import_error"}
+
+        except Exception as e:
+            error_msg = f"FunASR模型初始化失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "init_error"}
+
+    def _preload_streaming_model(self):
+        """预加载流式模型，避免第一次实时识别时才加载
+
+        模型文件不在本地时不在这里下载，流式会话会被拒绝并回退到整段识别。
+        """
+        if not self._model_downloaded("online_asr"):
+            logger.warning("流式ASR模型未下载，跳过预加载，请重新运行模型下载")
+            return
+        try:
+            with self._use_model("online_asr", touch=False):
+                pass
+        except RuntimeError:
+            logger.warning("流式ASR模型预加载失败，开始流式识别时再加载")
+
+    def _model_downloaded(self, name):
+        """模型是否已在本地：下载清单中记录为完整，或目录中有模型文件"""
+        if self.model_manifest and name in self.model_manifest:
+            return True
+        repo_dir = os.path.join(self.damo_root, MODEL_IDS[name].split("/")[-1])
+        return model_repo_ready(repo_dir)
+
+    def _load_model(self, name):
+        """加载单个模型并记录耗时和内存增量，调用方需持有该模型的锁"""
+        rss_before = get_rss_bytes()
+        start_time = time.time()
+        if not getattr(self, MODEL_LOADERS[name])():
+            raise RuntimeError(f"{name}模型加载失败")
+        self._model_load_info[name] = {
+            "load_time": round(time.time() - start_time, 2),
+            # 并行加载时多个模型的增量会互相重叠，仅供参考
+            "rss_delta": max(0, get_rss_bytes() - rss_before),
+        }
+        self._model_last_used[name] = time.time()
+        return getattr(self, MODEL_ATTRS[name])
+
+    @contextlib.contextmanager
+    def _use_model(self, name, touch=True):
+        """按需加载并使用模型，使用期间不会被空闲卸载
+
+        touch为False时不更新最近使用时间，定时预热不会推迟空闲卸载。
+        """
+        with self._model_locks[name]:
+            model = getattr(self, MODEL_ATTRS[name])
+            if model is None:
+                model = self._load_model(name)
+            self._model_users[name] += 1
+        try:
+            # ONNX会话的线程数在创建时已固定
+            if self.backends[name] == "pytorch":
+                self._thread_tuner.apply(name)
+            with self._profiler.torch_profile_model(name):
+                yield model
+        finally:
+            with self._model_locks[name]:
+                self._model_users[name] -= 1
+                if touch:
+                    self._model_last_used[name] = time.time()
+
+    def warmup(self, options=None, idle=False):
+        """用极短的假数据各跑一遍VAD/ASR/标点模型
+
+        首次推理要承担缓存、内存分配器增长和权重缺页的开销，在用户说话期间
+        提前完成，停止录音时推理已经是热的。每个模型连续跑两遍，两遍的耗时差
+        即这次预热替用户省下的延迟。idle为True时只预热已加载的模型。
+        """
+        if not self.initialized:
+            init_result = self.initialize()
+            if not init_result["success"]:
+                return init_result
+        options = options or {}
+        if not self._warmup_lock.acquire(blocking=False):
+            return {"success": True, "skipped": True, "message": "预热正在进行中"}
+
+        try:
+            import numpy as np
+
+            rng = np.random.default_rng(0)
+            waveform = (
+                rng.standard_normal(int(WARMUP_AUDIO_S * SAMPLE_RATE)) * 0.01
+            ).astype(np.float32)
+            now = time.time()
+            default_models = (
+                STREAM_WARMUP_MODELS if self.preload_streaming else WARMUP_MODELS
+            )
+            names = [
+                name
+                for name in options.get("models", default_models)
+                if name in STREAM_WARMUP_MODELS
+            ]
+            report = {}
+            saved = 0.0
+            for name in names:
+                loaded = getattr(self, MODEL_ATTRS[name]) is not None
+                if idle and not loaded:
+                    continue
+                if not loaded and not self._model_downloaded(name):
+                    # 预热不应在用户录音时触发模型下载
+                    report[name] = {"skipped": True, "downloaded": False}
+                    continue
+                last_used = self._model_last_used.get(name, 0.0)
+                if not idle and loaded and now - last_used < WARMUP_FRESH_S:
+                    report[name] = {"skipped": True}
+                    continue
+                cold = self._warmup_pass(name, waveform, touch=not idle)
+                warm = self._warmup_pass(name, waveform, touch=not idle)
+                saved += max(0.0, cold - warm)
+                report[name] = {
+                    "cold_ms": round(cold * 1000, 1),
+                    "warm_ms": round(warm * 1000, 1),
+                    "loaded": not loaded,
+                }
+
+            self._last_warmup = time.time()
+            with self._stats_lock:
+                self.warmup_stats["idle" if idle else "requested"] += 1
+                if not any("cold_ms" in item for item in report.values()):
+                    self.warmup_stats["skipped"] += 1
+                self.warmup_stats["saved_s"] += saved
+            if saved > 0:
+                logger.info(f"模型预热完成，节省首次推理延迟 {saved * 1000:.0f}ms")
+            return {
+                "success": True,
+                "models": report,
+                "saved_ms": round(saved * 1000, 1),
+            }
+        except Exception as e:
+            logger.warning(f"模型预热失败: {str(e)}")
+            return {"success": False, "error": f"模型预热失败: {str(e)}"}
+        finally:
+            self._warmup_lock.release()
+
+    def _warmup_pass(self, name, waveform, touch=True):
+        start_time = time.perf_counter()
+        with self._use_model(name, touch=touch) as model:
+            if name == "vad":
+                model.generate(input=waveform, fs=SAMPLE_RATE)
+            elif name == "asr":
+                # 与识别请求一样经过批处理线程，不与正在进行的ASR计算并发
+                self._asr_batcher.submit([waveform], "", 60, touch=touch).result()
+            elif name == "online_asr":
+                model.generate(
+                    input=waveform[:STREAM_CHUNK_SAMPLES],
+                    cache={},
+                    is_final=True,
+                    chunk_size=STREAM_CHUNK_SIZE,
+                    encoder_chunk_look_back=STREAM_ENCODER_CHUNK_LOOK_BACK,
+                    decoder_chunk_look_back=STREAM_DECODER_CHUNK_LOOK_BACK,
+                )
+            else:
+                model.generate(input=WARMUP_TEXT)
+        return time.perf_counter() - start_time
+
+    def _idle_warmup_loop(self):
+        """空闲超过warmup_interval_s后预热已加载的模型，避免权重页被换出"""
+        interval = max(1.0, min(30.0, self.warmup_interval_s / 4))
+        while self.running:
+            time.sleep(interval)
+            if not self.initialized:
+                continue
+            last_activity = max(
+                [self._last_warmup, *self._model_last_used.values()]
+            )
+            if time.time() - last_activity >= self.warmup_interval_s:
+                self.warmup(idle=True)
+
+    def _idle_unload_loop(self):
+        """定期卸载空闲超过idle_unload_s的模型"""
+        interval = max(1.0, min(30.0, self.idle_unload_s / 4))
+        while self.running:
+            time.sleep(interval)
+            self._unload_idle_models()
+
+    def _unload_idle_models(self):
+        now = time.time()
+        unloaded = []
+        for name, attr in MODEL_ATTRS.items():
+            with self._model_locks[name]:
+                if getattr(self, attr) is None or self._model_users[name] > 0:
+                    continue
+                if name == "online_asr" and (self.streams or self.preload_streaming):
+                    continue
+                if now - self._model_last_used.get(name, now) < self.idle_unload_s:
+                    continue
+                setattr(self, attr, None)
+                unloaded.append(name)
+        if unloaded:
+            logger.info(
+                f"模型空闲超过 {self.idle_unload_s} 秒，已卸载: {', '.join(unloaded)}"
+            )
+            self._cleanup_memory()
+
+    @staticmethod
+    def _model_param_bytes(model):
+        """模型参数和缓冲区占用的字节数"""
+        module = getattr(model, "model", None)
+        try:
+            # 动态量化线性层的权重以(int8权重, 偏置)元组形式保存在state_dict中
+            total = 0
+            for value in module.state_dict().values():
+                values = value if isinstance(value, tuple) else (value,)
+                for tensor in values:
+                    if hasattr(tensor, "element_size"):
+                        total += tensor.numel() * tensor.element_size()
+            return total
+        except Exception:
+            return 0
+
+    def get_memory_usage(self):
+        """报告进程内存以及每个模型的内存占用"""
+        now = time.time()
+        models = {}
+        for name, attr in MODEL_ATTRS.items():
+            model = getattr(self, attr)
+            load_info = self._model_load_info.get(name, {})
+            models[name] = {
+                "loaded": model is not None,
+                "param_mb": round(self._model_param_bytes(model) / MB, 1),
+                "rss_delta_mb": (
+                    round(load_info["rss_delta"] / MB, 1)
+                    if model is not None and load_info
+                    else 0.0
+                ),
+                "load_time": load_info.get("load_time"),
+                "idle_s": (
+                    round(now - self._model_last_used[name], 1)
+                    if model is not None and name in self._model_last_used
+                    else None
+                ),
+            }
+        return {
+            "success": True,
+            "rss_mb": round(get_rss_bytes() / MB, 1),
+            "peak_rss_mb": round(get_peak_rss_bytes() / MB, 1),
+            "lazy_load": self.lazy_load,
+            "idle_unload_s": self.idle_unload_s,
+            "models": models,
+        }
+
+    def transcribe_audio(
+        self, audio, options=None, audio_format=None, sample_rate=None
+    ):
+        """转录音频，audio可以是文件路径，也可以是随命令帧传入的音频字节"""
+        with self._stats_lock:
+            self.inflight_transcriptions += 1
+        try:
+            return self._transcribe(audio, options, audio_format, sample_rate)
+        finally:
+            with self._stats_lock:
+                self.inflight_transcriptions -= 1
+
+    def _transcribe(self, audio, options, audio_format, sample_rate):
+        if not self.initialized:
+            init_result = self.initialize()
+            if not init_result["success"]:
+                return init_result
+
+        try:
+            if isinstance(audio, (bytes, bytearray, memoryview)):
+                if len(audio) == 0:
+                    return {"success": False, "error": "音频数据为空"}
+                logger.info(
+                    f"开始转录内存音频: {len(audio)} 字节, 格式: {audio_format or 'wav'}",
+                    extra=SAMPLED,
+                )
+            else:
+                # 检查音频文件是否存在
+                if not audio or not os.path.exists(audio):
+                    return {"success": False, "error": f"音频文件不存在: {audio}"}
+                logger.info(f"开始转录音频文件: {audio}", extra=SAMPLED)
+
+            # 设置默认选项
+            default_options = {
+                "batch_size_s": 60,
+                "hotword": "",
+                "use_vad": True,
+                "use_punc": True,  # 使用FunASR自带的标点恢复
+                "language": "zh",
+            }
+
+            if options:
+                default_options.update(options)
+            hotword = self._resolve_hotword(default_options)
+            if hotword is None:
+                return {
+                    "success": False,
+                    "error": f"热词表不存在: {default_options['hotword_list']}",
+                }
+            default_options["hotword"] = hotword
+
+            # 解码一次，VAD/ASR/时长统计共用同一份内存波形
+            timings = {}
+            transcribe_start = time.perf_counter()
+            waveform = self._decode_audio(audio, audio_format, sample_rate)
+            timings["decode"] = time.perf_counter() - transcribe_start
+
+            # 相同音频、模型和选项的结果直接从缓存返回
+            cache_key = None
+            if self._result_cache is not None:
+                stage_start = time.perf_counter()
+                cache_key = ResultCache.make_key(
+                    waveform, self._result_cache_context(default_options)
+                )
+                cached = self._result_cache.get(cache_key)
+                timings["cache"] = time.perf_counter() - stage_start
+                if cached is not None:
+                    logger.info("命中结果缓存，跳过识别", extra=SAMPLED)
+                    return self._cached_transcription(cached, timings, transcribe_start)
+
+            audio_duration = len(waveform) / SAMPLE_RATE
+            with self._stats_lock:
+                self.total_audio_duration += audio_duration
+            total_ms = int(audio_duration * 1000)
+
+            # VAD切分：只把语音片段送入ASR，静音部分直接丢弃
+            if default_options["use_vad"]:
+                stage_start = time.perf_counter()
+                with self._use_model("vad") as vad_model:
+                    vad_result = vad_model.generate(
+                        input=waveform,
+                        fs=SAMPLE_RATE,
+                        batch_size_s=default_options["batch_size_s"],
+                    )
+                timings["vad"] = time.perf_counter() - stage_start
+                speech_segments = self._extract_vad_segments(vad_result, total_ms)
+                logger.info(
+                    f"VAD处理完成，检测到 {len(speech_segments)} 个语音片段",
+                    extra=SAMPLED,
+                )
+            else:
+                speech_segments = [[0, total_ms]] if total_ms > 0 else []
+
+            # 执行ASR识别（语音片段批量送入Paraformer），每批结果返回后立即做增量标点，
+            # 与后续批次的ASR计算重叠
+            punctuator = None
+            if default_options["use_punc"]:
+                punctuator = IncrementalPunctuator(
+                    self._punctuate, self._join_segment_texts
+                )
+            stage_start = time.perf_counter()
+            asr_result, segment_texts = self._recognize_segments(
+                waveform,
+                speech_segments,
+                default_options,
+                punctuator.feed if punctuator else None,
+            )
+            # 等待ASR期间穿插执行的标点计入标点阶段
+            timings["asr"] = time.perf_counter() - stage_start - (
+                punctuator.elapsed if punctuator else 0.0
+            )
+            raw_text = self._join_segment_texts(segment_texts)
+
+            logger.info(
+                f"ASR识别完成，原始文本: {transcript_preview(raw_text)}", extra=SAMPLED
+            )
+
+            # 使用FunASR进行标点恢复
+            final_text = raw_text
+            if punctuator:
+                final_text = punctuator.finish()
+                timings["punc"] = punctuator.elapsed
+                logger.info(
+                    f"FunASR标点恢复完成，共 {punctuator.windows} 个窗口", extra=SAMPLED
+                )
+
+            duration = audio_duration
+            speech_ms = sum(end - beg for beg, end in speech_segments)
+            skipped_duration = max(0.0, duration - speech_ms / 1000.0)
+            with self._stats_lock:
+                self.transcription_count += 1
+                self.total_skipped_duration += skipped_duration
+                transcription_count = self.transcription_count
+            logger.info(
+                f"语音时长 {speech_ms / 1000.0:.2f}秒，跳过静音 {skipped_duration:.2f}秒",
+                extra=SAMPLED,
+            )
+
+            result = {
+                "success": True,
+                "text": final_text,
+                "raw_text": raw_text,
+                "confidence": (
+                    getattr(asr_result[0], "confidence", 0.0)
+                    if isinstance(asr_result, list) and asr_result
+                    else 0.0
+                ),
+                "duration": duration,
+                "segments": [
+                    {
+                        "start": round(beg / 1000.0, 3),
+                        "end": round(end / 1000.0, 3),
+                        "text": text,
                     }
+                    for (beg, end), text in zip(speech_segments, segment_texts)
+                ],
+                "speech_duration": round(speech_ms / 1000.0, 3),
+                "skipped_duration": round(skipped_duration, 3),
+                "language": "zh-CN",
+                "model_type": self.backends["asr"],  # 标识ASR使用的推理后端
+                # 各阶段实际使用的推理后端
+                "backends": {
+                    stage: self.backends[stage]
+                    for stage, used in (
+                        ("vad", default_options["use_vad"]),
+                        ("asr", True),
+                        ("punc", default_options["use_punc"]),
+                    )
+                    if used
+                },
+            }
 
-            # 检查加载结果
-            failed_models = [name for name, success in results.items() if not success]
+            timings["total"] = time.perf_counter() - transcribe_start
+            for stage, seconds in timings.items():
+                self.metrics.observe_stage(stage, seconds)
+            if duration > 0:
+                self.metrics.observe_rtf(timings["total"] / duration)
+            result["timings"] = {
+                stage: round(seconds * 1000, 1) for stage, seconds in timings.items()
+            }
 
-            if failed_models:
-                error_msg = f"以下模型加载失败: {', '.join(failed_models)}"
-                logger.error(error_msg)
-                return {"success": False, "error": error_msg, "type": "init_error"}
+            if cache_key:
+                self._result_cache.put(cache_key, result)
+
+            # 生产环境：每10次转录后进行内存清理
+            if transcription_count % 10 == 0:
+                self._cleanup_memory()
+                logger.info(f"已完成 {transcription_count} 次转录，执行内存清理")
+
+            logger.info(
+                f"转录完成，最终文本: {transcript_preview(final_text)}", extra=SAMPLED
+            )
+            return result
+
+        except AudioDecoderUnavailable as e:
+            # 客户端据此改为发送WAV
+            logger.warning(str(e))
+            return {
+                "success": False,
+                "error": str(e),
+                "type": "audio_decoder_unavailable",
+            }
+        except Exception as e:
+            error_msg = f"音频转录失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "transcription_error"}
+
+    def _cached_transcription(self, cached, timings, transcribe_start):
+        """缓存命中：计时只包含本次的解码和缓存查找，同样计入请求统计
+
+        缓存中保存的是首次识别的timings，原样返回会让客户端和指标误以为做了完整识别。
+        """
+        timings["total"] = time.perf_counter() - transcribe_start
+        for stage, seconds in timings.items():
+            self.metrics.observe_stage(stage, seconds)
+        with self._stats_lock:
+            self.transcription_count += 1
+            self.total_audio_duration += cached.get("duration") or 0.0
+        cached["timings"] = {
+            stage: round(seconds * 1000, 1) for stage, seconds in timings.items()
+        }
+        cached["cached"] = True
+        return cached
+
+    def start_stream(self, options=None):
+        """开始一次流式识别会话"""
+        if not self.initialized:
+            init_result = self.initialize()
+            if not init_result["success"]:
+                return init_result
+
+        # 录音期间不下载模型：流式模型不在本地时直接拒绝，客户端回退到整段识别
+        if self.online_asr_model is None and not self._model_downloaded("online_asr"):
+            return {
+                "success": False,
+                "error": "流式ASR模型未下载",
+                "type": "stream_model_missing",
+            }
+        try:
+            with self._use_model("online_asr"):
+                pass
+        except RuntimeError:
+            return {
+                "success": False,
+                "error": "流式ASR模型加载失败",
+                "type": "stream_error",
+            }
+
+        import uuid
+
+        stream_options = {"use_vad": True, "use_punc": True}
+        if options:
+            stream_options.update(options)
+        # funasr_onnx的Fsmn_vad是整段接口，不支持cache/is_final，
+        # 句尾位置只相对于单个chunk，流式会话只在PyTorch VAD下做提前断句
+        if stream_options["use_vad"] and self.backends["vad"] != "pytorch":
+            logger.info("VAD使用ONNX后端，流式会话不做VAD断句", extra=SAMPLED)
+            stream_options["use_vad"] = False
+
+        stream_id = uuid.uuid4().hex
+        self.streams[stream_id] = StreamSession(stream_id, stream_options)
+        logger.info(f"流式识别会话开始: {stream_id}", extra=SAMPLED)
+        return {
+            "success": True,
+            "stream_id": stream_id,
+            "chunk_ms": STREAM_CHUNK_SAMPLES * 1000 // SAMPLE_RATE,
+            "use_vad": stream_options["use_vad"],
+        }
+
+    def feed_stream(self, stream_id, audio, audio_format=None, sample_rate=None):
+        """送入一段流式音频，返回当前的中间识别结果"""
+        session = self.streams.get(stream_id)
+        if session is None:
+            return {"success": False, "error": f"流式会话不存在: {stream_id}"}
+
+        try:
+            if audio:
+                chunk = self._decode_audio(
+                    audio, audio_format or "pcm_s16le", sample_rate
+                )
+                self._stream_vad(session, chunk, is_final=False)
+                session.pending.append(chunk)
+                session.pending_samples += len(chunk)
+                session.received_samples += len(chunk)
+            self._stream_asr(session, is_final=False)
+
+            return {
+                "success": True,
+                "stream_id": stream_id,
+                "partial": session.partial_text(self._join_segment_texts),
+                "is_final": False,
+            }
+        except Exception as e:
+            error_msg = f"流式识别失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "stream_error"}
+
+    def end_stream(self, stream_id):
+        """结束流式会话：冲刷剩余音频并返回与transcribe相同结构的最终结果"""
+        session = self.streams.pop(stream_id, None)
+        if session is None:
+            return {"success": False, "error": f"流式会话不存在: {stream_id}"}
+
+        try:
+            self._stream_asr(session, is_final=True)
+            raw_text = self._join_segment_texts(session.raw_sentences)
+
+            duration = session.received_samples / SAMPLE_RATE
+            with self._stats_lock:
+                self.transcription_count += 1
+                self.total_audio_duration += duration
+            logger.info(
+                f"流式识别会话结束: {stream_id}，音频时长 {duration:.2f}秒", extra=SAMPLED
+            )
+
+            return {
+                "success": True,
+                "stream_id": stream_id,
+                "text": session.partial_text(self._join_segment_texts),
+                "raw_text": raw_text,
+                "confidence": 0.0,
+                "duration": duration,
+                "language": "zh-CN",
+                "model_type": "pytorch",
+                "streaming": True,
+                "is_final": True,
+            }
+        except Exception as e:
+            error_msg = f"流式识别失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "stream_error"}
+
+    def cancel_stream(self, stream_id):
+        """丢弃流式会话"""
+        self.streams.pop(stream_id, None)
+        return {"success": True, "stream_id": stream_id}
+
+    def _stream_vad(self, session, chunk, is_final):
+        """流式FSMN-VAD：记录句尾位置，用于在说话间隙提前完成断句和标点"""
+        if not session.options["use_vad"] or len(chunk) == 0:
+            return
+        with self._use_model("vad") as vad_model:
+            vad_result = vad_model.generate(
+                input=chunk,
+                cache=session.vad_cache,
+                is_final=is_final,
+                chunk_size=max(1, len(chunk) * 1000 // SAMPLE_RATE),
+            )
+        if isinstance(vad_result, list) and len(vad_result) > 0:
+            if not isinstance(vad_result[0], dict):
+                return
+            for _beg, end in vad_result[0].get("value", []):
+                if end != -1:
+                    session.sentence_ends.append(int(end) * SAMPLE_RATE // 1000)
+
+    def _stream_asr(self, session, is_final):
+        """把凑满的chunk送入在线Paraformer，is_final时冲刷模型cache"""
+        import numpy as np
+
+        if session.pending:
+            buffer = np.concatenate(session.pending)
+        else:
+            buffer = np.zeros(0, dtype=np.float32)
+
+        offset = 0
+        while len(buffer) - offset >= STREAM_CHUNK_SAMPLES:
+            self._stream_asr_chunk(
+                session, buffer[offset : offset + STREAM_CHUNK_SAMPLES], False
+            )
+            offset += STREAM_CHUNK_SAMPLES
+
+        rest = buffer[offset:]
+        if is_final:
+            if len(rest) == 0:
+                # 没有剩余音频时补一帧静音，让模型输出look-ahead部分的结果
+                rest = np.zeros(960, dtype=np.float32)
+            self._stream_asr_chunk(session, rest, True)
+            rest = rest[:0]
+            if session.current_text.strip():
+                self._commit_sentence(session)
+
+        session.pending = [rest] if len(rest) else []
+        session.pending_samples = len(rest)
+
+    def _stream_asr_chunk(self, session, chunk, is_final):
+        with self._use_model("online_asr") as online_asr_model:
+            result = online_asr_model.generate(
+                input=chunk,
+                cache=session.asr_cache,
+                is_final=is_final,
+                chunk_size=STREAM_CHUNK_SIZE,
+                encoder_chunk_look_back=STREAM_ENCODER_CHUNK_LOOK_BACK,
+                decoder_chunk_look_back=STREAM_DECODER_CHUNK_LOOK_BACK,
+            )
+        if isinstance(result, list) and result and isinstance(result[0], dict):
+            session.current_text += result[0].get("text", "")
+        session.decoded_samples += len(chunk)
+
+        # ASR已追上VAD句尾时完成当前句子
+        ends = session.sentence_ends
+        while ends and session.decoded_samples >= ends[0]:
+            ends.pop(0)
+            if session.current_text.strip():
+                self._commit_sentence(session)
+
+    def _commit_sentence(self, session):
+        raw_text = session.current_text.strip()
+        text = raw_text
+        if session.options["use_punc"]:
+            text = self._punctuate(raw_text)
+        session.raw_sentences.append(raw_text)
+        session.sentences.append(text)
+        session.current_text = ""
+
+    def transcribe_long_audio(self, audio_path, options=None, emit=None):
+        """分窗转录长音频文件，内存占用不随音频时长增长
+
+        音频按窗口从磁盘流式读取，每个窗口单独做VAD和ASR，
+        识别出的片段通过emit以事件形式立即输出，最终响应只包含汇总结果。
+        """
+        with self._stats_lock:
+            self.inflight_transcriptions += 1
+        try:
+            return self._transcribe_long(audio_path, options or {}, emit)
+        finally:
+            with self._stats_lock:
+                self.inflight_transcriptions -= 1
+
+    def _transcribe_long(self, audio_path, options, emit):
+        if not self.initialized:
+            init_result = self.initialize()
+            if not init_result["success"]:
+                return init_result
+
+        import numpy as np
+
+        if not audio_path or not os.path.exists(audio_path):
+            return {"success": False, "error": f"音频文件不存在: {audio_path}"}
+        logger.info(f"开始分窗转录长音频文件: {audio_path}")
+
+        default_options = {
+            "batch_size_s": 60,
+            "hotword": "",
+            "use_vad": True,
+            "use_punc": True,
+            "window_s": LONG_FORM_WINDOW_S,
+        }
+        default_options.update(options)
+        hotword = self._resolve_hotword(default_options)
+        if hotword is None:
+            return {
+                "success": False,
+                "error": f"热词表不存在: {default_options['hotword_list']}",
+            }
+        default_options["hotword"] = hotword
+        emit = emit or (lambda event: None)
+
+        try:
+            timings = {"decode": 0.0, "vad": 0.0, "asr": 0.0}
+            transcribe_start = time.perf_counter()
+            punctuator = None
+            if default_options["use_punc"]:
+                punctuator = IncrementalPunctuator(
+                    self._punctuate, self._join_segment_texts
+                )
+            window_samples = int(default_options["window_s"] * SAMPLE_RATE)
+            state = {
+                "offset": 0,  # 当前缓冲区起点在整个音频中的采样点位置
+                "speech_ms": 0,
+                "segments": 0,
+                "windows": 0,
+                "emitted_parts": 0,
+                "texts": [],
+            }
+
+            def process(buffer, is_final):
+                total_ms = len(buffer) * 1000 // SAMPLE_RATE
+                if default_options["use_vad"]:
+                    stage_start = time.perf_counter()
+                    with self._use_model("vad") as vad_model:
+                        vad_result = vad_model.generate(
+                            input=buffer,
+                            fs=SAMPLE_RATE,
+                            batch_size_s=default_options["batch_size_s"],
+                        )
+                    timings["vad"] += time.perf_counter() - stage_start
+                    segments = self._extract_vad_segments(vad_result, total_ms)
+                else:
+                    segments = [[0, total_ms]] if total_ms > 0 else []
+
+                cut_ms = total_ms
+                if not is_final and default_options["use_vad"]:
+                    cut_ms = max(
+                        segments[-1][1] if segments else 0,
+                        total_ms - LONG_FORM_TAIL_MS,
+                    )
+                    if segments and segments[-1][1] >= total_ms - LONG_FORM_TAIL_MS:
+                        cut_ms = segments[-1][0]
+                    # 带入下一窗口的音频有上限，超长片段直接在窗口末尾定稿
+                    if len(buffer) - cut_ms * SAMPLE_RATE // 1000 > window_samples:
+                        cut_ms = total_ms
+                    segments = [seg for seg in segments if seg[1] <= cut_ms]
+
+                stage_start = time.perf_counter()
+                punc_before = punctuator.elapsed if punctuator else 0.0
+                _, texts = self._recognize_segments(
+                    buffer,
+                    segments,
+                    default_options,
+                    punctuator.feed if punctuator else None,
+                )
+                punc_elapsed = (punctuator.elapsed if punctuator else 0.0) - punc_before
+                timings["asr"] += time.perf_counter() - stage_start - punc_elapsed
+
+                offset_ms = state["offset"] * 1000 // SAMPLE_RATE
+                for (beg, end), text in zip(segments, texts):
+                    state["speech_ms"] += end - beg
+                    state["segments"] += 1
+                    state["texts"].append(text)
+                    emit(
+                        {
+                            "event": "segment",
+                            "start": round((offset_ms + beg) / 1000.0, 3),
+                            "end": round((offset_ms + end) / 1000.0, 3),
+                            "text": text,
+                        }
+                    )
+
+                state["windows"] += 1
+                cut_samples = cut_ms * SAMPLE_RATE // 1000
+                state["offset"] += cut_samples
+                report_progress()
+                return buffer[cut_samples:]
+
+            def report_progress():
+                progress = {
+                    "event": "progress",
+                    "processed": round(state["offset"] / SAMPLE_RATE, 3),
+                    "windows": state["windows"],
+                }
+                if punctuator:
+                    # 已定稿的带标点句子随进度一起输出
+                    progress["text"] = "".join(
+                        punctuator.parts[state["emitted_parts"] :]
+                    )
+                    state["emitted_parts"] = len(punctuator.parts)
+                emit(progress)
+
+            carry = np.zeros(0, dtype=np.float32)
+            blocks = self._iter_audio_windows(audio_path, default_options["window_s"])
+            while True:
+                stage_start = time.perf_counter()
+                block = next(blocks, None)
+                timings["decode"] += time.perf_counter() - stage_start
+                if block is None:
+                    break
+                carry = process(np.concatenate([carry, block]), False)
+            if len(carry):
+                process(carry, True)
+
+            raw_text = self._join_segment_texts(state["texts"])
+            final_text = raw_text
+            if punctuator:
+                final_text = punctuator.finish()
+                timings["punc"] = punctuator.elapsed
+                if len(punctuator.parts) > state["emitted_parts"]:
+                    report_progress()
+
+            duration = state["offset"] / SAMPLE_RATE
+            speech_ms = state["speech_ms"]
+            skipped_duration = max(0.0, duration - speech_ms / 1000.0)
+            with self._stats_lock:
+                self.transcription_count += 1
+                self.total_audio_duration += duration
+                self.total_skipped_duration += skipped_duration
+
+            timings["total"] = time.perf_counter() - transcribe_start
+            for stage, seconds in timings.items():
+                self.metrics.observe_stage(stage, seconds)
+            if duration > 0:
+                self.metrics.observe_rtf(timings["total"] / duration)
+
+            logger.info(
+                f"长音频转录完成，时长 {duration:.1f}秒，"
+                f"{state['windows']} 个窗口，{state['segments']} 个语音片段"
+            )
+            return {
+                "success": True,
+                "text": final_text,
+                "raw_text": raw_text,
+                "duration": duration,
+                "speech_duration": round(speech_ms / 1000.0, 3),
+                "skipped_duration": round(skipped_duration, 3),
+                "segment_count": state["segments"],
+                "windows": state["windows"],
+                "language": "zh-CN",
+                "model_type": self.backends["asr"],
+                "timings": {
+                    stage: round(seconds * 1000, 1)
+                    for stage, seconds in timings.items()
+                },
+            }
+
+        except Exception as e:
+            error_msg = f"长音频转录失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "transcription_error"}
+
+    def _iter_audio_windows(self, path, window_s):
+        """按窗口从磁盘读取音频，逐个产出16kHz单声道波形"""
+        try:
+            import soundfile
+
+            audio_file = soundfile.SoundFile(path)
+        except Exception:
+            audio_file = None
+
+        if audio_file is None and self._has_compressed_decoder():
+            # WebM/MP4等压缩格式由PyAV或ffmpeg流式解码，按窗口产出
+            yield from iter_compressed_audio(path, int(window_s * SAMPLE_RATE))
+            return
+
+        if audio_file is None:
+            # soundfile不支持的格式(如mp3)无法按块读取，只能整体解码后分窗
+            logger.warning("该音频格式不支持流式读取，整体解码后分窗处理")
+            waveform = self._decode_audio(path)
+            step = int(window_s * SAMPLE_RATE)
+            for start in range(0, len(waveform), step):
+                yield waveform[start : start + step]
+            return
+
+        with audio_file:
+            blocksize = int(window_s * audio_file.samplerate)
+            for block in audio_file.blocks(
+                blocksize=blocksize, dtype="float32", always_2d=False
+            ):
+                yield self._normalize_waveform(block, audio_file.samplerate)
+
+    def _decode_audio(self, source, audio_format=None, sample_rate=None):
+        """解码音频为16kHz单声道float32波形，每个请求只解码一次
+
+        source为文件路径或内存字节；原始PCM字节需通过audio_format
+        (pcm_s16le / f32le)和sample_rate说明布局，其余按容器格式解析。
+        """
+        import numpy as np
+
+        in_memory = isinstance(source, (bytes, bytearray, memoryview))
+        if in_memory:
+            if audio_format in RAW_PCM_FORMATS:
+                waveform = np.frombuffer(source, dtype=RAW_PCM_FORMATS[audio_format])
+                if waveform.dtype == np.int16:
+                    waveform = waveform.astype(np.float32) / 32768.0
+                return self._normalize_waveform(waveform, sample_rate or SAMPLE_RATE)
+            head = source[:16]
+        else:
+            with open(source, "rb") as f:
+                head = f.read(16)
+        # 以文件头为准，audio_format只在无法识别时作为参考
+        container = sniff_audio_container(head) or audio_format
+
+        if container not in COMPRESSED_CONTAINERS:
+            try:
+                import soundfile
+
+                waveform, file_rate = soundfile.read(
+                    io.BytesIO(source) if in_memory else source,
+                    dtype="float32",
+                    always_2d=False,
+                )
+                return self._normalize_waveform(waveform, file_rate)
+            except Exception:
+                if not in_memory and not self._has_compressed_decoder():
+                    # 没有PyAV和ffmpeg时，文件仍交给librosa(audioread)尝试
+                    import librosa
+
+                    waveform, file_rate = librosa.load(source, sr=None, mono=False)
+                    return self._normalize_waveform(waveform.T, file_rate)
+
+        # 压缩格式直接解码并重采样到16kHz单声道
+        blocks = list(iter_compressed_audio(source))
+        if not blocks:
+            return np.zeros(0, dtype=np.float32)
+        return np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32)
+
+    @staticmethod
+    def _has_compressed_decoder():
+        import importlib.util
+
+        return importlib.util.find_spec("av") is not None or find_ffmpeg() is not None
+
+    def _normalize_waveform(self, waveform, sample_rate):
+        """转换为单声道并按需重采样到16kHz"""
+        import numpy as np
+
+        waveform = np.asarray(waveform, dtype=np.float32)
+        if waveform.ndim > 1:
+            # 多声道输入统一为(帧, 声道)布局，取平均混为单声道
+            waveform = waveform.mean(axis=1)
+        if sample_rate != SAMPLE_RATE:
+            import librosa
+
+            waveform = librosa.resample(
+                waveform, orig_sr=sample_rate, target_sr=SAMPLE_RATE
+            )
+        return np.ascontiguousarray(waveform, dtype=np.float32)
+
+    def _extract_vad_segments(self, vad_result, total_ms):
+        """从VAD结果中提取语音片段列表 [[开始ms, 结束ms], ...]"""
+        segments = []
+        if isinstance(vad_result, list) and len(vad_result) > 0:
+            if isinstance(vad_result[0], dict):
+                for beg, end in vad_result[0].get("value", []):
+                    beg = max(0, int(beg))
+                    end = min(total_ms, int(end))
+                    if end > beg:
+                        segments.append([beg, end])
+        return segments
+
+    def load_hotword_list(self, name, words=None, path=None, activate=False):
+        """注册热词表，并用ASR词表预先编译；同名热词表会被替换"""
+        if not name:
+            return {"success": False, "error": "缺少热词表名称"}
+        try:
+            if path:
+                with open(path, "r", encoding="utf-8") as f:
+                    words = f.read().splitlines()
+            # FunASR以空格分隔热词，去掉空行和重复项
+            words = list(dict.fromkeys(w.strip() for w in (words or []) if w.strip()))
+            if not words:
+                return {"success": False, "error": "热词表为空"}
+            hotword = " ".join(words)
 
-            total_time = time.time() - start_time
-            self.initialized = True
+            if not self.initialized:
+                init_result = self.initialize()
+                if not init_result["success"]:
+                    return init_result
+
+            start_time = time.time()
+            with self._use_model("asr") as asr_model:
+                biasing_supported = HotwordCompiler.supports(asr_model)
+                if biasing_supported:
+                    self._hotword_compiler.compile(asr_model, hotword)
+            compile_ms = round((time.time() - start_time) * 1000, 1)
+            if not biasing_supported:
+                logger.warning("当前ASR模型不支持热词，热词表只会被记录")
+
+            previous = self.hotword_lists.get(name)
+            if previous and previous["hotword"] != hotword:
+                self._hotword_compiler.unpin(previous["hotword"])
+            self.hotword_lists[name] = {"hotword": hotword, "count": len(words)}
+            if activate:
+                self.active_hotword_list = name
             logger.info(
-                f"所有FunASR模型并行初始化完成，总耗时: {total_time:.2f}秒"
+                f"热词表 {name} 已加载: {len(words)} 个热词，编译耗时 {compile_ms}ms"
             )
             return {
                 "success": True,
-                "message": f"FunASR模型并行初始化成功，耗时: {total_time:.2f}秒",
+                "name": name,
+                "count": len(words),
+                "compile_ms": compile_ms,
+                "biasing_supported": biasing_supported,
+                "active": self.active_hotword_list == name,
             }
-
-        except ImportError as e:
-            error_msg = "FunASR未安装，请先安装FunASR: pip install funasr"
-            logger.error(error_msg)
-            return {"success": False, "error": error_msg, "type": "import_error"}
-
         except Exception as e:
-            error_msg = f"FunASR模型初始化失败: {str(e)}"
+            error_msg = f"加载热词表失败: {str(e)}"
             logger.error(error_msg)
-            logger.error(traceback.format_exc())
-            return {"success": False, "error": error_msg, "type": "init_error"}
+            return {"success": False, "error": error_msg, "type": "hotword_error"}
 
-    def transcribe_audio(self, audio_path, options=None):
-        """转录音频文件"""
-        if not self.initialized:
-            init_result = self.initialize()
-            if not init_result["success"]:
-                return init_result
+    def activate_hotword_list(self, name):
+        """设置默认热词表，未指定hotword和hotword_list的请求使用它；name为空时取消"""
+        if name and name not in self.hotword_lists:
+            return {"success": False, "error": f"热词表不存在: {name}"}
+        self.active_hotword_list = name or None
+        return {"success": True, "active": self.active_hotword_list}
 
-        try:
-            # 检查音频文件是否存在
-            if not os.path.exists(audio_path):
-                return {"success": False, "error": f"音频文件不存在: {audio_path}"}
+    def _resolve_hotword(self, options):
+        """合并热词表和临时热词，返回传给模型的热词字符串；热词表不存在时返回None"""
+        name = options.get("hotword_list")
+        if name is None and not options.get("hotword"):
+            name = self.active_hotword_list
+        if not name:
+            return options.get("hotword", "")
+        if name not in self.hotword_lists:
+            return None
+        hotword = self.hotword_lists[name]["hotword"]
+        if options.get("hotword"):
+            # 临时热词与热词表组合，组合结果按LRU缓存编译
+            hotword = f"{hotword} {options['hotword']}"
+        return hotword
 
-            logger.info(f"开始转录音频文件: {audio_path}")
+    def _result_cache_context(self, options):
+        """结果缓存键中除音频外的部分：模型版本、推理后端、量化方式和选项"""
+        return {
+            "models": {name: MODEL_IDS[name] for name in ("asr", "vad", "punc")},
+            "revision": "v2.0.4",
+            "backends": self.backends,
+            "quantize": self.quantize,
+            "onnx_quantize": self.onnx_quantize,
+            "options": options,
+        }
 
-            # 设置默认选项
-            default_options = {
-                "batch_size_s": 60,
-                "hotword": "",
-                "use_vad": True,
-                "use_punc": True,  # 使用FunASR自带的标点恢复
-                "language": "zh",
-            }
+    def _recognize_segments(self, waveform, segments, options, on_text=None):
+        """按时间顺序把语音片段分批送入ASR，每批总时长不超过batch_size_s
 
-            if options:
-                default_options.update(options)
+        on_text按时间顺序接收每个片段的文本，在等待后续批次时执行。
+        """
+        batch_limit_ms = max(1, options["batch_size_s"]) * 1000
+        batches = []
+        current, current_ms = [], 0
+        for beg, end in segments:
+            if current and current_ms + (end - beg) > batch_limit_ms:
+                batches.append(current)
+                current, current_ms = [], 0
+            current.append((beg, end))
+            current_ms += end - beg
+        if current:
+            batches.append(current)
 
-            # 执行语音识别
-            if default_options["use_vad"]:
-                vad_result = self.vad_model.generate(
-                    input=audio_path, batch_size_s=default_options["batch_size_s"]
+        # 各批次一起提交给微批处理器，可与其他并发请求的片段合并计算
+        pending = []
+        for batch in batches:
+            chunks = [
+                waveform[beg * SAMPLE_RATE // 1000 : end * SAMPLE_RATE // 1000]
+                for beg, end in batch
+            ]
+            pending.append(
+                self._asr_batcher.submit(
+                    chunks, options["hotword"], options["batch_size_s"]
                 )
-                logger.info("VAD处理完成")
-
-            # 执行ASR识别
-            asr_result = self.asr_model.generate(
-                input=audio_path,
-                batch_size_s=default_options["batch_size_s"],
-                hotword=default_options["hotword"],
-                cache={},
             )
 
-            # 提取识别文本
-            if isinstance(asr_result, list) and len(asr_result) > 0:
-                if isinstance(asr_result[0], dict) and "text" in asr_result[0]:
-                    raw_text = asr_result[0]["text"]
+        asr_result = []
+        texts = []
+        for future in pending:
+            batch_result = future.result()
+            asr_result.extend(batch_result)
+            for item in batch_result:
+                if isinstance(item, dict) and "text" in item:
+                    text = item["text"]
                 else:
-                    raw_text = str(asr_result[0])
-            else:
-                raw_text = str(asr_result)
+                    text = str(item)
+                texts.append(text)
+                if on_text:
+                    on_text(text)
+        return asr_result, texts
 
-            logger.info(f"ASR识别完成，原始文本: {raw_text[:100]}...")
+    def _generate_asr_batch(self, chunks, hotword, touch=True):
+        """对一批语音片段执行一次Paraformer前向计算，结果与输入顺序一致"""
+        # 按长度排序以减少批内补零，计算完成后恢复原顺序
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+        # 批处理在独立线程中执行，需要单独纳入性能分析
+        with self._profiler.profile_thread(), self._use_model(
+            "asr", touch=touch
+        ) as asr_model:
+            batch_result = asr_model.generate(
+                input=[chunks[i] for i in order],
+                batch_size=len(chunks),
+                hotword=hotword,
+            )
+        results = [None] * len(chunks)
+        for position, index in enumerate(order):
+            results[index] = batch_result[position]
+        return results
 
-            # 使用FunASR进行标点恢复
+    def _punctuate(self, raw_text):
+        """使用FunASR标点模型恢复标点，失败时返回原始文本"""
+        if not raw_text.strip():
+            return raw_text
+        try:
+            with self._use_model("punc") as punc_model:
+                punc_result = punc_model.generate(input=raw_text)
             final_text = raw_text
-            if default_options["use_punc"] and self.punc_model and raw_text.strip():
-                try:
-                    punc_result = self.punc_model.generate(input=raw_text)
-                    if isinstance(punc_result, list) and len(punc_result) > 0:
-                        if (
-                            isinstance(punc_result[0], dict)
-                            and "text" in punc_result[0]
-                        ):
-                            final_text = punc_result[0]["text"]
-                        else:
-                            final_text = str(punc_result[0])
-                    logger.info("FunASR标点恢复完成")
-                except Exception as e:
-                    logger.warning(f"FunASR标点恢复失败，使用原始文本: {str(e)}")
-
-            duration = self._get_audio_duration(audio_path)
-            self.transcription_count += 1
+            if isinstance(punc_result, list) and len(punc_result) > 0:
+                if isinstance(punc_result[0], dict) and "text" in punc_result[0]:
+                    final_text = punc_result[0]["text"]
+                else:
+                    final_text = str(punc_result[0])
+            return final_text
+        except Exception as e:
+            logger.warning(f"FunASR标点恢复失败，使用原始文本: {str(e)}")
+            return raw_text
 
-            result = {
-                "success": True,
-                "text": final_text,
-                "raw_text": raw_text,
-                "confidence": (
-                    getattr(asr_result[0], "confidence", 0.0)
-                    if isinstance(asr_result, list)
-                    else 0.0
-                ),
-                "duration": duration,
-                "language": "zh-CN",
-                "model_type": "pytorch",  # 标识使用的是pytorch版本
-            }
+    def _join_segment_texts(self, texts):
+        """拼接各片段文本，英文单词之间保留空格"""
+        joined = ""
+        for text in texts:
+            text = text.strip()
+            if not text:
+                continue
+            if (
+                joined
+                and self._is_ascii_word_char(joined[-1])
+                and self._is_ascii_word_char(text[0])
+            ):
+                joined += " "
+            joined += text
+        return joined
 
-            # 生产环境：每10次转录后进行内存清理
-            if self.transcription_count % 10 == 0:
-                self._cleanup_memory()
-                logger.info(f"已完成 {self.transcription_count} 次转录，执行内存清理")
+    @staticmethod
+    def _is_ascii_word_char(ch):
+        return ch.isascii() and ch.isalnum()
 
-            logger.info(f"转录完成，最终文本: {final_text[:100]}...")
-            return result
+    def autotune_threads(self, options=None):
+        """在示例音频上测试几组线程数，为每个模型保存最快的设置"""
+        options = options or {}
+        if not self.initialized:
+            init_result = self.initialize()
+            if not init_result["success"]:
+                return init_result
 
-        except Exception as e:
-            error_msg = f"音频转录失败: {str(e)}"
-            logger.error(error_msg)
-            logger.error(traceback.format_exc())
-            return {"success": False, "error": error_msg, "type": "transcription_error"}
+        # 默认使用ASR模型仓库自带的示例音频
+        audio_path = options.get("audio_path") or os.path.join(
+            self.damo_root,
+            MODEL_IDS["asr"].split("/")[-1],
+            "example",
+            "asr_example.wav",
+        )
+        if not os.path.exists(audio_path):
+            return {"success": False, "error": f"调优音频不存在: {audio_path}"}
+        repeats = max(1, int(options.get("repeats", 3)))
 
-    def _get_audio_duration(self, audio_path):
-        """获取音频时长"""
         try:
-            import librosa
+            waveform = self._decode_audio(audio_path)
+            tuner = self._thread_tuner
+            timings = {}
+            skipped = []
+            with self._use_model("vad") as vad_model, self._use_model(
+                "asr"
+            ) as asr_model, self._use_model("punc") as punc_model:
+                asr_result = asr_model.generate(input=[waveform], batch_size=1)
+                text = asr_result[0].get("text", "") if asr_result else ""
+                runs = {
+                    "vad": lambda: vad_model.generate(input=waveform, fs=SAMPLE_RATE),
+                    "asr": lambda: asr_model.generate(input=[waveform], batch_size=1),
+                    "punc": lambda: punc_model.generate(input=text or "你好"),
+                }
+                for name, run in runs.items():
+                    if self.backends[name] != "pytorch":
+                        skipped.append(name)
+                        continue
+                    timings[name] = {}
+                    for threads in tuner.candidates():
+                        tuner.apply(name, threads)
+                        run()  # 预热
+                        elapsed = []
+                        for _ in range(repeats):
+                            start_time = time.time()
+                            run()
+                            elapsed.append(time.time() - start_time)
+                        # 取中位数，减少偶发抖动的影响
+                        timings[name][threads] = round(
+                            sorted(elapsed)[len(elapsed) // 2] * 1000, 1
+                        )
+                    tuner.plan[name] = min(timings[name], key=timings[name].get)
+                    tuner.apply(name)
 
-            duration = librosa.get_duration(filename=audio_path)
-            self.total_audio_duration += duration  # 累计音频时长
-            return duration
-        except:
-            return 0.0
+            tuner.save_plan()
+            logger.info(f"线程自动调优完成: {tuner.plan}")
+            return {
+                "success": True,
+                "plan": dict(tuner.plan),
+                "timings_ms": timings,
+                "skipped": skipped,
+                "config_path": tuner.config_path,
+            }
+        except Exception as e:
+            error_msg = f"线程自动调优失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": error_msg, "type": "autotune_error"}
 
     def _cleanup_memory(self):
         """生产环境内存清理"""
@@ -367,6 +3691,14 @@ class FunASRServer:
             import gc
 
             gc.collect()
+            if sys.platform.startswith("linux"):
+                # 把释放的堆内存归还给操作系统，卸载模型后RSS才会真正下降
+                import ctypes
+
+                try:
+                    ctypes.CDLL("libc.so.6").malloc_trim(0)
+                except (OSError, AttributeError):
+                    pass
             logger.info("内存清理完成")
         except Exception as e:
             logger.warning(f"内存清理失败: {str(e)}")
@@ -379,102 +3711,322 @@ class FunASRServer:
             "average_duration": round(
                 self.total_audio_duration / max(1, self.transcription_count), 2
             ),
+            "total_skipped_duration": round(self.total_skipped_duration, 2),
             "initialized": self.initialized,
             "models_loaded": {
                 "asr": self.asr_model is not None,
                 "vad": self.vad_model is not None,
                 "punc": self.punc_model is not None,
+                "online_asr": self.online_asr_model is not None,
+            },
+            "backends": dict(self.backends),
+            "quantize": self.quantize,
+            "threads": self._thread_tuner.describe(),
+            "hotwords": {
+                "lists": {
+                    name: info["count"] for name, info in self.hotword_lists.items()
+                },
+                "active": self.active_hotword_list,
+                "biasing_supported": (
+                    HotwordCompiler.supports(self.asr_model)
+                    if self.asr_model is not None
+                    else None
+                ),
+                "compiler": self._hotword_compiler.get_stats(),
+            },
+            "result_cache": (
+                self._result_cache.get_stats() if self._result_cache else None
+            ),
+            "metrics": self.metrics.snapshot(),
+            "profiling": self._profiler.get_stats(),
+            "logging": _log_pipeline.get_stats(),
+            "warmup": dict(
+                self.warmup_stats, saved_s=round(self.warmup_stats["saved_s"], 3)
+            ),
+            "rss_mb": round(get_rss_bytes() / MB, 1),
+            "peak_rss_mb": round(get_peak_rss_bytes() / MB, 1),
+            "model_load_times": {
+                name: info["load_time"]
+                for name, info in self._model_load_info.items()
             },
+            "active_streams": len(self.streams),
+            "batching": self._asr_batcher.get_stats(),
         }
 
-    def check_status(self):
-        """检查FunASR状态"""
+    def _metrics_gauges(self):
+        """/metrics中的瞬时指标"""
+        from importlib import metadata
+
+        versions = {}
+        for package in ("funasr", "torch", "onnxruntime"):
+            try:
+                versions[package] = metadata.version(package)
+            except metadata.PackageNotFoundError:
+                versions[package] = "none"
+
+        gauges = [
+            ("ququ_build_info", "运行时依赖版本", [(versions, 1)]),
+            ("ququ_rss_bytes", "进程常驻内存", [({}, get_rss_bytes())]),
+            (
+                "ququ_peak_rss_bytes",
+                "进程峰值常驻内存",
+                [({}, get_peak_rss_bytes())],
+            ),
+            (
+                "ququ_model_loaded",
+                "模型是否已加载",
+                [
+                    (
+                        {"model": name, "backend": self.backends[name]},
+                        int(getattr(self, attr) is not None),
+                    )
+                    for name, attr in MODEL_ATTRS.items()
+                ],
+            ),
+            (
+                "ququ_model_load_seconds",
+                "最近一次模型加载耗时",
+                [
+                    ({"model": name}, info["load_time"])
+                    for name, info in self._model_load_info.items()
+                ],
+            ),
+            (
+                "ququ_inflight_transcriptions",
+                "正在处理的转录请求数",
+                [({}, self.inflight_transcriptions)],
+            ),
+            (
+                "ququ_active_streams",
+                "活动的流式识别会话数",
+                [({}, len(self.streams))],
+            ),
+        ]
+        if self._result_cache is not None:
+            cache_stats = self._result_cache.get_stats()
+            gauges.append(
+                (
+                    "ququ_result_cache_lookups",
+                    "结果缓存查询次数",
+                    [
+                        ({"result": "hit"}, cache_stats["hits"]),
+                        ({"result": "miss"}, cache_stats["misses"]),
+                    ],
+                )
+            )
+        return gauges
+
+    def _start_metrics_server(self):
+        """在本地端口提供/metrics文本接口，只监听127.0.0.1"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.metrics.render_prometheus(
+                    server._metrics_gauges()
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 默认会写到stderr，这里忽略访问日志
+                pass
+
         try:
-            import funasr
+            httpd = ThreadingHTTPServer(
+                ("127.0.0.1", self.metrics_port), MetricsHandler
+            )
+        except OSError as e:
+            logger.warning(f"指标端口 {self.metrics_port} 启动失败: {str(e)}")
+            return
+        httpd.daemon_threads = True
+        threading.Thread(
+            target=httpd.serve_forever, name="funasr-metrics", daemon=True
+        ).start()
+        logger.info(f"指标接口已启动: http://127.0.0.1:{self.metrics_port}/metrics")
 
-            return {
-                "success": True,
-                "installed": True,
-                "initialized": self.initialized,
-                "version": getattr(funasr, "__version__", "unknown"),
-                "models": {
-                    "asr": self.asr_model is not None,
-                    "vad": self.vad_model is not None,
-                    "punc": self.punc_model is not None,  # FunASR标点恢复模型状态
-                },
-            }
-        except ImportError:
+    def check_status(self):
+        """检查FunASR状态
+
+        只查找包而不导入，模型在后台加载期间也能立即应答。
+        """
+        import importlib.metadata
+        import importlib.util
+
+        packages = self._required_packages()
+        if any(importlib.util.find_spec(package) is None for package in packages):
             return {
                 "success": False,
                 "installed": False,
                 "initialized": False,
                 "error": "FunASR未安装",
             }
+        try:
+            version = importlib.metadata.version(packages[0].replace("_", "-"))
+        except importlib.metadata.PackageNotFoundError:
+            version = "unknown"
+        return {
+            "success": True,
+            "installed": True,
+            "initialized": self.initialized,
+            "initializing": not self.initialized
+            and any(v in ("pending", "loading") for v in self.init_progress.values()),
+            "init_progress": dict(self.init_progress),
+            "version": version,
+            "models": {
+                "asr": self.asr_model is not None,
+                "vad": self.vad_model is not None,
+                "punc": self.punc_model is not None,  # FunASR标点恢复模型状态
+            },
+        }
 
-    def run(self):
-        """运行服务器主循环"""
-        logger.info("FunASR服务器启动")
+    def handle_command(self, command, audio_data=None):
+        """执行一条命令并返回结果"""
+        action = command.get("action")
+        if action == "transcribe":
+            audio = audio_data
+            if audio is None:
+                audio = command.get("audio_path")
+            return self.transcribe_audio(
+                audio,
+                command.get("options", {}),
+                audio_format=command.get("audio_format"),
+                sample_rate=command.get("sample_rate"),
+            )
+        elif action == "transcribe_long":
+            request_id = command.get("id")
+            return self.transcribe_long_audio(
+                command.get("audio_path"),
+                command.get("options", {}),
+                emit=lambda event: self._send_response(event, request_id),
+            )
+        elif action == "warmup":
+            return self.warmup(command.get("options", {}))
+        elif action == "stream_start":
+            return self.start_stream(command.get("options", {}))
+        elif action == "stream_chunk":
+            return self.feed_stream(
+                command.get("stream_id"),
+                audio_data,
+                audio_format=command.get("audio_format"),
+                sample_rate=command.get("sample_rate"),
+            )
+        elif action == "stream_end":
+            return self.end_stream(command.get("stream_id"))
+        elif action == "stream_cancel":
+            return self.cancel_stream(command.get("stream_id"))
+        elif action == "status":
+            return self.check_status()
+        elif action == "stats":
+            return {"success": True, "stats": self.get_performance_stats()}
+        elif action == "cleanup":
+            self._cleanup_memory()
+            return {"success": True, "message": "内存清理完成"}
+        elif action == "memory":
+            return self.get_memory_usage()
+        elif action == "hotwords_load":
+            return self.load_hotword_list(
+                command.get("name"),
+                words=command.get("words"),
+                path=command.get("path"),
+                activate=command.get("activate", False),
+            )
+        elif action == "hotwords_activate":
+            return self.activate_hotword_list(command.get("name"))
+        elif action == "profile_start":
+            return self._profiler.start(
+                mode=command.get("mode", "cprofile"),
+                requests=command.get("requests", 10),
+                torch_profile=command.get("torch", False),
+                interval_ms=command.get("interval_ms", 5),
+            )
+        elif action == "profile_stop":
+            return self._profiler.stop()
+        elif action == "autotune":
+            return self.autotune_threads(command.get("options", {}))
+        return {"success": False, "error": f"未知命令: {action}"}
 
-        # 解析 damo 根目录
-        def _default_damo_root():
-            # 允许通过 MODELSCOPE_CACHE 指定根；常见是 ~/.cache/modelscope/hub/damo
-            root = os.environ.get("MODELSCOPE_CACHE")
-            if root:
-                # 兼容两种布局：<cache>/damo 或 <cache>/hub/damo
-                if os.path.isdir(os.path.join(root, "damo")):
-                    return os.path.join(root, "damo")
-                if os.path.isdir(os.path.join(root, "hub", "damo")):
-                    return os.path.join(root, "hub", "damo")
-                # 像 Node 一样自定义到 /Volumes/APFS/AI/models/damo，就直接传入 --damo-root
-            # 默认回到用户主目录的 modelscope/hub/damo
-            home_dir = os.path.expanduser("~")
-            return os.path.join(home_dir, ".cache", "modelscope", "hub", "damo")
-
-        cache_path = self.damo_root if self.damo_root else _default_damo_root()
-        logger.info(f"使用的模型根目录(damo root): {cache_path}")
+    def _run_job(self, command, audio_data=None, received_at=None):
+        """执行命令并输出响应，异常也会带着请求id返回"""
+        if received_at is not None:
+            self.metrics.observe_queue_wait(time.perf_counter() - received_at)
+        # 控制命令不计入性能分析的请求数
+        profiled = command.get("action") not in CONTROL_ACTIONS
+        try:
+            if profiled:
+                with self._profiler.profile_thread():
+                    result = self.handle_command(command, audio_data)
+            else:
+                result = self.handle_command(command, audio_data)
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc(),
+            }
+        self.metrics.count_request(command.get("action"), result.get("success"))
+        self._send_response(result, command.get("id"))
+        if profiled:
+            self._profiler.request_done()
 
-        repos = [
-            "speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
-            "speech_fsmn_vad_zh-cn-16k-common-pytorch",
-            "punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
-        ]
+    def _send_response(self, result, request_id=None):
+        """输出一行JSON响应，带id的请求在响应中原样回显id"""
+        if request_id is not None:
+            result = dict(result, id=request_id)
+        with self.metrics.timer("serialize"):
+            line = json.dumps(result, ensure_ascii=False)
+            # 多个工作线程共享stdout，整行写入需加锁
+            with self._output_lock:
+                self._stdout.write(line + "\n")
+                self._stdout.flush()
 
-        def _repo_ready(repo_dir):
-            # 目录存在且包含任意常见权重/配置文件即认为已就绪
-            if not os.path.isdir(repo_dir):
-                return False
-            patterns = [
-                "model.pt", "pytorch_model.bin", "*.onnx",
-                "config.json", "configuration.json", "model.yaml", "vocab*"
-            ]
-            for pat in patterns:
-                if glob.glob(os.path.join(repo_dir, pat)):
-                    return True
-            return False
+    def _start_executors(self):
+        # 推理请求在线程池中执行，流式请求使用单独的单线程执行器以保证分块顺序
+        from concurrent.futures import ThreadPoolExecutor
 
-        missing = []
-        for r in repos:
-            rd = os.path.join(cache_path, r)
-            if not _repo_ready(rd):
-                missing.append(r)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="funasr-job"
+        )
+        self._stream_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="funasr-stream"
+        )
 
-        if not missing:
-            logger.info("模型文件存在，开始初始化")
-            init_result = self.initialize()
+    def _shutdown_executors(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._stream_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, command, audio_data=None):
+        """按命令类型把请求交给对应的执行通道"""
+        action = command.get("action")
+        if action in CONTROL_ACTIONS:
+            # 控制通道：在读取线程中立即应答，不受推理请求排队影响
+            self._run_job(command, audio_data)
+        elif action in STREAM_ACTIONS:
+            self._stream_executor.submit(
+                self._run_job, command, audio_data, time.perf_counter()
+            )
         else:
-            logger.info(f"模型文件不存在或不完整：{', '.join(missing)}，跳过初始化")
-            init_result = {
-                "success": False,
-                "error": "模型文件未下载，请先下载模型",
-                "type": "models_not_downloaded"
-            }
-        print(json.dumps(init_result, ensure_ascii=False))
-        sys.stdout.flush()
+            self._executor.submit(
+                self._run_job, command, audio_data, time.perf_counter()
+            )
 
+    def _serve(self, stdin, dispatch):
+        """逐条读取命令帧并交给dispatch，直到输入结束或收到exit命令"""
         while self.running:
+            request_id = None
             try:
                 # 读取命令
-                line = sys.stdin.readline()
+                line = stdin.readline()
                 if not line:
                     break
 
@@ -483,39 +4035,24 @@ class FunASRServer:
                     continue
 
                 try:
-                    command = json.loads(line)
-                except json.JSONDecodeError:
-                    result = {"success": False, "error": "无效的JSON命令"}
-                    print(json.dumps(result, ensure_ascii=False))
-                    sys.stdout.flush()
+                    command = json.loads(line.decode("utf-8"))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    self._send_response({"success": False, "error": "无效的JSON命令"})
                     continue
 
-                # 处理命令
-                if command.get("action") == "transcribe":
-                    audio_path = command.get("audio_path")
-                    options = command.get("options", {})
-                    result = self.transcribe_audio(audio_path, options)
-                elif command.get("action") == "status":
-                    result = self.check_status()
-                elif command.get("action") == "stats":
-                    result = {"success": True, "stats": self.get_performance_stats()}
-                elif command.get("action") == "cleanup":
-                    self._cleanup_memory()
-                    result = {"success": True, "message": "内存清理完成"}
-                elif command.get("action") == "exit":
-                    result = {"success": True, "message": "服务器退出"}
-                    print(json.dumps(result, ensure_ascii=False))
-                    sys.stdout.flush()
-                    break
-                else:
-                    result = {
-                        "success": False,
-                        "error": f"未知命令: {command.get('action')}",
-                    }
+                request_id = command.get("id")
 
-                # 输出结果
-                print(json.dumps(result, ensure_ascii=False))
-                sys.stdout.flush()
+                # 读取命令附带的二进制音频帧
+                audio_data = None
+                if command.get("audio_bytes"):
+                    audio_data = read_exact(stdin, int(command["audio_bytes"]))
+
+                if command.get("action") == "exit":
+                    self._send_response(
+                        {"success": True, "message": "服务器退出"}, request_id
+                    )
+                    break
+                dispatch(command, audio_data)
 
             except KeyboardInterrupt:
                 break
@@ -525,16 +4062,603 @@ class FunASRServer:
                     "error": str(e),
                     "traceback": traceback.format_exc(),
                 }
-                print(json.dumps(error_result, ensure_ascii=False))
-                sys.stdout.flush()
+                self._send_response(error_result, request_id)
+
+    def _run_worker(self, index, request_fd, response_fd):
+        """工作进程入口：重建fork后丢失的线程和锁，从管道读取父进程分发的请求"""
+        # 退出由父进程关闭管道统一控制
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.worker_index = index
+        # fork时其他线程可能正持有这些锁，子进程中全部重建
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._output_lock = threading.Lock()
+        self._warmup_lock = threading.Lock()
+        self._model_locks = {name: threading.Lock() for name in MODEL_ATTRS}
+        # 线程不会被fork复制，批处理器和后台线程需要在子进程中重新启动
+        self._asr_batcher = AsrBatcher(
+            self._generate_asr_batch,
+            self._asr_batcher.window_s * 1000,
+            lambda: self.inflight_transcriptions,
+        )
+        if self.warmup_interval_s > 0:
+            threading.Thread(
+                target=self._idle_warmup_loop, name="funasr-idle-warmup", daemon=True
+            ).start()
+        if self.metrics_port:
+            # 每个工作进程的指标使用各自的端口
+            self.metrics_port += index
+            self._start_metrics_server()
+
+        self._stdout = os.fdopen(response_fd, "w", encoding="utf-8")
+        logger.info(f"工作进程 {index} 已启动 (pid {os.getpid()})")
+        self._start_executors()
+        with os.fdopen(request_fd, "rb") as requests:
+            self._serve(requests, self._dispatch)
+        self._shutdown_executors()
+
+    def run(self):
+        """运行服务器主循环"""
+        logger.info("FunASR服务器启动")
+
+        cache_path = self.damo_root
+        logger.info(f"使用的模型根目录(damo root): {cache_path}")
+
+        if self.metrics_port and self.workers == 1:
+            self._start_metrics_server()
+
+        repos = [MODEL_IDS[name].split("/")[-1] for name in ("asr", "vad", "punc")]
+
+        # 下载脚本写入的清单中记录为完整的模型直接查表，不再扫描目录；
+        # 清单之外(例如旧版本下载)的模型仍按目录内容判断
+        manifest = self.model_manifest or {}
+        missing = []
+        missing_models = []
+        for name, r in zip(("asr", "vad", "punc"), repos):
+            if name in manifest:
+                continue
+            rd = os.path.join(cache_path, r)
+            if not model_repo_ready(rd):
+                missing.append(r)
+                missing_models.append(name)
+
+        # 立即握手，模型在后台加载，加载进度以init_progress事件输出；
+        # 模型未下载时握手中直接带上缺失的模型，客户端不必等初始化结束
+        if not missing:
+            self.init_progress = dict.fromkeys(("asr", "vad", "punc"), "pending")
+        self._send_response(
+            {
+                "success": True,
+                "type": "handshake",
+                "pid": os.getpid(),
+                "models_downloaded": not missing,
+                "missing_models": missing_models,
+                "initializing": not missing,
+                "workers": self.workers,
+            }
+        )
+
+        # 请求的去向：单进程模式直接交给本进程的执行通道，
+        # 在这里等待初始化锁，相当于排队到模型加载完成；
+        # 多进程模式在工作进程启动前只应答控制命令，其余请求暂存
+        route = {"dispatch": None, "pool": None}
+        early_requests = []
+        route_lock = threading.Lock()
+        if self.workers == 1:
+            self._start_executors()
+            route["dispatch"] = self._dispatch
+
+        def dispatch(command, audio_data=None):
+            with route_lock:
+                target = route["dispatch"]
+                if target is None:
+                    if command.get("action") not in CONTROL_ACTIONS:
+                        early_requests.append((command, audio_data))
+                        return
+                    target = self._run_job
+            target(command, audio_data)
 
+        def initialize_in_background():
+            if not missing:
+                logger.info("模型文件存在，开始后台初始化")
+                init_result = self.initialize(on_progress=self._send_response)
+            else:
+                logger.info(f"模型文件不存在或不完整：{', '.join(missing)}，跳过初始化")
+                init_result = {
+                    "success": False,
+                    "error": "模型文件未下载，请先下载模型",
+                    "type": "models_not_downloaded",
+                }
+            if self.workers > 1:
+                # 多进程模式：模型加载完成后fork工作进程，父进程只负责分发请求
+                with route_lock:
+                    if init_result["success"]:
+                        route["pool"] = PreforkPool(self, self.workers)
+                        route["pool"].start()
+                        route["dispatch"] = route["pool"].dispatch
+                    else:
+                        logger.warning("模型未初始化，不启动工作进程，以单进程模式运行")
+                        self._start_executors()
+                        route["dispatch"] = self._dispatch
+                    # 按到达顺序补发工作进程启动前暂存的请求
+                    for command, audio_data in early_requests:
+                        route["dispatch"](command, audio_data)
+                    early_requests.clear()
+            self._send_response(
+                dict(init_result, event="init_progress", status="done")
+            )
+
+        threading.Thread(
+            target=initialize_in_background, name="funasr-init", daemon=True
+        ).start()
+
+        # 以二进制方式读取stdin：命令为一行JSON，若带有audio_bytes字段，
+        # 则紧随其后的audio_bytes个字节为音频数据，无需经过临时文件
+        self._serve(sys.stdin.buffer, dispatch)
+
+        self.running = False
+        with route_lock:
+            if route["pool"]:
+                route["pool"].shutdown()
+            elif route["dispatch"]:
+                self._shutdown_executors()
         logger.info("FunASR服务器退出")
 
-if __name__ == "__main__":
+# 批量转录时识别的音频文件扩展名
+AUDIO_EXTENSIONS = (
+    ".wav", ".flac", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".webm"
+)
+
+# 批量转录工作进程内的服务器实例（每个进程只加载一次模型）
+_batch_server = None
+_batch_init_error = None
+
+
+def collect_audio_files(inputs):
+    """展开目录和glob模式，返回去重后的音频文件绝对路径列表"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _dirs, names in os.walk(item):
+                for name in sorted(names):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        files.append(os.path.join(root, name))
+        else:
+            for match in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(match):
+                    files.append(match)
+    return list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+
+def _load_finished_files(output_path):
+    """读取已有的JSONL结果，返回已成功转录的文件集合，用于断点续跑"""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 崩溃时可能留下写了一半的行
+                continue
+            if record.get("success") and record.get("file"):
+                finished.add(record["file"])
+    return finished
+
+
+def _batch_worker_init(server_options, threads, log_options, log_queue):
+    """工作进程初始化：按进程数分配OMP线程后加载一次模型"""
+    global _batch_server, _batch_init_error
+    # 日志记录经队列交给主进程写入，工作进程不直接打开主进程会轮转的日志文件
+    setup_logging(forward_queue=log_queue, **log_options)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        _batch_server = FunASRServer(
+            max_concurrency=1,
+            batch_window_ms=0,
+            thread_budget=threads,
+            **server_options,
+        )
+        init_result = _batch_server.initialize()
+        if not init_result["success"]:
+            _batch_init_error = init_result["error"]
+    except Exception as e:
+        _batch_init_error = str(e)
+
+
+def _batch_transcribe_file(audio_path, options):
+    """在工作进程中转录单个文件，返回一条JSONL记录"""
+    if _batch_init_error:
+        return {"file": audio_path, "success": False, "error": _batch_init_error}
+
+    start_time = time.time()
+    result = _batch_server.transcribe_audio(audio_path, options)
+    elapsed = time.time() - start_time
+
+    record = {"file": audio_path}
+    record.update(result)
+    record["processing_time"] = round(elapsed, 3)
+    duration = result.get("duration") or 0.0
+    record["rtf"] = round(elapsed / duration, 4) if duration > 0 else None
+    return record
+
+
+def _batch_transcribe_task(task):
+    return _batch_transcribe_file(*task)
+
+
+def run_batch(args, server_options):
+    """批量转录：多进程并行，结果按行写入JSONL并支持断点续跑"""
+    import multiprocessing
+
+    files = collect_audio_files(args.inputs)
+    finished = _load_finished_files(args.output)
+    todo = [f for f in files if f not in finished]
+
+    workers = max(1, min(args.batch_jobs, len(todo) or 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    options = {"use_punc": not args.no_punc, "hotword": args.hotword}
+
+    logger.info(
+        f"批量转录: 共 {len(files)} 个文件，已完成 {len(files) - len(todo)} 个，"
+        f"待处理 {len(todo)} 个，{workers} 个进程 x {threads} 线程"
+    )
+
+    succeeded = failed = 0
+    total_audio = total_processing = 0.0
+    wall_start = time.time()
+
+    if todo:
+        # 续跑时若上次崩溃留下未换行的半行，先补一个换行
+        needs_newline = False
+        if os.path.exists(args.output) and os.path.getsize(args.output) > 0:
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+
+        context = multiprocessing.get_context("spawn")
+        log_queue = context.Queue()
+        with _log_pipeline.forwarded_from(log_queue), open(
+            args.output, "a", encoding="utf-8"
+        ) as out, context.Pool(
+            workers,
+            initializer=_batch_worker_init,
+            initargs=(server_options, threads, _log_pipeline.options, log_queue),
+        ) as pool:
+            if needs_newline:
+                out.write("\n")
+            tasks = [(path, options) for path in todo]
+            for record in pool.imap_unordered(_batch_transcribe_task, tasks):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                if record.get("success"):
+                    succeeded += 1
+                    total_audio += record.get("duration") or 0.0
+                    total_processing += record.get("processing_time") or 0.0
+                else:
+                    failed += 1
+
+                progress = {
+                    "stage": "progress",
+                    "file": record["file"],
+                    "success": record.get("success", False),
+                    "rtf": record.get("rtf"),
+                    "completed": succeeded + failed,
+                    "total": len(todo),
+                }
+                print(json.dumps(progress, ensure_ascii=False))
+                sys.stdout.flush()
+
+    wall_time = time.time() - wall_start
+    summary = {
+        "success": failed == 0,
+        "files": len(files),
+        "skipped": len(files) - len(todo),
+        "succeeded": succeeded,
+        "failed": failed,
+        "workers": workers,
+        "threads_per_worker": threads,
+        "audio_duration": round(total_audio, 2),
+        "wall_time": round(wall_time, 2),
+        # 单文件平均RTF反映单进程速度，整体RTF(墙钟时间/音频时长)反映吞吐
+        "average_rtf": (
+            round(total_processing / total_audio, 4) if total_audio > 0 else None
+        ),
+        "overall_rtf": round(wall_time / total_audio, 4) if total_audio > 0 else None,
+        "output": os.path.abspath(args.output),
+    }
+    print(json.dumps(summary, ensure_ascii=False))
+    sys.stdout.flush()
+    return 0 if failed == 0 else 1
+
+
+def run_export_onnx(args):
+    """导出所有支持ONNX推理的模型，每个模型输出一行JSON结果"""
+    damo_root = args.damo_root or os.environ.get("DAMO_ROOT") or default_damo_root()
+    failed = 0
+    for name in ONNX_MODEL_CLASSES:
+        model_dir = os.path.join(damo_root, MODEL_IDS[name].split("/")[-1])
+        try:
+            with suppress_stdout():
+                exported = export_onnx_model(model_dir, args.onnx_quantize)
+            result = {"success": True, "model": name, "exported": exported}
+        except Exception as e:
+            failed += 1
+            logger.error(f"{name}模型导出ONNX失败: {str(e)}")
+            result = {"success": False, "model": name, "error": str(e)}
+        print(json.dumps(result, ensure_ascii=False))
+        sys.stdout.flush()
+    return 0 if failed == 0 else 1
+
+
+def normalize_cer_text(text):
+    """计算CER前去掉标点和空白，英文统一为小写"""
+    import unicodedata
+
+    return "".join(
+        ch
+        for ch in text.lower()
+        if not ch.isspace() and not unicodedata.category(ch).startswith("P")
+    )
+
+
+def edit_distance(ref, hyp):
+    """字符级编辑距离(替换、插入、删除)"""
+    previous = list(range(len(hyp) + 1))
+    for i, ref_char in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hyp, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (ref_char != hyp_char),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+def load_reference_set(inputs, text_path=None):
+    """加载参考集：参考文本来自Kaldi格式的text文件(utt_id 文本)或音频旁同名的.txt"""
+    references = {}
+    if text_path:
+        with open(text_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split(maxsplit=1)
+                if len(parts) == 2:
+                    references[parts[0]] = parts[1]
+
+    samples = []
+    for audio_path in collect_audio_files(inputs):
+        stem = os.path.splitext(audio_path)[0]
+        text = references.get(os.path.basename(stem))
+        if text is None and os.path.exists(stem + ".txt"):
+            with open(stem + ".txt", "r", encoding="utf-8") as f:
+                text = f.read().strip()
+        if text is not None:
+            samples.append({"file": audio_path, "text": text})
+    return samples
+
+
+def run_accuracy(args, server_options):
+    """在本地参考集上对比fp32和动态int8量化模型的CER、速度和内存"""
+    import gc
+
+    samples = load_reference_set(args.inputs, args.text)
+    if not samples:
+        error = {"success": False, "error": "没有找到带参考文本的音频"}
+        print(json.dumps(error, ensure_ascii=False))
+        return 1
+
+    # 只比较ASR本身，标点不计入CER；快照会互相覆盖，这里不使用
+    options = {"use_punc": False, "hotword": args.hotword}
+    # 量化与否由下面的两轮对比决定，不使用命令行的--quantize
+    server_options = {
+        key: value
+        for key, value in dict(server_options, backends=None, use_snapshots=False).items()
+        if key != "quantize"
+    }
+    summary = {"success": True, "files": len(samples)}
+    hypotheses = {}
+
+    for mode, quantize in (("fp32", False), ("int8", True)):
+        server = FunASRServer(
+            batch_window_ms=0, lazy_load=True, quantize=quantize, **server_options
+        )
+        server.initialize()
+        # 先加载模型，加载耗时不计入RTF
+        for name in ("vad", "asr"):
+            with server._use_model(name):
+                pass
+
+        errors = ref_chars = 0
+        audio_duration = processing_time = 0.0
+        for sample in samples:
+            start_time = time.time()
+            result = server.transcribe_audio(sample["file"], options)
+            processing_time += time.time() - start_time
+            if not result["success"]:
+                record = {"file": sample["file"], "mode": mode}
+                record.update(result)
+                print(json.dumps(record, ensure_ascii=False))
+                return 1
+            ref = normalize_cer_text(sample["text"])
+            hyp = normalize_cer_text(result["raw_text"])
+            errors += edit_distance(ref, hyp)
+            ref_chars += len(ref)
+            audio_duration += result["duration"]
+            hypotheses.setdefault(sample["file"], {})[mode] = result["raw_text"]
+
+        asr_memory = server.get_memory_usage()["models"]["asr"]
+        summary[mode] = {
+            "cer": round(errors / max(1, ref_chars), 4),
+            "rtf": (
+                round(processing_time / audio_duration, 4)
+                if audio_duration > 0
+                else None
+            ),
+            "asr_param_mb": asr_memory["param_mb"],
+            "asr_rss_delta_mb": asr_memory["rss_delta_mb"],
+            "asr_load_time": asr_memory["load_time"],
+        }
+        server.running = False
+        del server
+        gc.collect()
+
+    # 逐文件输出两种模式的识别结果，便于检查差异
+    for sample in samples:
+        record = {"file": sample["file"], "reference": sample["text"]}
+        record.update(hypotheses[sample["file"]])
+        print(json.dumps(record, ensure_ascii=False))
+
+    fp32, int8 = summary["fp32"], summary["int8"]
+    summary["cer_delta"] = round(int8["cer"] - fp32["cer"], 4)
+    summary["speedup"] = (
+        round(fp32["rtf"] / int8["rtf"], 2) if fp32["rtf"] and int8["rtf"] else None
+    )
+    summary["asr_param_ratio"] = (
+        round(fp32["asr_param_mb"] / int8["asr_param_mb"], 2)
+        if int8["asr_param_mb"]
+        else None
+    )
+    print(json.dumps(summary, ensure_ascii=False))
+    sys.stdout.flush()
+    return 0
+
+
+def main(argv=None):
+    """命令行入口：默认运行服务器主循环，子命令见batch/export-onnx/accuracy"""
     parser = argparse.ArgumentParser()
     parser.add_argument("--damo-root", type=str, default=None,
                         help="damo 模型根目录，例如 /Volumes/APFS/AI/models/damo")
-    args = parser.parse_args()
+    parser.add_argument("--max-concurrency", type=int, default=2,
+                        help="同时执行的推理请求数")
+    parser.add_argument("--batch-window-ms", type=int, default=20,
+                        help="ASR微批处理等待并发请求的时间窗口(毫秒)")
+    parser.add_argument("--lazy-load", action="store_true",
+                        help="启动时不预加载模型，首次使用时再加载")
+    parser.add_argument("--idle-unload", type=float, default=0,
+                        help="模型空闲超过该秒数后卸载以释放内存，0表示不卸载")
+    parser.add_argument("--warmup-interval", type=float, default=0,
+                        help="空闲超过该秒数后自动预热已加载的模型，0表示不预热")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="预派生的工作进程数(仅POSIX)，各进程共享同一份模型内存")
+    parser.add_argument("--preload-streaming", action="store_true",
+                        help="启动时预加载流式识别模型，并且不因空闲而卸载")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="不使用模型快照缓存，每次都从模型配置重新构建")
+    for model_name, label in (("asr", "ASR"), ("vad", "VAD"), ("punc", "标点")):
+        parser.add_argument(f"--{model_name}-backend", choices=MODEL_BACKENDS,
+                            default="pytorch", help=f"{label}模型的推理后端")
+    parser.add_argument("--onnx-quantize", action="store_true",
+                        help="ONNX后端使用int8量化模型(首次使用时自动导出)")
+    parser.add_argument("--quantize", action="store_true",
+                        help="PyTorch后端对ASR和标点模型做动态int8量化")
+    parser.add_argument("--pin-cores", action="store_true",
+                        help="只使用性能核(P核)，Linux下会绑定CPU亲和性")
+    parser.add_argument("--thread-config", default=None,
+                        help="线程自动调优结果文件，默认保存在用户数据目录")
+    parser.add_argument("--result-cache-dir", default=None,
+                        help="转录结果缓存目录，不指定则不缓存")
+    parser.add_argument("--result-cache-mb", type=float, default=256,
+                        help="转录结果缓存的大小上限(MB)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在本地该端口提供Prometheus格式的/metrics接口")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="日志级别")
+    parser.add_argument("--log-max-mb", type=float, default=10,
+                        help="日志文件超过该大小(MB)后轮转，0表示不按大小轮转")
+    parser.add_argument("--log-rotate-when", default=None,
+                        help="按时间轮转日志，例如 midnight、H，设置后不再按大小轮转")
+    parser.add_argument("--log-backups", type=int, default=5,
+                        help="保留的历史日志文件数")
+    parser.add_argument("--log-sample", action="append", default=[],
+                        metavar="LEVEL=RATE",
+                        help="高频日志按级别采样，例如 INFO=0.1 表示每10条保留1条，可重复指定")
+    parser.add_argument("--redact-transcripts", action="store_true",
+                        help="日志中不记录转录文本，只记录文本长度")
+
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="批量转录音频文件")
+    batch_parser.add_argument("inputs", nargs="+",
+                              help="音频目录或glob模式，例如 'meetings/**/*.wav'")
+    batch_parser.add_argument("-o", "--output", default="transcripts.jsonl",
+                              help="JSONL结果文件，重新运行时跳过已成功的文件")
+    # 与顶层的--workers(预派生进程数)区分dest，否则子命令默认值会覆盖顶层参数
+    batch_parser.add_argument("-j", "--workers", dest="batch_jobs", type=int,
+                              default=max(1, (os.cpu_count() or 1) // 4),
+                              help="工作进程数，CPU线程在进程间平均分配")
+    batch_parser.add_argument("--hotword", default="", help="热词")
+    batch_parser.add_argument("--no-punc", action="store_true",
+                              help="不进行标点恢复")
+    subparsers.add_parser("export-onnx",
+                          help="预先导出ONNX模型(需要funasr和torch)")
+    accuracy_parser = subparsers.add_parser(
+        "accuracy", help="在参考集上对比fp32和int8量化模型的CER")
+    accuracy_parser.add_argument("inputs", nargs="+",
+                                 help="参考集音频目录或glob模式，参考文本为同名.txt")
+    accuracy_parser.add_argument("--text", default=None,
+                                 help="Kaldi格式的参考文本文件(每行: 音频文件名 文本)")
+    accuracy_parser.add_argument("--hotword", default="", help="热词")
+    args = parser.parse_args(argv)
+
+    sample_rates = {}
+    for item in args.log_sample:
+        level, _, rate = item.partition("=")
+        try:
+            sample_rates[level.strip().upper()] = float(rate)
+        except ValueError:
+            parser.error(f"无效的日志采样设置: {item}")
+    setup_logging(
+        level=args.log_level,
+        max_mb=args.log_max_mb,
+        backups=args.log_backups,
+        when=args.log_rotate_when,
+        sample_rates=sample_rates,
+        redact_transcripts=args.redact_transcripts,
+    )
+
+    server_options = {
+        "damo_root": args.damo_root,
+        "use_snapshots": not args.no_snapshot,
+        "backends": {
+            "asr": args.asr_backend,
+            "vad": args.vad_backend,
+            "punc": args.punc_backend,
+        },
+        "onnx_quantize": args.onnx_quantize,
+        "quantize": args.quantize,
+        "pin_cores": args.pin_cores,
+        "thread_config": args.thread_config,
+        "result_cache_dir": args.result_cache_dir,
+        "result_cache_mb": args.result_cache_mb,
+    }
+
+    if args.command == "batch":
+        sys.exit(run_batch(args, server_options))
+
+    if args.command == "export-onnx":
+        sys.exit(run_export_onnx(args))
 
-    server = FunASRServer(damo_root=args.damo_root)
-    server.run()
\ No newline at end of file
+    if args.command == "accuracy":
+        sys.exit(run_accuracy(args, server_options))
+
+    server = FunASRServer(
+        max_concurrency=args.max_concurrency,
+        batch_window_ms=args.batch_window_ms,
+        lazy_load=args.lazy_load,
+        idle_unload_s=args.idle_unload,
+        metrics_port=args.metrics_port,
+        warmup_interval_s=args.warmup_interval,
+        workers=args.workers,
+        preload_streaming=args.preload_streaming,
+        **server_options,
+    )
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -171,6 +171,8 @@ async function startApp() {
 
   // 在启动时初始化FunASR管理器（不等待以避免阻塞）
   logger.info('开始初始化FunASR管理器...');
+  funasrManager.setResultCacheEnabled(databaseManager.getSetting('enable_result_cache', false));
+  funasrManager.setStreamingEnabled(databaseManager.getSetting('enable_streaming_asr', false));
   funasrManager.initializeAtStartup().catch((err) => {
     logger.warn("FunASR在启动时不可用，这不是关键问题", err);
   });
@@ -17,7 +17,20 @@ contextBridge.exposeInMainWorld("electronAPI", {
   },
 
   // FunASR语音识别
-  transcribeAudio: (audioData) => ipcRenderer.invoke("transcribe-audio", audioData),
+  transcribeAudio: (audioData, options, audioFormat) =>
+    ipcRenderer.invoke("transcribe-audio", audioData, options, audioFormat),
+  warmupFunASR: () => ipcRenderer.invoke("funasr-warmup"),
+  transcribeLongAudio: (filePath, options) =>
+    ipcRenderer.invoke("transcribe-long-audio", filePath, options),
+  onTranscribeLongAudioProgress: (callback) => {
+    ipcRenderer.on("transcribe-long-audio-progress", callback);
+    return () => ipcRenderer.removeListener("transcribe-long-audio-progress", callback);
+  },
+  startTranscriptionStream: (options) => ipcRenderer.invoke("funasr-stream-start", options),
+  sendTranscriptionStreamChunk: (streamId, pcmData) =>
+    ipcRenderer.invoke("funasr-stream-chunk", streamId, pcmData),
+  endTranscriptionStream: (streamId) => ipcRenderer.invoke("funasr-stream-end", streamId),
+  cancelTranscriptionStream: (streamId) => ipcRenderer.invoke("funasr-stream-cancel", streamId),
   checkFunASRStatus: () => ipcRenderer.invoke("check-funasr-status"),
   installFunASR: () => ipcRenderer.invoke("install-funasr"),
   restartFunasrServer: () => ipcRenderer.invoke("restart-funasr-server"),
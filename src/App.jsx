@@ -300,6 +300,14 @@ export default function App() {
     }
   }, []);
 
+  // 处理流式识别中间结果：录音过程中实时刷新原始文本
+  const handleTranscriptionPartial = useCallback((partialText) => {
+    if (!partialText) return;
+    setOriginalText(partialText);
+    setProcessedText("");
+    setShowTextArea(true);
+  }, []);
+
   // 处理AI优化完成
   const handleAIOptimizationComplete = useCallback(async (optimizedResult) => {
     console.log('AI优化完成回调被触发:', optimizedResult);
@@ -329,20 +337,23 @@ export default function App() {
   useEffect(() => {
     console.log('设置回调函数');
     window.onTranscriptionComplete = handleRecordingComplete;
+    window.onTranscriptionPartial = handleTranscriptionPartial;
     window.onAIOptimizationComplete = handleAIOptimizationComplete;
     
     // 验证回调函数是否正确设置
     console.log('回调函数设置完成:', {
       onTranscriptionComplete: typeof window.onTranscriptionComplete,
+      onTranscriptionPartial: typeof window.onTranscriptionPartial,
       onAIOptimizationComplete: typeof window.onAIOptimizationComplete
     });
     
     return () => {
       console.log('清理回调函数');
       window.onTranscriptionComplete = null;
+      window.onTranscriptionPartial = null;
       window.onAIOptimizationComplete = null;
     };
-  }, [handleRecordingComplete, handleAIOptimizationComplete]);
+  }, [handleRecordingComplete, handleTranscriptionPartial, handleAIOptimizationComplete]);
 
   // 处理复制文本
   const handleCopyText = async (text) => {
@@ -1,7 +1,6 @@
 const { spawn } = require("child_process");
 const fs = require("fs");
 const path = require("path");
-const crypto = require("crypto");
 const os = require("os");
 const PythonInstaller = require("./pythonInstaller");
 const { runCommand, TIMEOUTS } = require("../utils/process");
@@ -11,6 +10,15 @@ let globalModelCheckCache = null;
 let globalModelCheckTime = 0;
 const GLOBAL_CACHE_TIME = 2000; // 减少到2秒缓存，确保及时更新
 
+// 模型空闲30分钟后由服务器卸载，下次使用时自动重新加载
+const MODEL_IDLE_UNLOAD_SECONDS = 30 * 60;
+// 空闲5分钟后由服务器预热已加载的模型，避免权重被换出内存
+const MODEL_WARMUP_INTERVAL_SECONDS = 5 * 60;
+// 模型下载5分钟没有任何进度时视为停滞
+const MODEL_DOWNLOAD_STALL_TIMEOUT_MS = 5 * 60 * 1000;
+// download_models.py在模型根目录写入的清单
+const MODEL_MANIFEST_NAME = '.ququ_manifest.json';
+
 class FunASRManager {
   constructor(logger = null) {
     this.logger = logger || console; // 使用传入的logger或默认console
@@ -22,7 +30,13 @@ class FunASRManager {
     this.initializationPromise = null; // 缓存初始化Promise
     this.serverProcess = null; // FunASR服务器进程
     this.serverReady = false; // 服务器是否就绪
+    this.initProgress = {}; // 后台加载时各模型的状态
     this.modelsDownloaded = null; // 缓存模型下载状态
+    this.serverMissingModels = []; // 服务器握手时报告缺失的模型
+    this.requestSeq = 0; // 服务器请求ID计数
+    this.pendingRequests = new Map(); // 等待响应的请求，按ID匹配
+    this.resultCacheEnabled = false; // 转录结果缓存，由设置项开启
+    this.streamingEnabled = false; // 流式识别，由设置项开启
     
     // 简化缓存
     this._cachedPythonEnv = null;
@@ -44,6 +58,13 @@ class FunASRManager {
         "name": "damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
         "cache_path": "punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
         "expected_size": 278 * 1024 * 1024  // 278MB
+      },
+      // 流式识别模型：只有开启流式识别时才要求已下载
+      "online_asr": {
+        "name": "damo/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-online",
+        "cache_path": "speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-online",
+        "expected_size": 840 * 1024 * 1024,  // 840MB
+        "optional": true
       }
     };
   }
@@ -261,6 +282,54 @@ class FunASRManager {
     throw new Error(`未找到有效的 damo 模型目录，请检查 MODELSCOPE_CACHE 或模型安装路径`);
   }
 
+  /**
+   * 设置是否开启转录结果缓存
+   */
+  setResultCacheEnabled(enabled) {
+    // 缓存会把识别文本落盘，默认关闭；在下次启动服务器时生效
+    this.resultCacheEnabled = enabled === true;
+  }
+
+  /**
+   * 获取转录结果缓存目录
+   */
+  getResultCachePath() {
+    // 放在用户数据目录下，重试同一段录音时直接返回
+    return path.join(require('electron').app.getPath('userData'), 'funasr_result_cache');
+  }
+
+  /**
+   * 获取随应用打包的ffmpeg路径，用于服务器解码WebM/Opus录音
+   */
+  getFFmpegPath() {
+    try {
+      const ffmpegPath = require('ffmpeg-static');
+      // 打包后ffmpeg-static位于app.asar.unpacked中
+      const unpacked = ffmpegPath && ffmpegPath.replace('app.asar', 'app.asar.unpacked');
+      if (unpacked && fs.existsSync(unpacked)) {
+        return unpacked;
+      }
+    } catch (error) {
+      this.logger.warn && this.logger.warn('未找到ffmpeg-static:', error.message);
+    }
+    return null;
+  }
+
+  /**
+   * 设置是否开启流式识别
+   */
+  setStreamingEnabled(enabled) {
+    // 开启后服务器启动时预加载流式模型；运行中开启则立即加载，避免第一次录音时才加载
+    this.streamingEnabled = enabled === true;
+    this._clearModelCache();
+    if (this.streamingEnabled && this.serverReady) {
+      this._sendServerCommand({ action: 'warmup', models: ['online_asr'] }, null, 600000)
+        .catch((error) => {
+          this.logger.warn && this.logger.warn('流式模型预加载失败', error);
+        });
+    }
+  }
+
 
   async checkModelFiles() {
     /**
@@ -297,12 +366,29 @@ class FunASRManager {
       
       const results = {};
       const missingModels = [];
+      const manifest = this._readModelManifest(cachePath);
       
       for (const [modelType, config] of Object.entries(this.modelConfigs)) {
+        if (config.optional && !this.streamingEnabled) {
+          continue;
+        }
         const modelDir = path.join(cachePath, config.cache_path);
         const modelFile = path.join(modelDir, "model.pt");
+        const manifestEntry = manifest && manifest.models && manifest.models[modelType];
         
-        if (fs.existsSync(modelFile)) {
+        if (manifestEntry && manifestEntry.complete && manifestEntry.dir === config.cache_path) {
+          // 下载脚本已校验过的模型，直接以清单为准
+          const size = Object.values(manifestEntry.files || {})
+            .reduce((sum, file) => sum + (file.size || 0), 0);
+          results[modelType] = {
+            exists: true,
+            path: modelDir,
+            size,
+            expected_size: config.expected_size,
+            complete: true,
+            verified: true
+          };
+        } else if (fs.existsSync(modelFile)) {
           const stats = fs.statSync(modelFile);
           const fileSize = stats.size;
           const isComplete = fileSize >= config.expected_size * 0.95; // 允许5%误差
@@ -330,6 +416,15 @@ class FunASRManager {
         }
       }
       
+      // 文件大小检查通过、但服务器判断不完整的模型同样需要下载
+      if (this.serverReady) {
+        for (const modelType of this.serverMissingModels) {
+          if (!missingModels.includes(modelType)) {
+            missingModels.push(modelType);
+          }
+        }
+      }
+
       const allDownloaded = missingModels.length === 0;
       this.modelsDownloaded = allDownloaded;
       
@@ -367,6 +462,18 @@ class FunASRManager {
     }
   }
 
+  _readModelManifest(cachePath) {
+    // download_models.py写入的模型清单，不存在或无法解析时返回null
+    try {
+      const manifest = JSON.parse(
+        fs.readFileSync(path.join(cachePath, MODEL_MANIFEST_NAME), 'utf-8')
+      );
+      return manifest.version === 1 ? manifest : null;
+    } catch (error) {
+      return null;
+    }
+  }
+
   async getDownloadProgress() {
     /**
      * 获取模型下载进度
@@ -475,7 +582,15 @@ class FunASRManager {
         // 确保使用正确的Python环境
         const pythonEnv = this.buildPythonEnvironment();
         
-        const downloadProcess = spawn(pythonCmd, [scriptPath], {
+        // 与服务器使用同一个模型根目录；首次下载时目录还不存在，由脚本使用默认位置
+        const scriptArgs = [scriptPath];
+        try {
+          scriptArgs.push("--damo-root", this.getModelCachePath());
+        } catch (error) {
+          this.logger.info && this.logger.info('模型目录尚不存在，使用下载脚本的默认位置');
+        }
+        
+        const downloadProcess = spawn(pythonCmd, scriptArgs, {
           stdio: ["pipe", "pipe", "pipe"],
           windowsHide: true,
           env: pythonEnv
@@ -483,7 +598,22 @@ class FunASRManager {
         
         let hasError = false;
         
+        // 下载支持断点续传，超时按无进度的时长计算，而不是限制总时长
+        let stallTimer = null;
+        const armStallTimer = () => {
+          clearTimeout(stallTimer);
+          stallTimer = setTimeout(() => {
+            if (!hasError) {
+              hasError = true;
+              downloadProcess.kill();
+              reject(new Error('模型下载超时：长时间没有进度，重新下载会从中断处继续'));
+            }
+          }, MODEL_DOWNLOAD_STALL_TIMEOUT_MS);
+        };
+        armStallTimer();
+        
         downloadProcess.stdout.on("data", (data) => {
+          armStallTimer();
           const lines = data.toString().split('\n').filter(line => line.trim());
           
           for (const line of lines) {
@@ -504,7 +634,10 @@ class FunASRManager {
                   progress: result.progress,
                   overall_progress: result.overall_progress,
                   completed: result.completed,
-                  total: result.total
+                  total: result.total,
+                  downloaded_bytes: result.downloaded_bytes,
+                  total_bytes: result.total_bytes,
+                  speed: result.speed
                 });
               }
               
@@ -512,6 +645,7 @@ class FunASRManager {
               if (result.success !== undefined) {
                 if (result.success) {
                   this.modelsDownloaded = true;
+                  this.serverMissingModels = [];
                   resolve({ success: true, message: result.message || "模型下载完成" });
                 } else {
                   hasError = true;
@@ -533,9 +667,11 @@ class FunASRManager {
         });
         
         downloadProcess.on("close", (code) => {
+          clearTimeout(stallTimer);
           if (!hasError) {
             if (code === 0) {
               this.modelsDownloaded = true;
+              this.serverMissingModels = [];
               resolve({ success: true, message: "模型下载完成" });
             } else {
               reject(new Error(`模型下载进程退出，代码: ${code}`));
@@ -548,14 +684,6 @@ class FunASRManager {
             reject(new Error(`启动下载进程失败: ${error.message}`));
           }
         });
-        
-        // 设置超时（30分钟）
-        setTimeout(() => {
-          if (!hasError) {
-            downloadProcess.kill();
-            reject(new Error('模型下载超时'));
-          }
-        }, 30 * 60 * 1000);
       });
       
     } catch (error) {
@@ -678,40 +806,79 @@ class FunASRManager {
           env: pythonEnv
         });
         const cachePath = this.getModelCachePath();
+        // 随应用打包的ffmpeg用于解码录音的WebM/Opus音频
+        const ffmpegPath = this.getFFmpegPath();
         // this.serverProcess = spawn(pythonCmd, [serverPath], {
         //   stdio: ["pipe", "pipe", "pipe"],
         //   windowsHide: true,
         //   env: pythonEnv // 使用完整的Python环境变量
         // });
 
+        const serverArgs = [
+          serverPath,
+          "--damo-root", cachePath,
+          "--idle-unload", String(MODEL_IDLE_UNLOAD_SECONDS),
+          "--warmup-interval", String(MODEL_WARMUP_INTERVAL_SECONDS)
+        ];
+        if (this.resultCacheEnabled) {
+          serverArgs.push("--result-cache-dir", this.getResultCachePath());
+        }
+        if (this.streamingEnabled) {
+          serverArgs.push("--preload-streaming");
+        }
+
         this.serverProcess = spawn(
           pythonCmd,
-          [serverPath, "--damo-root", cachePath],   // <== 这里加上参数
+          serverArgs,
           {
             stdio: ["pipe", "pipe", "pipe"],
             windowsHide: true,
-            env: pythonEnv // 保持你原来的 Python 环境
+            env: ffmpegPath ? { ...pythonEnv, FFMPEG_PATH: ffmpegPath } : pythonEnv
           }
         );
 
         let initResponseReceived = false;
+        let stdoutBuffer = '';
 
+        // 按行缓冲输出，避免一条JSON被拆到多个data事件中
+        this.serverProcess.stdout.setEncoding('utf8');
         this.serverProcess.stdout.on("data", (data) => {
-          const lines = data.toString().split('\n').filter(line => line.trim());
-          
-          for (const line of lines) {
+          stdoutBuffer += data;
+          const lines = stdoutBuffer.split('\n');
+          stdoutBuffer = lines.pop();
+
+          for (const rawLine of lines) {
+            const line = rawLine.trim();
+            if (!line) continue;
             this.logger.debug && this.logger.debug('FunASR服务器输出', { line });
             try {
               const result = JSON.parse(line);
-              
-              if (!initResponseReceived) {
-                // 这是初始化响应
+
+              if (result.id !== undefined) {
+                // 带ID的响应交给对应的请求
+                this._resolvePendingRequest(result);
+              } else if (result.event === 'init_progress') {
+                // 模型在后台加载，逐个模型报告进度，status为done时加载结束
+                this._handleInitProgress(result);
+              } else if (!initResponseReceived) {
+                // 握手响应：服务器已可以接收命令，模型可能仍在后台加载
                 initResponseReceived = true;
                 if (result.success) {
                   this.serverReady = true;
-                  this.modelsInitialized = true;
+                  this.modelsInitialized = result.type !== 'handshake';
+                  this.serverMissingModels = result.missing_models || [];
                   this._clearModelCache(); // 清除缓存，确保状态更新
-                  this.logger.info && this.logger.info('FunASR服务器启动成功，模型已初始化');
+                  if (result.models_downloaded === false) {
+                    // 模型未下载：界面据此进入待下载状态，而不是等初始化失败
+                    this.modelsDownloaded = false;
+                    this.logger.warn && this.logger.warn('FunASR服务器已就绪，模型未下载', {
+                      missingModels: this.serverMissingModels
+                    });
+                  } else {
+                    this.logger.info && this.logger.info('FunASR服务器已就绪，模型后台加载中', {
+                      initializing: result.initializing
+                    });
+                  }
                 } else {
                   this.logger.error && this.logger.error('FunASR服务器初始化失败', result);
                 }
@@ -735,6 +902,7 @@ class FunASRManager {
 
         this.serverProcess.on("close", (code) => {
           this.logger.warn && this.logger.warn('FunASR服务器进程退出', { code });
+          this._rejectPendingRequests(new Error('FunASR服务器进程已退出'));
           this.serverProcess = null;
           this.serverReady = false;
           this.modelsInitialized = false;
@@ -746,6 +914,7 @@ class FunASRManager {
 
         this.serverProcess.on("error", (error) => {
           this.logger.error && this.logger.error('FunASR服务器进程错误', error);
+          this._rejectPendingRequests(error);
           this.serverProcess = null;
           this.serverReady = false;
           
@@ -770,48 +939,98 @@ class FunASRManager {
     }
   }
 
-  async _sendServerCommand(command) {
+  _handleInitProgress(event) {
+    if (event.status !== 'done') {
+      this.initProgress = { ...this.initProgress, [event.model]: event.status };
+      this.logger.info && this.logger.info('FunASR模型加载进度', {
+        model: event.model,
+        status: event.status,
+        loadTime: event.load_time,
+        loaded: event.loaded,
+        total: event.total
+      });
+      return;
+    }
+
+    this.modelsInitialized = !!event.success;
+    this._clearModelCache();
+    if (event.type === 'models_not_downloaded') {
+      // 不是加载失败：checkModelFiles会返回缺失的模型，界面进入待下载状态
+      this.modelsDownloaded = false;
+      this.logger.warn && this.logger.warn('FunASR模型未下载，等待用户下载', {
+        missingModels: this.serverMissingModels
+      });
+    } else if (event.success) {
+      this.logger.info && this.logger.info('FunASR模型初始化完成', { message: event.message });
+    } else {
+      this.logger.error && this.logger.error('FunASR模型初始化失败', event);
+    }
+  }
+
+  async _sendServerCommand(command, payload = null, timeoutMs = 60000, onEvent = null) {
     if (!this.serverProcess || !this.serverReady) {
       throw new Error('FunASR服务器未就绪');
     }
 
-    return new Promise((resolve, reject) => {
-      let responseReceived = false;
-      
-      const onData = (data) => {
-        if (responseReceived) return;
-        
-        const lines = data.toString().split('\n').filter(line => line.trim());
-        
-        for (const line of lines) {
-          try {
-            const result = JSON.parse(line);
-            responseReceived = true;
-            this.serverProcess.stdout.removeListener('data', onData);
-            resolve(result);
-            return;
-          } catch (parseError) {
-            // 忽略非JSON输出
-          }
-        }
-      };
+    // 每个请求带唯一ID，服务器并发处理并在响应中回显ID
+    const id = ++this.requestSeq;
 
-      this.serverProcess.stdout.on('data', onData);
-      
-      // 发送命令
-      this.serverProcess.stdin.write(JSON.stringify(command) + '\n');
-      
-      // 设置超时
-      setTimeout(() => {
-        if (!responseReceived) {
-          responseReceived = true;
-          this.serverProcess.stdout.removeListener('data', onData);
+    return new Promise((resolve, reject) => {
+      // 超时按无响应时间计算：长任务每收到一个中间事件就重新计时
+      const armTimer = () => setTimeout(() => {
+        if (this.pendingRequests.delete(id)) {
           reject(new Error('服务器响应超时'));
         }
-      }, 60000); // 1分钟超时
+      }, timeoutMs);
+
+      this.pendingRequests.set(id, { resolve, reject, timer: armTimer(), armTimer, onEvent });
+
+      // 发送命令：带音频时在JSON行后紧跟audio_bytes个字节的二进制帧
+      const message = { ...command, id };
+      if (payload) {
+        const header = JSON.stringify({ ...message, audio_bytes: payload.length }) + '\n';
+        this.serverProcess.stdin.write(Buffer.concat([Buffer.from(header, 'utf8'), payload]));
+      } else {
+        this.serverProcess.stdin.write(JSON.stringify(message) + '\n');
+      }
     });
   }
 
+  _resolvePendingRequest(result) {
+    const pending = this.pendingRequests.get(result.id);
+    if (!pending) {
+      this.logger.debug && this.logger.debug('收到未知请求ID的响应', { id: result.id });
+      return;
+    }
+
+    const { id, ...response } = result;
+    if (response.event) {
+      // 中间事件(如长音频的分段结果)：转给回调，请求继续等待最终响应
+      clearTimeout(pending.timer);
+      pending.timer = pending.armTimer();
+      if (pending.onEvent) {
+        try {
+          pending.onEvent(response);
+        } catch (error) {
+          this.logger.warn && this.logger.warn('处理服务器事件失败', error);
+        }
+      }
+      return;
+    }
+
+    this.pendingRequests.delete(result.id);
+    clearTimeout(pending.timer);
+    pending.resolve(response);
+  }
+
+  _rejectPendingRequests(error) {
+    for (const pending of this.pendingRequests.values()) {
+      clearTimeout(pending.timer);
+      pending.reject(error);
+    }
+    this.pendingRequests.clear();
+  }
+
   async _stopFunASRServer() {
     if (this.serverProcess) {
       try {
@@ -1113,7 +1332,7 @@ class FunASRManager {
     }
   }
 
-  async transcribeAudio(audioBlob, options = {}) {
+  async transcribeAudio(audioBlob, options = {}, audioFormat = 'wav') {
     // 检查 FunASR 是否已安装
     const status = await this.checkFunASRInstallation();
     if (!status.installed) {
@@ -1126,46 +1345,152 @@ class FunASRManager {
       await this.initializationPromise;
     }
 
-    const tempAudioPath = await this.createTempAudioFile(audioBlob);
-    
+    const audioBuffer = this._toAudioBuffer(audioBlob);
+
+    if (!this.serverReady) {
+      throw new Error('FunASR服务器未就绪，请稍后重试');
+    }
+
+    // 使用服务器模式，音频随命令帧直接写入stdin，不落盘
+    this.logger.info && this.logger.info('使用FunASR服务器模式进行转录', {
+      size: audioBuffer.length
+    });
+    // 模型仍在后台加载时请求会在服务器端排队，超时需要覆盖加载时间
+    // 录音原始的WebM/Opus等压缩格式直接发送，由服务器解码，数据量约为WAV的十分之一
+    const result = await this._sendServerCommand({
+      action: 'transcribe',
+      audio_format: audioFormat,
+      options: options || {}
+    }, audioBuffer, this.modelsInitialized ? 60000 : 180000);
+
+    if (result.type === 'audio_decoder_unavailable') {
+      // 服务器没有可用的压缩音频解码器，返回给渲染进程改为发送WAV
+      return { success: false, type: result.type, error: result.error };
+    }
+    if (!result.success) {
+      throw new Error(result.error || '转录失败');
+    }
+
+    return {
+      success: true,
+      text: result.text.trim(),
+      raw_text: result.raw_text,
+      confidence: result.confidence || 0.0,
+      language: result.language || "zh-CN"
+    };
+  }
+
+  async warmup() {
+    // 按下录音热键时预热模型，用户说话期间完成首次推理的冷启动开销
+    if (!this.serverReady) {
+      return { success: false, error: 'FunASR服务器未就绪' };
+    }
     try {
-      if (!this.serverReady) {
-        throw new Error('FunASR服务器未就绪，请稍后重试');
-      }
-      
-      // 使用服务器模式
-      this.logger.info && this.logger.info('使用FunASR服务器模式进行转录');
-      const result = await this._sendServerCommand({
-        action: 'transcribe',
-        audio_path: tempAudioPath,
-        options: options
-      });
-      
-      if (!result.success) {
-        throw new Error(result.error || '转录失败');
+      // 开启流式识别时一并预热流式模型
+      const command = this.streamingEnabled
+        ? { action: 'warmup', models: ['vad', 'asr', 'punc', 'online_asr'] }
+        : { action: 'warmup' };
+      const result = await this._sendServerCommand(command);
+      if (result.saved_ms) {
+        this.logger.info && this.logger.info('FunASR模型预热完成', { savedMs: result.saved_ms });
       }
-      
-      return {
-        success: true,
-        text: result.text.trim(),
-        raw_text: result.raw_text,
-        confidence: result.confidence || 0.0,
-        language: result.language || "zh-CN"
-      };
+      return result;
     } catch (error) {
-      throw error;
-    } finally {
-      await this.cleanupTempFile(tempAudioPath);
+      this.logger.warn && this.logger.warn('FunASR模型预热失败', error);
+      return { success: false, error: error.message };
     }
   }
 
-  async createTempAudioFile(audioBlob) {
-    const tempDir = os.tmpdir();
-    const filename = `funasr_audio_${crypto.randomUUID()}.wav`;
-    const tempAudioPath = path.join(tempDir, filename);
-    
-    this.logger.info && this.logger.info('创建临时文件:', tempAudioPath);
+  async transcribeLongAudio(filePath, options = {}, onEvent = null) {
+    if (!this.serverReady) {
+      throw new Error('FunASR服务器未就绪，请稍后重试');
+    }
+
+    // 长音频由服务器从磁盘分窗读取，分段结果以事件形式陆续返回
+    this.logger.info && this.logger.info('开始分窗转录长音频', { filePath });
+    const result = await this._sendServerCommand({
+      action: 'transcribe_long',
+      audio_path: filePath,
+      options: options
+    }, null, 60000, onEvent);
+
+    if (!result.success) {
+      throw new Error(result.error || '转录失败');
+    }
+
+    return {
+      success: true,
+      text: result.text.trim(),
+      raw_text: result.raw_text,
+      language: result.language || "zh-CN",
+      duration: result.duration || 0,
+      segmentCount: result.segment_count || 0
+    };
+  }
+
+  async startStream(options = {}) {
+    if (!this.serverReady) {
+      throw new Error('FunASR服务器未就绪，请稍后重试');
+    }
+
+    const result = await this._sendServerCommand({
+      action: 'stream_start',
+      options: options
+    });
+
+    if (!result.success) {
+      throw new Error(result.error || '流式识别启动失败');
+    }
+
+    this.logger.info && this.logger.info('流式识别会话开始', { streamId: result.stream_id });
+    return result;
+  }
+
+  async sendStreamChunk(streamId, pcmData) {
+    // 16kHz单声道16位PCM，随命令帧直接写入stdin
+    const result = await this._sendServerCommand({
+      action: 'stream_chunk',
+      stream_id: streamId,
+      audio_format: 'pcm_s16le',
+      sample_rate: 16000
+    }, this._toAudioBuffer(pcmData));
+
+    if (!result.success) {
+      throw new Error(result.error || '流式识别失败');
+    }
+
+    return { success: true, partial: result.partial };
+  }
 
+  async endStream(streamId) {
+    const result = await this._sendServerCommand({
+      action: 'stream_end',
+      stream_id: streamId
+    });
+
+    if (!result.success) {
+      throw new Error(result.error || '流式识别失败');
+    }
+
+    return {
+      success: true,
+      text: result.text.trim(),
+      raw_text: result.raw_text,
+      confidence: result.confidence || 0.0,
+      language: result.language || "zh-CN",
+      duration: result.duration || 0,
+      streaming: true
+    };
+  }
+
+  async cancelStream(streamId) {
+    return await this._sendServerCommand({
+      action: 'stream_cancel',
+      stream_id: streamId
+    });
+  }
+
+  _toAudioBuffer(audioBlob) {
     let buffer;
     if (audioBlob instanceof ArrayBuffer) {
       buffer = Buffer.from(audioBlob);
@@ -1178,33 +1503,14 @@ class FunASRManager {
     } else {
       throw new Error(`不支持的音频数据类型: ${typeof audioBlob}`);
     }
-    
+
     this.logger.debug && this.logger.debug('缓冲区创建，大小:', buffer.length);
 
-    await fs.promises.writeFile(tempAudioPath, buffer);
-    
-    // 验证文件是否正确写入
-    const stats = await fs.promises.stat(tempAudioPath);
-    this.logger.info && this.logger.info('临时音频文件创建:', {
-      path: tempAudioPath,
-      size: stats.size,
-      isFile: stats.isFile()
-    });
-    
-    if (stats.size === 0) {
+    if (buffer.length === 0) {
       throw new Error("音频文件为空");
     }
-    
-    return tempAudioPath;
-  }
-
 
-  async cleanupTempFile(tempAudioPath) {
-    try {
-      await fs.promises.unlink(tempAudioPath);
-    } catch (cleanupError) {
-      // 临时文件清理错误不是关键问题
-    }
+    return buffer;
   }
 
   async checkStatus() {
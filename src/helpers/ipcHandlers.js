@@ -99,8 +99,36 @@ class IPCHandlers {
     });
 
     // 音频转录相关
-    ipcMain.handle("transcribe-audio", async (event, audioData, options) => {
-      return await this.funasrManager.transcribeAudio(audioData, options);
+    ipcMain.handle("transcribe-audio", async (event, audioData, options, audioFormat) => {
+      return await this.funasrManager.transcribeAudio(audioData, options, audioFormat);
+    });
+
+    ipcMain.handle("funasr-warmup", async () => {
+      return await this.funasrManager.warmup();
+    });
+
+    // 长音频文件转录：分段结果实时推送给渲染进程
+    ipcMain.handle("transcribe-long-audio", async (event, filePath, options) => {
+      return await this.funasrManager.transcribeLongAudio(filePath, options, (progress) => {
+        event.sender.send("transcribe-long-audio-progress", progress);
+      });
+    });
+
+    // 流式识别：录音过程中边录边识别
+    ipcMain.handle("funasr-stream-start", async (event, options) => {
+      return await this.funasrManager.startStream(options);
+    });
+
+    ipcMain.handle("funasr-stream-chunk", async (event, streamId, pcmData) => {
+      return await this.funasrManager.sendStreamChunk(streamId, pcmData);
+    });
+
+    ipcMain.handle("funasr-stream-end", async (event, streamId) => {
+      return await this.funasrManager.endStream(streamId);
+    });
+
+    ipcMain.handle("funasr-stream-cancel", async (event, streamId) => {
+      return await this.funasrManager.cancelStream(streamId);
     });
 
     // 数据库相关
@@ -138,6 +166,11 @@ class IPCHandlers {
     });
 
     ipcMain.handle("set-setting", (event, key, value) => {
+      if (key === 'enable_result_cache') {
+        this.funasrManager.setResultCacheEnabled(value);
+      } else if (key === 'enable_streaming_asr') {
+        this.funasrManager.setStreamingEnabled(value);
+      }
       return this.databaseManager.setSetting(key, value);
     });
 
@@ -106,7 +106,9 @@ export const useModelStatus = () => {
           stage: 'ready'
         }));
       } else if (serverStatus.initializing) {
-        // 模型已下载，正在加载
+        // 模型已下载，正在加载；服务器在后台加载时按已加载的模型数显示进度
+        const loadStates = Object.values(serverStatus.init_progress || {});
+        const loaded = loadStates.filter(state => state === 'loaded').length;
         setModelStatus(prev => ({
           ...prev,
           isLoading: true,
@@ -114,7 +116,7 @@ export const useModelStatus = () => {
           modelsDownloaded: true,
           missingModels: [],
           error: null,
-          progress: 50,
+          progress: loadStates.length ? Math.round((loaded / loadStates.length) * 100) : 50,
           stage: 'loading'
         }));
       } else {
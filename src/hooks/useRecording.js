@@ -15,6 +15,8 @@ export const useRecording = () => {
   const mediaRecorderRef = useRef(null);
   const audioChunksRef = useRef([]);
   const streamRef = useRef(null);
+  const streamingRef = useRef(null); // 流式识别会话状态
+  const compressedAudioRef = useRef(true); // 服务器能否直接解码WebM/Opus录音
   
   // 添加防重复处理机制
   const processingRef = useRef({ isProcessingAudio: false, lastProcessTime: 0 });
@@ -38,6 +40,11 @@ export const useRecording = () => {
         }
       }
 
+      // 录音期间预热模型，停止录音时推理已经是热的（不等待结果）
+      if (window.electronAPI?.warmupFunASR) {
+        window.electronAPI.warmupFunASR().catch(() => {});
+      }
+
       // 检查浏览器支持
       if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
         throw new Error('您的浏览器不支持录音功能');
@@ -102,6 +109,15 @@ export const useRecording = () => {
       mediaRecorder.start(1000); // 每秒收集一次数据
       setIsRecording(true);
 
+      // 开启流式识别时，录音过程中即把PCM分块送入服务器；录音先开始，
+      // 会话在后台建立，建立之前采集的PCM先缓存，不会丢失开头的语音
+      const useStreaming = window.electronAPI
+        ? await window.electronAPI.getSetting('enable_streaming_asr', false)
+        : false;
+      if (useStreaming && mediaRecorder.state === 'recording') {
+        startStreaming(stream);
+      }
+
     } catch (err) {
       setError(`无法开始录音: ${err.message}`);
       setIsRecording(false);
@@ -126,13 +142,32 @@ export const useRecording = () => {
     processingRef.current.isProcessingAudio = true;
     
     try {
-      const wavBlob = await convertToWav(audioBlob);
-
       if (window.electronAPI) {
-        const arrayBuffer = await wavBlob.arrayBuffer();
-        const uint8Array = new Uint8Array(arrayBuffer);
+        // 流式识别已在录音过程中完成时，直接使用其最终结果
+        let transcriptionResult = await finishStreaming();
+        let fileSize = audioBlob.size;
+
+        if (!transcriptionResult && compressedAudioRef.current) {
+          // 直接发送MediaRecorder录制的WebM/Opus数据，由服务器解码
+          const uint8Array = new Uint8Array(await audioBlob.arrayBuffer());
+          transcriptionResult = await window.electronAPI.transcribeAudio(uint8Array, {}, 'webm');
+          if (transcriptionResult && transcriptionResult.type === 'audio_decoder_unavailable') {
+            if (window.electronAPI.log) {
+              window.electronAPI.log('warn', '服务器无法解码WebM音频，改为发送WAV:', transcriptionResult.error);
+            }
+            compressedAudioRef.current = false;
+            transcriptionResult = null;
+          }
+        }
+
+        if (!transcriptionResult) {
+          const wavBlob = await convertToWav(audioBlob);
+          const arrayBuffer = await wavBlob.arrayBuffer();
+          const uint8Array = new Uint8Array(arrayBuffer);
+          fileSize = uint8Array.length;
 
-        const transcriptionResult = await window.electronAPI.transcribeAudio(uint8Array);
+          transcriptionResult = await window.electronAPI.transcribeAudio(uint8Array, {}, 'wav');
+        }
 
         if (transcriptionResult.success) {
           const raw_text = transcriptionResult.text;
@@ -144,7 +179,7 @@ export const useRecording = () => {
             confidence: transcriptionResult.confidence || 0,
             language: transcriptionResult.language || 'zh-CN',
             duration: transcriptionResult.duration || 0,
-            file_size: uint8Array.length,
+            file_size: fileSize,
           };
 
           // 立即显示初步结果
@@ -251,6 +286,151 @@ export const useRecording = () => {
     }
   }, []);
 
+  // 开始流式识别：ScriptProcessor采集16kHz PCM，按服务器chunk大小分块发送。
+  // 采集立即开始，会话建立（服务器可能还在加载流式模型）之前的PCM缓存在本地
+  const startStreaming = (stream) => {
+    let state;
+    try {
+      const audioContext = new (window.AudioContext || window.webkitAudioContext)({
+        sampleRate: 16000
+      });
+      const source = audioContext.createMediaStreamSource(stream);
+      const processor = audioContext.createScriptProcessor(4096, 1, 1);
+
+      state = {
+        streamId: null,
+        ready: null,
+        audioContext,
+        source,
+        processor,
+        chunkSamples: 600 * 16,
+        chunks: [],
+        samples: 0,
+        queue: Promise.resolve(),
+        failed: false
+      };
+
+      processor.onaudioprocess = (event) => {
+        const input = event.inputBuffer.getChannelData(0);
+        const pcm = new Int16Array(input.length);
+        for (let i = 0; i < input.length; i++) {
+          const sample = Math.max(-1, Math.min(1, input[i]));
+          pcm[i] = sample * 0x7FFF;
+        }
+        state.chunks.push(pcm);
+        state.samples += pcm.length;
+        if (state.streamId && state.samples >= state.chunkSamples) {
+          flushStreamingChunks(state);
+        }
+      };
+
+      source.connect(processor);
+      processor.connect(audioContext.destination);
+      streamingRef.current = state;
+    } catch (err) {
+      // 流式识别不可用时回退到录音结束后整段识别
+      streamingRef.current = null;
+      if (window.electronAPI && window.electronAPI.log) {
+        window.electronAPI.log('warn', '流式识别不可用，回退到整段识别:', err.message);
+      }
+      return;
+    }
+
+    state.ready = window.electronAPI.startTranscriptionStream().then((session) => {
+      if (!session || !session.success) {
+        throw new Error(session?.error || '流式识别启动失败');
+      }
+      state.streamId = session.stream_id;
+      state.chunkSamples = (session.chunk_ms || 600) * 16;
+      // 补发会话建立前缓存的PCM
+      if (state.samples >= state.chunkSamples) {
+        flushStreamingChunks(state);
+      }
+    }).catch((err) => {
+      state.failed = true;
+      // 录音仍在进行时停止采集，录音结束后整段识别
+      if (streamingRef.current === state) {
+        streamingRef.current = null;
+        stopStreamingCapture(state);
+        state.audioContext.close();
+      }
+      if (window.electronAPI && window.electronAPI.log) {
+        window.electronAPI.log('warn', '流式识别不可用，回退到整段识别:', err.message);
+      }
+    });
+  };
+
+  const stopStreamingCapture = (state) => {
+    state.processor.onaudioprocess = null;
+    state.processor.disconnect();
+    state.source.disconnect();
+  };
+
+  // 按顺序发送已采集的PCM，中间结果通过 window.onTranscriptionPartial 通知UI
+  const flushStreamingChunks = (state) => {
+    if (state.samples === 0) {
+      return state.queue;
+    }
+
+    const merged = new Int16Array(state.samples);
+    let offset = 0;
+    for (const chunk of state.chunks) {
+      merged.set(chunk, offset);
+      offset += chunk.length;
+    }
+    state.chunks = [];
+    state.samples = 0;
+
+    const bytes = new Uint8Array(merged.buffer);
+    state.queue = state.queue.then(async () => {
+      if (state.failed) return;
+      const result = await window.electronAPI.sendTranscriptionStreamChunk(state.streamId, bytes);
+      if (result && result.success) {
+        if (window.onTranscriptionPartial) {
+          window.onTranscriptionPartial(result.partial);
+        }
+      } else {
+        state.failed = true;
+      }
+    }).catch(() => {
+      state.failed = true;
+    });
+    return state.queue;
+  };
+
+  // 结束流式识别，返回最终结果；失败时返回null以回退到整段识别
+  const finishStreaming = async () => {
+    const state = streamingRef.current;
+    streamingRef.current = null;
+    if (!state) {
+      return null;
+    }
+
+    stopStreamingCapture(state);
+    // 会话可能仍在建立中，等它完成后再发送剩余的PCM
+    await state.ready;
+    if (!state.failed) {
+      await flushStreamingChunks(state);
+    }
+    state.audioContext.close();
+
+    try {
+      if (state.failed) {
+        if (state.streamId) {
+          await window.electronAPI.cancelTranscriptionStream(state.streamId);
+        }
+        return null;
+      }
+      const result = await window.electronAPI.endTranscriptionStream(state.streamId);
+      return result && result.success ? result : null;
+    } catch (err) {
+      if (window.electronAPI && window.electronAPI.log) {
+        window.electronAPI.log('warn', '流式识别结束失败，回退到整段识别:', err.message);
+      }
+      return null;
+    }
+  };
+
   // 转换音频格式为WAV
   const convertToWav = useCallback(async (audioBlob) => {
     return new Promise((resolve, reject) => {
@@ -11,7 +11,9 @@ const SettingsPage = () => {
     ai_api_key: "",
     ai_base_url: "https://api.openai.com/v1",
     ai_model: "gpt-3.5-turbo",
-    enable_ai_optimization: true
+    enable_ai_optimization: true,
+    enable_streaming_asr: false,
+    enable_result_cache: false
   });
   
   const [customModel, setCustomModel] = useState(false);
@@ -51,7 +53,9 @@ const SettingsPage = () => {
           ai_api_key: allSettings.ai_api_key || "",
           ai_base_url: allSettings.ai_base_url || "https://api.openai.com/v1",
           ai_model: allSettings.ai_model || "gpt-3.5-turbo",
-          enable_ai_optimization: allSettings.enable_ai_optimization !== false // 默认为true
+          enable_ai_optimization: allSettings.enable_ai_optimization !== false, // 默认为true
+          enable_streaming_asr: allSettings.enable_streaming_asr === true, // 默认为false
+          enable_result_cache: allSettings.enable_result_cache === true // 默认为false
         };
         setSettings(prev => ({ ...prev, ...loadedSettings }));
         
@@ -77,6 +81,8 @@ const SettingsPage = () => {
         await window.electronAPI.setSetting('ai_base_url', settings.ai_base_url);
         await window.electronAPI.setSetting('ai_model', settings.ai_model);
         await window.electronAPI.setSetting('enable_ai_optimization', settings.enable_ai_optimization);
+        await window.electronAPI.setSetting('enable_streaming_asr', settings.enable_streaming_asr);
+        await window.electronAPI.setSetting('enable_result_cache', settings.enable_result_cache);
         
         toast.success("设置保存成功");
       }
@@ -245,6 +251,80 @@ const SettingsPage = () => {
             </div>
           </div>
 
+          {/* 语音识别部分 */}
+          <div className="bg-white dark:bg-gray-800 rounded-xl shadow-lg border border-gray-200 dark:border-gray-700 mb-6">
+            <div className="p-6">
+              <div className="mb-4">
+                <h2 className="text-lg font-semibold text-gray-900 dark:text-gray-100 chinese-title">
+                  语音识别
+                </h2>
+                <p className="text-xs text-gray-600 dark:text-gray-400 mt-1">
+                  调整本地FunASR识别方式。
+                </p>
+              </div>
+
+              <div className="space-y-4">
+                {/* 实时识别开关 */}
+                <div className="flex items-center justify-between">
+                  <div>
+                    <label htmlFor="streaming-asr-toggle" className="text-sm font-medium text-gray-800 dark:text-gray-200">
+                      启用实时识别
+                    </label>
+                    <p className="text-xs text-gray-500 dark:text-gray-400 mt-0.5">
+                      录音过程中实时显示识别结果，松开后更快得到最终文本
+                    </p>
+                  </div>
+                  <button
+                    id="streaming-asr-toggle"
+                    type="button"
+                    role="switch"
+                    aria-checked={settings.enable_streaming_asr}
+                    onClick={() => handleInputChange('enable_streaming_asr', !settings.enable_streaming_asr)}
+                    className={`${
+                      settings.enable_streaming_asr ? 'bg-blue-600' : 'bg-gray-300 dark:bg-gray-600'
+                    } relative inline-flex h-5 w-9 flex-shrink-0 cursor-pointer rounded-full border-2 border-transparent transition-colors duration-200 ease-in-out focus:outline-none focus:ring-2 focus:ring-blue-500 focus:ring-offset-2`}
+                  >
+                    <span
+                      aria-hidden="true"
+                      className={`${
+                        settings.enable_streaming_asr ? 'translate-x-4' : 'translate-x-0'
+                      } inline-block h-4 w-4 transform rounded-full bg-white shadow ring-0 transition duration-200 ease-in-out`}
+                    />
+                  </button>
+                </div>
+
+                {/* 结果缓存开关 */}
+                <div className="flex items-center justify-between">
+                  <div>
+                    <label htmlFor="result-cache-toggle" className="text-sm font-medium text-gray-800 dark:text-gray-200">
+                      缓存识别结果
+                    </label>
+                    <p className="text-xs text-gray-500 dark:text-gray-400 mt-0.5">
+                      识别文本保存在本地，重试同一段录音时直接返回，重启应用后生效
+                    </p>
+                  </div>
+                  <button
+                    id="result-cache-toggle"
+                    type="button"
+                    role="switch"
+                    aria-checked={settings.enable_result_cache}
+                    onClick={() => handleInputChange('enable_result_cache', !settings.enable_result_cache)}
+                    className={`${
+                      settings.enable_result_cache ? 'bg-blue-600' : 'bg-gray-300 dark:bg-gray-600'
+                    } relative inline-flex h-5 w-9 flex-shrink-0 cursor-pointer rounded-full border-2 border-transparent transition-colors duration-200 ease-in-out focus:outline-none focus:ring-2 focus:ring-blue-500 focus:ring-offset-2`}
+                  >
+                    <span
+                      aria-hidden="true"
+                      className={`${
+                        settings.enable_result_cache ? 'translate-x-4' : 'translate-x-0'
+                      } inline-block h-4 w-4 transform rounded-full bg-white shadow ring-0 transition duration-200 ease-in-out`}
+                    />
+                  </button>
+                </div>
+              </div>
+            </div>
+          </div>
+
           {/* AI配置部分 */}
           <div className="bg-white dark:bg-gray-800 rounded-xl shadow-lg border border-gray-200 dark:border-gray-700">
             <div className="p-6">
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+accuracy子命令的端到端测试：用桩模型替代FunASR，验证命令行入口能完成fp32/int8两轮对比
+运行: python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import soundfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import funasr_server  # noqa: E402
+
+
+class _FakeTensor:
+    def __init__(self, numel, element_size):
+        self._numel = numel
+        self._element_size = element_size
+
+    def numel(self):
+        return self._numel
+
+    def element_size(self):
+        return self._element_size
+
+
+class _FakeModule:
+    def __init__(self, element_size):
+        self._element_size = element_size
+
+    def state_dict(self):
+        return {"weight": _FakeTensor(1 << 20, self._element_size)}
+
+
+class StubModel:
+    """VAD把整段音频当作一个语音片段；ASR在int8模式下多识别出一个字"""
+
+    def __init__(self, name, quantized):
+        self.name = name
+        self.quantized = quantized
+        self.model = _FakeModule(1 if quantized else 4)
+
+    def generate(self, input, **kwargs):
+        if self.name == "vad":
+            return [{"value": [[0, int(len(input) / 16)]]}]
+        text = "今天天气很好啊" if self.quantized else "今天天气很好"
+        return [{"text": text} for _ in input]
+
+
+class AccuracyCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        audio_path = os.path.join(self.tmp.name, "sample.wav")
+        soundfile.write(audio_path, np.zeros(16000, dtype=np.float32), 16000)
+        with open(os.path.join(self.tmp.name, "sample.txt"), "w", encoding="utf-8") as f:
+            f.write("今天天气很好")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_accuracy_compares_fp32_and_int8(self):
+        def create_model(server, name):
+            return StubModel(name, server.quantize)
+
+        output = io.StringIO()
+        with mock.patch.object(
+            funasr_server.FunASRServer, "_create_model", create_model
+        ), mock.patch.object(
+            funasr_server.FunASRServer, "_required_packages", lambda server: []
+        ), contextlib.redirect_stdout(output):
+            with self.assertRaises(SystemExit) as exit_info:
+                # 带上--quantize，确认命令行参数不会与对比时的quantize冲突
+                funasr_server.main(
+                    ["--damo-root", self.tmp.name, "--quantize", "accuracy", self.tmp.name]
+                )
+
+        self.assertEqual(exit_info.exception.code, 0)
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        summary = lines[-1]
+        self.assertTrue(summary["success"])
+        self.assertEqual(summary["files"], 1)
+        self.assertEqual(summary["fp32"]["cer"], 0.0)
+        self.assertGreater(summary["int8"]["cer"], 0.0)
+        self.assertEqual(summary["asr_param_ratio"], 4.0)
+        self.assertEqual(lines[0]["fp32"], "今天天气很好")
+        self.assertEqual(lines[0]["int8"], "今天天气很好啊")
+
+
+if __name__ == "__main__":
+    unittest.main()
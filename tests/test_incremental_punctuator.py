@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量标点的窗口衔接测试：用桩标点函数代替CT-Transformer模型
+运行: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import funasr_server  # noqa: E402
+
+
+def stub_punctuate(text):
+    """在"结束"之后断句，并像标点模型一样总在末尾补句号"""
+    return text.replace("结束", "结束。") + "。"
+
+
+class IncrementalPunctuatorTest(unittest.TestCase):
+    def setUp(self):
+        self.punctuator = funasr_server.IncrementalPunctuator(
+            stub_punctuate, lambda texts: "".join(texts)
+        )
+        # 第一段不足一个窗口先积累，第二段送入后窗口在"结束"处断开，其余部分带入下一窗口
+        self.head = "我们先把第一个议题讨论完然后这一部分结束"
+        self.assertLess(len(self.head), funasr_server.PUNC_WINDOW_MIN_CHARS)
+
+    def test_decimal_number_survives_window_boundary(self):
+        self.punctuator.feed(self.head)
+        self.punctuator.feed("新版本v1.2的单价是3.5元")
+        self.assertEqual(self.punctuator.carry, "新版本v1.2的单价是3.5元")
+
+        text = self.punctuator.finish()
+        self.assertIn("3.5元", text)
+        self.assertIn("v1.2", text)
+        self.assertTrue(text.startswith(self.head + "。"))
+
+    def test_inserted_marks_are_stripped_from_carry(self):
+        self.punctuator.feed(self.head)
+        self.punctuator.feed("下一个话题，我们讨论预算.")
+        # 标点模型插入的全角标点和末尾的句号都不带入下一窗口
+        self.assertEqual(self.punctuator.carry, "下一个话题我们讨论预算")
+
+
+if __name__ == "__main__":
+    unittest.main()